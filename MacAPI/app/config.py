@@ -0,0 +1,159 @@
+import os
+import sys
+
+# Settings are read from environment variables so they can be changed per deployment
+# without touching the code (see .env for an example).
+
+# Recognition engine used behind the services:
+#   "vision" - Apple Vision framework (macOS only)
+#   "stub"   - pure-CPU OpenCV/NumPy engine that runs anywhere (Linux, CI, benchmarks)
+ENGINE = os.getenv("ENGINE", "vision" if sys.platform == "darwin" else "stub")
+
+# Engine used for card detection ("opencv" runs edge/contour quad detection anywhere)
+# and its settings: longest side of the proxy image, smallest card as a fraction of the
+# image, and most cards returned
+CARD_DETECTOR = os.getenv("CARD_DETECTOR", ENGINE)
+CARD_PROXY_SIDE = int(os.getenv("CARD_PROXY_SIDE", "640"))
+CARD_MIN_AREA = float(os.getenv("CARD_MIN_AREA", "0.02"))
+CARD_MAX_CARDS = int(os.getenv("CARD_MAX_CARDS", "5"))
+
+# Worker pool used to run engine calls outside the event loop:
+#   "thread"  - ThreadPoolExecutor (engines release the GIL while they work)
+#   "process" - ProcessPoolExecutor (full isolation, images are pickled to the workers)
+#   "inline"  - run directly on the event loop (old behaviour, useful for comparison)
+EXECUTOR_KIND = os.getenv("EXECUTOR_KIND", "thread")
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(os.cpu_count() or 4)))
+
+# Worker processes started by the preforking server (python -m app.serve)
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 4)))
+
+# Create the engine's request objects (one per worker thread) and run them once on a small
+# image at startup, so model loading is not paid by the first requests
+ENGINE_WARM_UP = os.getenv("ENGINE_WARM_UP", "1") == "1"
+
+# Idle request objects the engine keeps per configuration (task, languages, level) and
+# configurations kept, least recently used first out; a region request borrows one per region
+ENGINE_POOL_MAX_IDLE = int(os.getenv("ENGINE_POOL_MAX_IDLE", str(max(8, EXECUTOR_WORKERS))))
+ENGINE_POOL_MAX_KEYS = int(os.getenv("ENGINE_POOL_MAX_KEYS", "32"))
+
+# Content-addressed result cache (keyed by upload bytes + endpoint + parameters)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+# Directory for the on-disk tier, empty to keep the cache in memory only
+CACHE_DIR = os.getenv("CACHE_DIR", "")
+CACHE_DISK_MAX_BYTES = int(os.getenv("CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# ProcessingResult writes: "batched" (background thread, bulk transactions) or "sync" (commit per request)
+DB_WRITER = os.getenv("DB_WRITER", "batched")
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "100"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "0.5"))
+DB_QUEUE_SIZE = int(os.getenv("DB_QUEUE_SIZE", "10000"))
+
+# Processed output images, written in the background and named by content hash
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output")
+OUTPUT_QUEUE_SIZE = int(os.getenv("OUTPUT_QUEUE_SIZE", "64"))
+OUTPUT_WRITER_THREADS = int(os.getenv("OUTPUT_WRITER_THREADS", "1"))
+
+# Output store budget: total bytes, max file age in seconds (0 = keep forever) and
+# how often the background eviction runs
+OUTPUT_MAX_BYTES = int(os.getenv("OUTPUT_MAX_BYTES", str(1024 ** 3)))
+OUTPUT_TTL = int(os.getenv("OUTPUT_TTL", str(7 * 24 * 3600)))
+OUTPUT_EVICT_INTERVAL = float(os.getenv("OUTPUT_EVICT_INTERVAL", "60"))
+
+# Defaults for every endpoint, override per endpoint with e.g. OUTPUT_OCR_WRITE=0
+# or OUTPUT_CARD_DETECTION_FORMAT=png
+OUTPUT_WRITE = os.getenv("OUTPUT_WRITE", "1") == "1"
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "jpg")  # jpg, png or webp
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", "90"))
+
+OUTPUT_SETTINGS = {
+    endpoint: {
+        "write": os.getenv(f"OUTPUT_{endpoint.upper()}_WRITE", "1" if OUTPUT_WRITE else "0") == "1",
+        "format": os.getenv(f"OUTPUT_{endpoint.upper()}_FORMAT", OUTPUT_FORMAT),
+        "quality": int(os.getenv(f"OUTPUT_{endpoint.upper()}_QUALITY", str(OUTPUT_QUALITY)))
+    }
+    for endpoint in ("ocr", "face_quality", "card_detection", "analyze")
+}
+
+# Downscale images before inference, per endpoint: longest side in pixels and/or
+# megapixels (0 = no limit). Coordinates are mapped back to the original resolution.
+# Override with e.g. INFER_OCR_MAX_SIDE=2560 or INFER_FACE_QUALITY_MAX_MEGAPIXELS=1.5
+INFER_DEFAULT_MAX_SIDE = {"ocr": 2048, "face_quality": 1024, "card_detection": 1024}
+
+INFER_SETTINGS = {
+    endpoint: {
+        "max_side": int(os.getenv(f"INFER_{endpoint.upper()}_MAX_SIDE", str(max_side))),
+        "max_megapixels": float(os.getenv(f"INFER_{endpoint.upper()}_MAX_MEGAPIXELS", "0"))
+    }
+    for endpoint, max_side in INFER_DEFAULT_MAX_SIDE.items()
+}
+
+# OCR recognition level: 'accurate', 'fast' or 'auto' (fast first, low confidence lines again
+# at accurate), and the confidence below which auto re-runs a line
+OCR_LEVEL = os.getenv("OCR_LEVEL", "accurate")
+OCR_ESCALATE_CONFIDENCE = float(os.getenv("OCR_ESCALATE_CONFIDENCE", "0.6"))
+
+# Most regions of interest one OCR request may ask for, more are rejected with 400
+MAX_REGIONS = int(os.getenv("MAX_REGIONS", "16"))
+
+# Largest accepted upload in bytes, larger requests are rejected with 413
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+
+# Multi-page documents (/ocr/document): pages OCR'd at the same time and page limit
+DOCUMENT_CONCURRENCY = int(os.getenv("DOCUMENT_CONCURRENCY", str(max(2, EXECUTOR_WORKERS))))
+DOCUMENT_MAX_PAGES = int(os.getenv("DOCUMENT_MAX_PAGES", "500"))
+
+# Best-frame selection (/face_quality/best): frames sampled from a batch or clip, frames
+# scored at the same time, score that stops sampling early (0 = score every sampled frame)
+# and margin around the returned face crop as a fraction of the face size
+FACE_BEST_MAX_FRAMES = int(os.getenv("FACE_BEST_MAX_FRAMES", "30"))
+FACE_BEST_CONCURRENCY = int(os.getenv("FACE_BEST_CONCURRENCY", str(max(2, EXECUTOR_WORKERS))))
+FACE_BEST_TARGET_SCORE = float(os.getenv("FACE_BEST_TARGET_SCORE", "0"))
+FACE_CROP_PADDING = float(os.getenv("FACE_CROP_PADDING", "0.2"))
+
+# Admission control, per endpoint: requests processed at the same time (0 = no limit) and
+# requests waiting per priority lane; beyond that requests get 429 with Retry-After.
+# Override per endpoint with e.g. ADMISSION_OCR_LIMIT=4 or ADMISSION_ANALYZE_QUEUE=8
+ADMISSION_LIMIT = int(os.getenv("ADMISSION_LIMIT", str(2 * EXECUTOR_WORKERS)))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "32"))
+
+ADMISSION_SETTINGS = {
+    endpoint: {
+        "limit": int(os.getenv(f"ADMISSION_{endpoint.upper()}_LIMIT", str(ADMISSION_LIMIT))),
+        "queue": int(os.getenv(f"ADMISSION_{endpoint.upper()}_QUEUE", str(ADMISSION_QUEUE)))
+    }
+    for endpoint in ("ocr", "ocr_document", "face_quality", "face_quality_best", "card_detection", "analyze")
+}
+
+# Request header that picks the priority lane: 'interactive' (default) or 'batch'
+ADMISSION_PRIORITY_HEADER = os.getenv("ADMISSION_PRIORITY_HEADER", "X-Priority")
+
+# Perceptual hashes (dHash) of processed uploads are stored with their results; with reuse on,
+# an upload within PHASH_THRESHOLD bits of a stored one (same endpoint and parameters) is a
+# candidate, and gets the stored result without running inference only if no block of their
+# thumbnails differs by more than PHASH_VERIFY_TOLERANCE grey levels (0-255) on average
+PHASH_INDEX = os.getenv("PHASH_INDEX", "0") == "1"
+PHASH_REUSE = os.getenv("PHASH_REUSE", "0") == "1"
+PHASH_THRESHOLD = int(os.getenv("PHASH_THRESHOLD", "6"))
+PHASH_VERIFY_TOLERANCE = float(os.getenv("PHASH_VERIFY_TOLERANCE", "6"))
+# Stored hashes older than this are deleted by python -m app.export
+PHASH_KEEP_DAYS = int(os.getenv("PHASH_KEEP_DAYS", "30"))
+
+# Background jobs (/jobs): uploads are stored in JOB_DIR and processed by JOB_WORKERS tasks per
+# server process; idle workers look for jobs queued by other processes every JOB_POLL_INTERVAL
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(EXECUTOR_WORKERS)))
+JOB_DIR = os.getenv("JOB_DIR", "jobs")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_FILES = int(os.getenv("JOB_MAX_FILES", "1000"))
+# Whole /jobs submission, each file is still limited to MAX_UPLOAD_BYTES
+JOB_MAX_REQUEST_BYTES = int(os.getenv("JOB_MAX_REQUEST_BYTES", str(512 * 1024 * 1024)))
+# Longest long-poll (wait=) in seconds
+JOB_MAX_WAIT = float(os.getenv("JOB_MAX_WAIT", "60"))
+
+# Export of processing results (python -m app.export): rows older than EXPORT_KEEP_DAYS are
+# written to EXPORT_DIR as compressed columnar files, one per UTC day, and removed from the database
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_KEEP_DAYS = int(os.getenv("EXPORT_KEEP_DAYS", "30"))
+EXPORT_ROWS_PER_FILE = int(os.getenv("EXPORT_ROWS_PER_FILE", "250000"))
+# Most rows per /results page
+RESULTS_MAX_LIMIT = int(os.getenv("RESULTS_MAX_LIMIT", "1000"))
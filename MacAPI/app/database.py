@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -8,10 +8,41 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+@event.listens_for(engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    # WAL lets readers run while the result writer commits, and NORMAL sync
+    # only fsyncs at checkpoints instead of on every commit
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+def init_db():
+    """
+    Create missing tables and indexes
+
+    Runs from the startup hook (or once in the parent before workers are forked)
+    rather than at import time, so importing the app never touches the database.
+    """
+    from app import models
+
+    Base.metadata.create_all(bind=engine)
+
+    # create_all skips existing tables, so add columns and indexes introduced later to old databases
+    inspector = inspect(engine)
+    for table in (models.ProcessingResult.__table__, models.ImageHash.__table__):
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name not in existing:
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                            f"{column.type.compile(dialect=engine.dialect)}"))
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
@@ -0,0 +1,128 @@
+import importlib.util
+
+from app import config
+
+# Engines get_engine knows about
+ENGINES = ("vision", "stub", "opencv")
+
+# Engines that implement every task and can be ENGINE; the others only detect cards
+FULL_ENGINES = ("vision", "stub")
+
+# Modules an engine needs besides numpy and OpenCV (pyobjc for Vision, macOS only)
+ENGINE_MODULES = {"vision": ("Foundation", "Quartz", "Vision")}
+
+# One engine instance per name and per process (thread/process pool workers share it)
+_engines = {}
+
+# Engines that can be loaded on this host, found on first use
+_available = None
+
+
+def get_engine(name=None):
+    """
+    Get the recognition engine
+
+    Args:
+        name (str): Engine name ('vision', 'stub' or 'opencv'), None to use config.ENGINE
+
+    Returns:
+        Engine: Engine instance
+    """
+    name = name or config.ENGINE
+    if name not in _engines:
+        # Import lazily so the stub engine works on machines without pyobjc
+        if name == "vision":
+            from app.engines.vision import VisionEngine
+            _engines[name] = VisionEngine()
+        elif name == "stub":
+            from app.engines.stub import StubEngine
+            _engines[name] = StubEngine()
+        elif name == "opencv":
+            from app.engines.opencv import OpenCVEngine
+            _engines[name] = OpenCVEngine()
+        else:
+            raise ValueError(f"Unknown engine: {name}")
+    return _engines[name]
+
+
+def available_engines():
+    """
+    Get the engines that can be loaded on this host
+
+    Only checks that their modules are installed, nothing is imported.
+
+    Returns:
+        tuple: Names from ENGINES, e.g. no 'vision' on Linux
+    """
+    global _available
+    if _available is None:
+        _available = tuple(name for name in ENGINES if all(
+            importlib.util.find_spec(module) is not None for module in ENGINE_MODULES.get(name, ())))
+    return _available
+
+
+def check_engines():
+    """
+    Refuse an ENGINE or CARD_DETECTOR that cannot serve its tasks
+
+    Runs before any traffic, so a misconfigured server fails at startup instead of
+    answering every OCR and face request with an error.
+
+    Raises:
+        ValueError: If ENGINE does not implement every task, or ENGINE or CARD_DETECTOR
+                    is unknown or cannot be loaded on this host
+    """
+    if config.ENGINE not in FULL_ENGINES:
+        raise ValueError(f"ENGINE must be one of {', '.join(FULL_ENGINES)}, got {config.ENGINE!r}"
+                         + (" (use CARD_DETECTOR=opencv for card detection)" if config.ENGINE in ENGINES else ""))
+    if config.CARD_DETECTOR not in ENGINES:
+        raise ValueError(f"CARD_DETECTOR must be one of {', '.join(ENGINES)}, got {config.CARD_DETECTOR!r}")
+    for setting, name in (("ENGINE", config.ENGINE), ("CARD_DETECTOR", config.CARD_DETECTOR)):
+        if name not in available_engines():
+            raise ValueError(f"{setting}={name} cannot be loaded on this host, "
+                             f"available: {', '.join(available_engines())}")
+
+
+def warm_engine(copies=1):
+    """
+    Create and warm the pooled request objects of config.ENGINE (see Engine.warm_up)
+
+    Runs at startup in the API process and as the initializer of every process pool
+    worker, so each worker has its own warm pool.
+
+    Args:
+        copies (int): Idle request objects to keep per key
+    """
+    if not config.ENGINE_WARM_UP:
+        return
+    levels = ("fast", "accurate") if config.OCR_LEVEL == "auto" else (config.OCR_LEVEL,)
+    try:
+        get_engine().warm_up(levels, copies)
+    except Exception as e:
+        # A cold engine still works, it is only slower on the first requests
+        print(f"Error warming up engine: {str(e)}")
+
+
+# Libraries every request needs, imported on first use unless preload() runs first
+PRELOAD_MODULES = ("numpy", "cv2", "PIL.Image")
+
+
+def preload():
+    """
+    Import the image libraries and engines now and warm the engine, instead of on first use
+
+    Called by a preforking parent (app.serve) so its workers share the loaded modules
+    and warm request objects copy-on-write. Vision is left to each worker: Objective-C
+    objects must not cross a fork, so it is imported and warmed by the startup hook
+    after the fork.
+    """
+    import importlib
+
+    check_engines()
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    for name in {config.ENGINE, config.CARD_DETECTOR}:
+        if name != "vision":
+            get_engine(name)
+    if config.ENGINE != "vision":
+        warm_engine(copies=config.EXECUTOR_WORKERS)
@@ -0,0 +1,361 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from app import config
+from app.utils.image_utils import PreparedImage, warp_card
+from app.utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+def as_array(image):
+    """
+    Get the decoded pixels of an engine input
+
+    Args:
+        image (PreparedImage or numpy.ndarray): Engine input
+
+    Returns:
+        numpy.ndarray: Image as numpy array
+    """
+    if isinstance(image, PreparedImage):
+        return image.array
+    return image
+
+
+def image_size(image):
+    """
+    Get the size of an engine input without decoding it
+
+    Args:
+        image (PreparedImage or numpy.ndarray): Engine input
+
+    Returns:
+        tuple: (width, height)
+    """
+    if isinstance(image, PreparedImage):
+        return image.width, image.height
+    height, width = image.shape[:2]
+    return width, height
+
+
+def region_rect(region, width, height):
+    """
+    Convert a normalized region to a pixel rectangle inside the image
+
+    Args:
+        region (tuple): (x, y, width, height) as fractions of the image size, top-left origin
+        width (int): Image width
+        height (int): Image height
+
+    Returns:
+        tuple: (x, y, width, height) in pixels, clamped to the image
+    """
+    x0 = min(max(int(round(region[0] * width)), 0), width)
+    y0 = min(max(int(round(region[1] * height)), 0), height)
+    x1 = min(max(int(round((region[0] + region[2]) * width)), x0), width)
+    y1 = min(max(int(round((region[1] + region[3]) * height)), y0), height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def warm_up_image():
+    """
+    Small synthetic card used to warm engines up (dark text-like bars inside a border)
+
+    Returns:
+        numpy.ndarray: RGB image as numpy array
+    """
+    image = np.full((240, 384, 3), 235, dtype=np.uint8)
+    image[12:228, 12:16] = image[12:228, 368:372] = 40
+    image[12:16, 12:372] = image[224:228, 12:372] = 40
+    for y in range(50, 200, 40):
+        image[y:y + 14, 40:300] = 30
+    return image
+
+
+class RequestPool:
+    """
+    Idle engine request objects, keyed by their configuration
+
+    Objects are built by factory(key) the first time a key is used and reused by
+    later calls. A checked out object belongs to one call until it is checked in,
+    so concurrent calls never share one. At most max_idle objects are kept per key
+    (more are dropped when checked in) and at most max_keys keys, the least
+    recently used key losing its idle objects first.
+    """
+
+    def __init__(self, factory, max_idle=8, max_keys=32):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.max_keys = max_keys
+        self._idle = OrderedDict()  # key -> list of idle objects, least recently used key first
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _check_in(self, key, request):
+        # Called with the lock held
+        idle = self._idle.get(key)
+        if idle is None:
+            idle = self._idle[key] = []
+        self._idle.move_to_end(key)
+        if len(idle) < self.max_idle:
+            idle.append(request)
+        else:
+            self.discarded += 1
+        while len(self._idle) > self.max_keys:
+            _, dropped = self._idle.popitem(last=False)
+            self.discarded += len(dropped)
+
+    @contextmanager
+    def checkout(self, key):
+        """
+        Borrow an object for key for the body of a with block
+
+        Args:
+            key (tuple): Configuration key (see Engine.request_key)
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            request = idle.pop() if idle else None
+            if request is not None:
+                self._idle.move_to_end(key)
+                self.reused += 1
+        if request is None:
+            request = self.factory(key)
+            with self._lock:
+                self.created += 1
+        try:
+            yield request
+        finally:
+            with self._lock:
+                self._check_in(key, request)
+
+    def fill(self, key, count):
+        """
+        Create objects for key until count of them (at most max_idle) are idle
+
+        Args:
+            key (tuple): Configuration key
+            count (int): Idle objects wanted
+        """
+        with self._lock:
+            missing = min(count, self.max_idle) - len(self._idle.get(key, []))
+        for _ in range(missing):
+            request = self.factory(key)
+            with self._lock:
+                self.created += 1
+                self._check_in(key, request)
+
+    def idle(self):
+        """
+        Returns:
+            int: Objects waiting in the pool
+        """
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of keys, idle, created, reused and discarded objects
+        """
+        with self._lock:
+            return {"keys": len(self._idle), "idle": sum(len(idle) for idle in self._idle.values()),
+                    "created": self.created, "reused": self.reused, "discarded": self.discarded}
+
+
+class Engine:
+    """
+    Interface implemented by every recognition engine
+
+    The services in app/services call these methods, so an engine only has to
+    know how to run the actual recognition. Inputs are either a PreparedImage
+    (preferred, lets the engine reuse the upload bytes) or a decoded numpy array.
+    """
+
+    name = "base"
+
+    # Model revision of each task, part of the request pool key
+    revisions = {}
+
+    def __init__(self):
+        self.pool = RequestPool(self.make_request, config.ENGINE_POOL_MAX_IDLE, config.ENGINE_POOL_MAX_KEYS)
+
+    def request_key(self, task, languages=None, level=None):
+        """
+        Build the request pool key of a call
+
+        Args:
+            task (str): 'text', 'face_quality' or 'rectangles'
+            languages (list): Language codes (text only), None for defaults
+            level (str): 'fast' or 'accurate' (text only)
+
+        Returns:
+            tuple: (task, languages, level, revision)
+        """
+        return task, tuple(languages) if languages else None, level, self.revisions.get(task)
+
+    def make_request(self, key):
+        """
+        Build a request object configured for key, used by self.pool
+
+        Args:
+            key (tuple): (task, languages, level, revision), see request_key
+
+        Returns:
+            Any: Engine specific request object
+        """
+        raise NotImplementedError
+
+    def warm_up(self, levels=("accurate",), copies=1):
+        """
+        Create the pooled request objects up front and run each task once on a
+        small image, so model loading does not land on the first real request
+
+        Args:
+            levels (tuple): Text recognition levels to warm
+            copies (int): Idle request objects to keep per key (one per worker thread)
+        """
+        image = warm_up_image()
+        for level in levels:
+            self.pool.fill(self.request_key("text", None, level), copies)
+            self.recognize_text(image, None, level)
+        self.pool.fill(self.request_key("face_quality"), copies)
+        self.detect_face_quality(image)
+        self.pool.fill(self.request_key("rectangles"), copies)
+        self.find_card(image)
+
+    def recognize_text(self, image, languages=None, level="accurate"):
+        """
+        Recognize text in image
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+            languages (list): List of language codes to recognize, None for defaults
+            level (str): 'fast' or 'accurate' recognition
+
+        Returns:
+            dict: Dictionary with text, dimensions, text_observations and detected_languages
+        """
+        raise NotImplementedError
+
+    def recognize_regions(self, image, regions, languages=None, level="accurate"):
+        """
+        Recognize text only inside regions of interest
+
+        The default crops every region and runs recognize_text on it; engines that
+        can restrict recognition to a region natively should override this.
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+            regions (list): (x, y, width, height) tuples as fractions of the image size,
+                            top-left origin
+            languages (list): List of language codes to recognize, None for defaults
+            level (str): 'fast' or 'accurate' recognition
+
+        Returns:
+            list: One recognize_text style dict per region, with bounding boxes in
+                  pixels of the whole image
+        """
+        array = as_array(image)
+        height, width = array.shape[:2]
+        results = []
+        for region in regions:
+            x, y, w, h = region_rect(region, width, height)
+            if not w or not h:
+                results.append({"text": "", "dimensions": (width, height),
+                                "text_observations": [], "detected_languages": []})
+                continue
+            result = self.recognize_text(array[y:y + h, x:x + w], languages, level)
+            for observation in result["text_observations"]:
+                observation["bounding_box"]["x"] += x
+                observation["bounding_box"]["y"] += y
+            result["dimensions"] = (width, height)
+            results.append(result)
+        return results
+
+    def detect_face_quality(self, image):
+        """
+        Detect face quality in image
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+
+        Returns:
+            float: Face quality score between 0.0 and 1.0
+        """
+        raise NotImplementedError
+
+    def detect_face(self, image):
+        """
+        Detect the best face in image with its quality score and position
+
+        The default wraps detect_face_quality and reports no position; engines
+        that locate faces should override this.
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+
+        Returns:
+            dict: quality_score (0.0 - 1.0) and bounding_box (x, y, width, height in
+                  pixels of image, top-left origin), bounding_box is None if unknown
+        """
+        return {"quality_score": self.detect_face_quality(image), "bounding_box": None}
+
+    def find_card(self, image):
+        """
+        Find the corners of the card in image
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+
+        Returns:
+            numpy.ndarray: 4x2 float32 corners in pixels of image (top-left, top-right,
+                           bottom-right, bottom-left), None if no card was found
+        """
+        raise NotImplementedError
+
+    def find_cards(self, image, max_cards=5):
+        """
+        Find every card in image
+
+        The default wraps find_card; engines that can return several candidates
+        should override this.
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+            max_cards (int): Most candidates to return
+
+        Returns:
+            list: Dicts with corners (4x2 float32 in pixels of image, see find_card),
+                  score (0.0 - 1.0) and area (fraction of the image), best first
+        """
+        corners = self.find_card(image)
+        if corners is None:
+            return []
+        corners = np.asarray(corners, dtype=np.float32)
+        width, height = image_size(image)
+        # Half the cross product of the diagonals
+        d1, d2 = corners[2] - corners[0], corners[3] - corners[1]
+        area = abs(float(d1[0] * d2[1] - d1[1] * d2[0])) / 2.0
+        return [{"corners": corners, "score": 1.0, "area": round(area / float(width * height), 4)}]
+
+    def detect_card(self, image):
+        """
+        Detect card in image and correct perspective
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Image to process
+
+        Returns:
+            numpy.ndarray: Perspective corrected image of the card,
+                           the original image if no card was found
+        """
+        corners = self.find_card(image)
+        if corners is None:
+            return as_array(image)
+        return warp_card(as_array(image), corners)
@@ -0,0 +1,134 @@
+import numpy as np
+import cv2
+
+from app import config
+from app.engines.base import Engine, as_array
+
+# Width / height of an ID-1 card (ID cards, credit cards: 85.6 x 53.98 mm)
+CARD_ASPECT = 85.6 / 53.98
+
+
+def order_corners(points):
+    """
+    Order the corners of a quadrilateral
+
+    Corners are sorted by angle around their centroid and rotated so the one
+    closest to the image origin comes first, which stays correct for cards
+    rotated by any angle (unlike the x+y / x-y rule).
+
+    Args:
+        points (numpy.ndarray): 4x2 corners in any order
+
+    Returns:
+        numpy.ndarray: 4x2 float32 corners: top-left, top-right, bottom-right, bottom-left
+    """
+    points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    center = points.mean(axis=0)
+    # y grows downwards, so increasing angle runs clockwise on screen
+    angles = np.arctan2(points[:, 1] - center[1], points[:, 0] - center[0])
+    points = points[np.argsort(angles)]
+    return np.roll(points, -int(np.argmin(points.sum(axis=1))), axis=0)
+
+
+def quad_score(quad, contour_area):
+    """
+    Score how much a quadrilateral looks like a card
+
+    Args:
+        quad (numpy.ndarray): 4x2 ordered corners
+        contour_area (float): Area of the contour the quad was fitted to
+
+    Returns:
+        float: 0.0 - 1.0, product of squareness of the corners, how well the quad
+               fills its contour and closeness to the ID-1 aspect ratio
+    """
+    edges = np.roll(quad, -1, axis=0) - quad
+    lengths = np.linalg.norm(edges, axis=1)
+    if lengths.min() < 1:
+        return 0.0
+
+    # |cos| of each corner angle, 0 for a right angle
+    previous = np.roll(edges, 1, axis=0)
+    cosines = np.abs((edges * previous).sum(axis=1)) / (lengths * np.roll(lengths, 1))
+    squareness = float(1.0 - cosines.max())
+
+    fill = min(1.0, contour_area / max(cv2.contourArea(quad), 1.0))
+
+    aspect = max(lengths[0] + lengths[2], lengths[1] + lengths[3]) / min(lengths[0] + lengths[2], lengths[1] + lengths[3])
+    aspect_match = float(min(aspect, CARD_ASPECT) / max(aspect, CARD_ASPECT))
+
+    return squareness * fill * aspect_match
+
+
+class OpenCVEngine(Engine):
+    """
+    Card detector built on OpenCV edge and contour analysis (runs anywhere)
+
+    Only card detection is implemented; it is selected per request with
+    detector=opencv or for all requests with CARD_DETECTOR=opencv.
+    """
+
+    name = "opencv"
+
+    def __init__(self, proxy_side=None, min_area=None):
+        super().__init__()
+        self.proxy_side = proxy_side or config.CARD_PROXY_SIDE
+        self.min_area = min_area or config.CARD_MIN_AREA
+
+    def find_cards(self, image, max_cards=5):
+        image = as_array(image)
+        height, width = image.shape[:2]
+
+        # Work on a small proxy, corners are scaled back at the end
+        scale = min(1.0, self.proxy_side / float(max(width, height)))
+        if image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY if image.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+        else:
+            gray = image
+        if scale < 1.0:
+            gray = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                              interpolation=cv2.INTER_AREA)
+        proxy_area = float(gray.shape[0] * gray.shape[1])
+
+        # Edges with thresholds from the median brightness, closed so card borders form one contour
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        median = float(np.median(gray))
+        edges = cv2.Canny(gray, int(max(0, 0.66 * median)), int(min(255, 1.33 * median)))
+        edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+        contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+
+        candidates = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area < self.min_area * proxy_area:
+                continue
+            hull = cv2.convexHull(contour)
+            perimeter = cv2.arcLength(hull, True)
+            for epsilon in (0.02, 0.04):
+                approx = cv2.approxPolyDP(hull, epsilon * perimeter, True)
+                if len(approx) == 4:
+                    break
+            else:
+                continue
+            quad = order_corners(approx)
+            score = quad_score(quad, area)
+            if score > 0:
+                candidates.append((quad, score, cv2.contourArea(quad) / proxy_area))
+
+        # Both sides of a dilated border give a contour: keep the best of quads that nearly coincide
+        candidates.sort(key=lambda candidate: candidate[1] * candidate[2], reverse=True)
+        diagonal = np.hypot(*gray.shape[:2])
+        cards = []
+        for quad, score, area in candidates:
+            if any(np.abs(quad - card[0]).max() < 0.05 * diagonal for card in cards):
+                continue
+            cards.append((quad, score, area))
+            if len(cards) == max_cards:
+                break
+
+        return [{"corners": quad / scale, "score": round(score, 4), "area": round(area, 4)}
+                for quad, score, area in cards]
+
+    def find_card(self, image):
+        cards = self.find_cards(image, max_cards=1)
+        return cards[0]["corners"] if cards else None
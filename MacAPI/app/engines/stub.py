@@ -0,0 +1,140 @@
+import numpy as np
+import cv2
+
+from app.engines.base import Engine, as_array, image_size
+
+
+def _to_gray(image):
+    """
+    Convert image to single channel grayscale
+
+    Args:
+        image (numpy.ndarray): Grayscale, RGB or RGBA image
+
+    Returns:
+        numpy.ndarray: Grayscale image
+    """
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+class StubRequest:
+    """
+    Stand-in for a configured Vision request
+
+    It keeps its pool key and the structuring elements it has built, so pooling
+    and warm-up run the same way as with Vision.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.kernels = {}
+
+    def line_kernel(self, width):
+        # Merges characters into lines, sized to the image width
+        size = max(3, width // 50)
+        kernel = self.kernels.get(size)
+        if kernel is None:
+            kernel = self.kernels[size] = cv2.getStructuringElement(cv2.MORPH_RECT, (size, 3))
+        return kernel
+
+
+class StubEngine(Engine):
+    """
+    Pure-CPU engine built on OpenCV and NumPy
+
+    It does not recognize real characters, but its work grows with the image size
+    like a real engine and its output is deterministic, so it can stand in for
+    Vision on Linux, in CI and in benchmarks.
+    """
+
+    name = "stub"
+
+    def make_request(self, key):
+        return StubRequest(key)
+
+    def recognize_text(self, image, languages=None, level="accurate"):
+        with self.pool.checkout(self.request_key("text", languages, level)) as request:
+            return self._recognize_text(request, image, level)
+
+    def _recognize_text(self, request, image, level):
+        image = as_array(image)
+        height, width = image.shape[:2]
+        dimensions = (width, height)
+        gray = _to_gray(image)
+
+        # Fast level works at half resolution: less work, blurrier strokes, lower confidence
+        factor = 2 if level == "fast" and min(width, height) >= 64 else 1
+        if factor > 1:
+            gray = cv2.resize(gray, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+            height, width = gray.shape[:2]
+
+        # Dark text on light background -> white blobs, then merge characters into lines
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        lines = cv2.dilate(binary, request.line_kernel(width))
+        # Two-level hierarchy: blobs inside a frame's hole are still top-level components
+        contours, hierarchy = cv2.findContours(lines, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+        if hierarchy is None:
+            contours, hierarchy = [], [[]]
+
+        def filled_area(index):
+            # Area of a component without its holes: frames are hollow, merged text lines are not
+            area = cv2.contourArea(contours[index])
+            child = hierarchy[0][index][2]
+            while child >= 0:
+                area -= cv2.contourArea(contours[child])
+                child = hierarchy[0][child][0]
+            return area
+
+        # Keep line-shaped regions (not holes, borders or frames), ordered top-to-bottom then left-to-right
+        boxes = [(cv2.boundingRect(contour), index)
+                 for index, (contour, node) in enumerate(zip(contours, hierarchy[0])) if node[3] < 0]
+        boxes = [box for box, index in boxes
+                 if box[2] >= 8 and box[3] >= 4 and box[2] > box[3]
+                 and filled_area(index) >= 0.3 * box[2] * box[3]]
+        boxes.sort(key=lambda box: (box[1], box[0]))
+
+        text_observations = []
+        for index, (x, y, w, h) in enumerate(boxes):
+            # Use local contrast as a stand-in for recognition confidence
+            confidence = min(1.0, float(gray[y:y + h, x:x + w].std()) / 128.0)
+            text_observations.append({
+                "text": f"line{index + 1}",
+                "confidence": round(confidence, 4),
+                "bounding_box": {
+                    "x": x * factor,
+                    "y": y * factor,
+                    "width": w * factor,
+                    "height": h * factor
+                }
+            })
+
+        return {
+            "text": " ".join(observation["text"] for observation in text_observations),
+            "dimensions": dimensions,
+            "text_observations": text_observations,
+            "detected_languages": []
+        }
+
+    def detect_face_quality(self, image):
+        with self.pool.checkout(self.request_key("face_quality")):
+            # Sharpness (variance of the Laplacian) mapped to 0.0 - 1.0
+            variance = float(cv2.Laplacian(_to_gray(as_array(image)), cv2.CV_64F).var())
+            return variance / (variance + 1000.0)
+
+    def detect_face(self, image):
+        # Treat the centre half of the frame as the face
+        width, height = image_size(image)
+        return {
+            "quality_score": self.detect_face_quality(image),
+            "bounding_box": {"x": width // 4, "y": height // 4, "width": width // 2, "height": height // 2}
+        }
+
+    def find_card(self, image):
+        with self.pool.checkout(self.request_key("rectangles")):
+            # Treat the full frame as the card
+            width, height = image_size(image)
+            return np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float32)
@@ -0,0 +1,262 @@
+from contextlib import ExitStack
+
+import numpy as np
+from Foundation import NSData
+from Quartz import CIImage
+from Vision import (
+    VNDetectFaceCaptureQualityRequest,
+    VNDetectRectanglesRequest,
+    VNImageRequestHandler,
+    VNRecognizeTextRequest,
+    VNRecognizeTextRequestRevision3,
+)
+
+from app.engines.base import Engine, image_size
+from app.utils.image_utils import PreparedImage, encode_png
+
+
+def _to_ci_image(image):
+    """
+    Convert engine input to CIImage for Vision framework
+
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+
+    Returns:
+        CIImage: Image ready to be passed to VNImageRequestHandler
+    """
+    if isinstance(image, PreparedImage):
+        # Original JPEG/PNG upload is passed through, no re-encode
+        data = image.engine_bytes
+    else:
+        data = encode_png(image)
+    image_data = NSData.dataWithBytes_length_(data, len(data))
+    return CIImage.imageWithData_(image_data)
+
+
+class VisionEngine(Engine):
+    """
+    Engine backed by Apple Vision framework (macOS only)
+    """
+
+    name = "vision"
+
+    revisions = {"text": VNRecognizeTextRequestRevision3}
+
+    def make_request(self, key):
+        task, languages, level, revision = key
+        if task == "face_quality":
+            return VNDetectFaceCaptureQualityRequest.alloc().init()
+
+        if task == "rectangles":
+            request = VNDetectRectanglesRequest.alloc().init()
+            request.setMinimumAspectRatio_(0.5)
+            request.setMaximumAspectRatio_(2.0)
+            request.setQuadratureTolerance_(10.0)  # Allow for some perspective distortion
+            return request
+
+        # Create request
+        request = VNRecognizeTextRequest.alloc().init()
+
+        # Set recognition level, language correction only pays off at the accurate level
+        request.setRecognitionLevel_(1 if level == "accurate" else 0)  # 0 = fast, 1 = accurate
+        request.setUsesLanguageCorrection_(level == "accurate")
+
+        # Use latest text recognition revision
+        request.setRevision_(revision)
+
+        # Set languages if specified, with thai/english defaults if not specified
+        if languages:
+            request.setRecognitionLanguages_(list(languages))
+        else:
+            # Default to recognizing both Thai and English if no languages are specified
+            request.setRecognitionLanguages_(["th", "en"])
+        return request
+
+    def _set_region(self, request, region=None):
+        # Pooled requests keep the last region, so always set it
+        if region is None:
+            request.setRegionOfInterest_(((0.0, 0.0), (1.0, 1.0)))
+        else:
+            # Vision expects the region normalized with a bottom-left origin
+            x, y, w, h = region
+            request.setRegionOfInterest_(((x, 1.0 - y - h), (w, h)))
+
+    def _text_result(self, request, width, height, region=None):
+        results = request.results()
+        if not results:
+            return {"text": "", "dimensions": (width, height), "text_observations": [], "detected_languages": []}
+
+        # Boxes of a region request are normalized to the region, not to the image
+        rx, ry, rw, rh = (0.0, 0.0, 1.0, 1.0) if region is None else (
+            region[0], 1.0 - region[1] - region[3], region[2], region[3])
+
+        # Extract text and bounding boxes
+        text_observations = []
+        full_text = []
+        detected_languages = set()
+
+        for result in results:
+            text = result.text()
+            full_text.append(text)
+
+            # Get language identification if available
+            if hasattr(result, 'language') and result.language():
+                detected_languages.add(result.language())
+
+            # Get normalized bounding box
+            boundingBox = result.boundingBox()
+
+            # Convert normalized coordinates to pixel coordinates
+            x = int((rx + boundingBox.origin.x * rw) * width)
+            y = int((ry + boundingBox.origin.y * rh) * height)
+            w = int(boundingBox.size.width * rw * width)
+            h = int(boundingBox.size.height * rh * height)
+
+            # Convert to top-left coordinates (Vision uses bottom-left origin)
+            y = height - y - h
+
+            text_observations.append({
+                "text": text,
+                "confidence": round(float(result.confidence()), 4),
+                "bounding_box": {
+                    "x": x,
+                    "y": y,
+                    "width": w,
+                    "height": h
+                }
+            })
+
+        return {
+            "text": " ".join(full_text),
+            "dimensions": (width, height),
+            "text_observations": text_observations,
+            "detected_languages": list(detected_languages)
+        }
+
+    def recognize_text(self, image, languages=None, level="accurate"):
+        # Get image dimensions
+        width, height = image_size(image)
+
+        # Create CIImage from image data for Vision processing
+        ci_image = _to_ci_image(image)
+
+        # Borrow a configured request and create handler
+        with self.pool.checkout(self.request_key("text", languages, level)) as request:
+            self._set_region(request)
+            handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
+
+            # Perform request
+            success = handler.performRequests_error_([request], None)
+
+            if not success:
+                return {"text": "", "dimensions": (width, height), "text_observations": [], "detected_languages": []}
+
+            # Read the results before the request goes back to the pool
+            return self._text_result(request, width, height)
+
+    def recognize_regions(self, image, regions, languages=None, level="accurate"):
+        width, height = image_size(image)
+        ci_image = _to_ci_image(image)
+
+        # One request per region, all performed by one handler so the image is decoded once
+        key = self.request_key("text", languages, level)
+        with ExitStack() as stack:
+            requests = [stack.enter_context(self.pool.checkout(key)) for _ in regions]
+            for request, region in zip(requests, regions):
+                self._set_region(request, region)
+            handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
+            success = handler.performRequests_error_(requests, None)
+
+            if not success:
+                return [{"text": "", "dimensions": (width, height), "text_observations": [], "detected_languages": []}
+                        for _ in regions]
+
+            return [self._text_result(request, width, height, region)
+                    for request, region in zip(requests, regions)]
+
+    def detect_face_quality(self, image):
+        # Create CIImage from image data for Vision processing
+        ci_image = _to_ci_image(image)
+
+        # Borrow a request and create handler
+        with self.pool.checkout(self.request_key("face_quality")) as request:
+            handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
+
+            # Perform request
+            success = handler.performRequests_error_([request], None)
+
+            if not success:
+                return 0.0
+
+            results = request.results()
+            if not results:
+                return 0.0
+
+            # Return face quality score
+            return results[0].faceCaptureQuality()
+
+    def detect_face(self, image):
+        ci_image = _to_ci_image(image)
+        width, height = image_size(image)
+
+        with self.pool.checkout(self.request_key("face_quality")) as request:
+            handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
+            if not handler.performRequests_error_([request], None):
+                return {"quality_score": 0.0, "bounding_box": None}
+
+            results = request.results()
+            if not results:
+                return {"quality_score": 0.0, "bounding_box": None}
+
+            # One observation per face, keep the best one
+            best = max(results, key=lambda observation: observation.faceCaptureQuality())
+            box = best.boundingBox()
+            w = int(box.size.width * width)
+            h = int(box.size.height * height)
+            return {
+                "quality_score": float(best.faceCaptureQuality()),
+                "bounding_box": {
+                    "x": int(box.origin.x * width),
+                    # Vision uses bottom-left origin
+                    "y": height - int(box.origin.y * height) - h,
+                    "width": w,
+                    "height": h
+                }
+            }
+
+    def find_cards(self, image, max_cards=5):
+        # Create CIImage from image data for Vision processing
+        ci_image = _to_ci_image(image)
+        w, h = image_size(image)
+
+        # Use Vision framework to detect rectangles, with a pooled request
+        with self.pool.checkout(self.request_key("rectangles")) as request:
+            request.setMaximumObservations_(max_cards)
+
+            # Create handler and perform request
+            handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
+            success = handler.performRequests_error_([request], None)
+
+            if not success:
+                return []  # Detection failed
+
+            results = request.results() or []
+
+        cards = []
+        for observation in results:
+            # Actual quadrilateral corners, normalized with a bottom-left origin
+            corners = np.array([
+                (point.x * w, (1.0 - point.y) * h)
+                for point in (observation.topLeft(), observation.topRight(),
+                              observation.bottomRight(), observation.bottomLeft())
+            ], dtype=np.float32)
+            box = observation.boundingBox()
+            cards.append({"corners": corners, "score": round(float(observation.confidence()), 4),
+                          "area": round(float(box.size.width * box.size.height), 4)})
+        return cards
+
+    def find_card(self, image):
+        # Get the first (hopefully largest/most prominent) rectangle
+        cards = self.find_cards(image, max_cards=1)
+        return cards[0]["corners"] if cards else None
@@ -0,0 +1,302 @@
+"""
+Export processing results to compressed columnar files and prune them from the database
+
+    python -m app.export                          # rows older than EXPORT_KEEP_DAYS
+    python -m app.export --before 2026-10-01 --dir exports --keep
+
+Rows older than --before are read in (created_at, id) order, one keyset page at a
+time, and written as one file per UTC day (a day with more than --rows-per-file
+rows is split into parts):
+
+    exports/processing_results_<YYYY-MM-DD>_<part>.npz
+
+Each file is written with numpy.savez_compressed and holds one array per column:
+
+    id                                 int64
+    created_at                         datetime64[us], UTC
+    processing_type, types             uint8 codes into the str array of type names
+    processing_time                    float64
+    filename_offsets, filename_data    UTF-8 bytes and int64 offsets (Arrow-style strings)
+    result_offsets, result_data
+
+Analytics jobs load only the columns they need (see read_export), e.g. a month of
+latencies without decoding any text and without touching the live database. A
+file is complete once it has its final name; only then are exactly the exported
+ids deleted from the database (unless --keep).
+
+The same run deletes near-duplicate hashes (image_hashes rows, see app.utils.phash)
+older than PHASH_KEEP_DAYS; they hold copies of responses and are not exported.
+"""
+import argparse
+import glob
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import String, tuple_, type_coerce
+
+from app import config, models
+from app.database import SessionLocal
+from app.utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Rows read from the database per query
+PAGE_SIZE = 10000
+
+# Ids per DELETE statement
+DELETE_CHUNK = 5000
+
+COLUMNS = ("id", "created_at", "processing_type", "processing_time", "filename", "result")
+
+
+def parse_time(value):
+    """
+    Parse an ISO 8601 date or time into the naive UTC datetimes the database stores
+
+    Args:
+        value (str): e.g. '2026-10-01', '2026-10-01T12:00:00' (UTC) or '2026-10-01T19:00:00+07:00'
+
+    Returns:
+        datetime: Naive UTC datetime
+
+    Raises:
+        ValueError: If value is not an ISO 8601 date or time
+    """
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def stored_time(column):
+    """
+    Compare and order a DateTime column by the text SQLite stores
+
+    Rows written by SQLAlchemy hold 'YYYY-MM-DD HH:MM:SS.ffffff', rows written with
+    CURRENT_TIMESTAMP hold 'YYYY-MM-DD HH:MM:SS'. The text of both sorts in time order,
+    but a datetime parameter is bound in the first form only, which compares wrong
+    against the second. Keys and bounds are therefore kept as stored text (see
+    time_bound); no CAST is emitted, so the indexes on the column still apply.
+
+    Args:
+        column: DateTime column, e.g. models.ProcessingResult.created_at
+
+    Returns:
+        Column expression typed as str
+    """
+    return type_coerce(column, String)
+
+
+def time_bound(value):
+    """
+    Format a datetime as a bound for stored_time comparisons
+
+    Whole seconds are formatted without a fraction, so a bound equals the stored text
+    of rows in either format at that second in the comparison that matters
+    ('12:00:00' <= '12:00:00' and '12:00:00.000000').
+
+    Args:
+        value (datetime): Naive UTC datetime
+
+    Returns:
+        str: 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD HH:MM:SS.ffffff'
+    """
+    return value.isoformat(" ", timespec="microseconds" if value.microsecond else "seconds")
+
+
+def _encode_strings(values):
+    data = [value.encode("utf-8") if value else b"" for value in values]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in data], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(data), dtype=np.uint8)
+
+
+def _decode_strings(offsets, data):
+    raw = data.tobytes()
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def _partition_path(directory, day):
+    # Next free part, earlier exports may have written part of the same day already
+    prefix = os.path.join(directory, f"processing_results_{day.isoformat()}_")
+    part = len(glob.glob(glob.escape(prefix) + "*.npz"))
+    return f"{prefix}{part:04d}.npz"
+
+
+def _write_partition(directory, day, rows):
+    types = sorted({row.processing_type or "" for row in rows})
+    codes = {name: code for code, name in enumerate(types)}
+    filename_offsets, filename_data = _encode_strings([row.filename for row in rows])
+    result_offsets, result_data = _encode_strings([row.result for row in rows])
+    columns = {
+        "id": np.array([row.id for row in rows], dtype=np.int64),
+        "created_at": np.array([row.created_at for row in rows], dtype="datetime64[us]"),
+        "processing_type": np.array([codes[row.processing_type or ""] for row in rows], dtype=np.uint8),
+        "types": np.array(types, dtype=str),
+        "processing_time": np.array([row.processing_time for row in rows], dtype=np.float64),
+        "filename_offsets": filename_offsets,
+        "filename_data": filename_data,
+        "result_offsets": result_offsets,
+        "result_data": result_data,
+    }
+
+    path = _partition_path(directory, day)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as output:
+        np.savez_compressed(output, **columns)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def _delete(db, ids):
+    for start in range(0, len(ids), DELETE_CHUNK):
+        db.query(models.ProcessingResult).filter(
+            models.ProcessingResult.id.in_(ids[start:start + DELETE_CHUNK])
+        ).delete(synchronize_session=False)
+    db.commit()
+
+
+def export_results(directory, before, rows_per_file=250000, prune=True):
+    """
+    Write processing results created before a time to per-day columnar files
+
+    Args:
+        directory (str): Output directory, created if missing
+        before (datetime): Export rows created before this time (naive UTC)
+        rows_per_file (int): Most rows per file, larger days are split into parts
+        prune (bool): Delete the exported rows from the database
+
+    Returns:
+        dict: files (paths written), rows (rows exported), pruned (rows deleted)
+    """
+    os.makedirs(directory, exist_ok=True)
+    summary = {"files": [], "rows": 0, "pruned": 0}
+    pending = []
+    day = None
+
+    db = SessionLocal()
+
+    def flush():
+        if not pending:
+            return
+        summary["files"].append(_write_partition(directory, day, pending))
+        summary["rows"] += len(pending)
+        if prune:
+            _delete(db, [row.id for row in pending])
+            summary["pruned"] += len(pending)
+        pending.clear()
+
+    try:
+        table = models.ProcessingResult
+        created = stored_time(table.created_at)
+        key = None
+        while True:
+            query = db.query(*(getattr(table, name) for name in COLUMNS), created.label("stored")).filter(
+                created < time_bound(before))
+            if key is not None:
+                # Keyset pagination: pruned rows behind the key do not shift later pages
+                query = query.filter(tuple_(created, table.id) > key)
+            rows = query.order_by(created, table.id).limit(PAGE_SIZE).all()
+            if not rows:
+                break
+            for row in rows:
+                row_day = row.created_at.date()
+                if row_day != day or len(pending) >= rows_per_file:
+                    flush()
+                    day = row_day
+                pending.append(row)
+            key = (rows[-1].stored, rows[-1].id)
+        flush()
+    finally:
+        db.close()
+    return summary
+
+
+def prune_image_hashes(before):
+    """
+    Delete stored near-duplicate hashes created before a time
+
+    Deletes DELETE_CHUNK rows per transaction, so writers are not blocked for long.
+    Servers with reuse on still hold the hashes in memory until they restart; a
+    pruned hash is then found but has no stored response, which counts as a miss.
+
+    Args:
+        before (datetime): Delete rows created before this time (naive UTC)
+
+    Returns:
+        int: Rows deleted
+    """
+    table = models.ImageHash
+    deleted = 0
+    db = SessionLocal()
+    try:
+        while True:
+            ids = [row_id for (row_id,) in db.query(table.id).filter(
+                stored_time(table.created_at) < time_bound(before)).limit(DELETE_CHUNK)]
+            if not ids:
+                return deleted
+            db.query(table).filter(table.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            deleted += len(ids)
+    finally:
+        db.close()
+
+
+def read_export(path, columns=None):
+    """
+    Load an exported file
+
+    Args:
+        path (str): File written by export_results
+        columns (list): Columns to load (see COLUMNS), None for all; text columns
+                        are the slowest to decode
+
+    Returns:
+        dict: Column name -> numpy array (str lists for filename and result)
+    """
+    columns = COLUMNS if columns is None else columns
+    loaded = {}
+    with np.load(path) as archive:
+        for name in columns:
+            if name == "processing_type":
+                loaded[name] = archive["types"][archive["processing_type"]]
+            elif name in ("filename", "result"):
+                loaded[name] = _decode_strings(archive[f"{name}_offsets"], archive[f"{name}_data"])
+            else:
+                loaded[name] = archive[name]
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before", help="Export rows created before this UTC date or time "
+                                         "(default: EXPORT_KEEP_DAYS days before today)")
+    parser.add_argument("--dir", default=config.EXPORT_DIR)
+    parser.add_argument("--rows-per-file", type=int, default=config.EXPORT_ROWS_PER_FILE)
+    parser.add_argument("--keep", dest="prune", action="store_false", help="Do not delete exported rows")
+    args = parser.parse_args()
+
+    if args.before:
+        before = parse_time(args.before)
+    else:
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        before = today - timedelta(days=config.EXPORT_KEEP_DAYS)
+
+    from app.database import init_db
+
+    init_db()
+    start_time = time.perf_counter()
+    summary = export_results(args.dir, before, rows_per_file=args.rows_per_file, prune=args.prune)
+    print(f"Exported {summary['rows']} rows created before {before.isoformat()} to "
+          f"{len(summary['files'])} files in {time.perf_counter() - start_time:.2f}s, pruned {summary['pruned']}")
+
+    hashes_before = datetime.utcnow() - timedelta(days=config.PHASH_KEEP_DAYS)
+    print(f"Deleted {prune_image_hashes(hashes_before)} near-duplicate hashes created before "
+          f"{hashes_before.isoformat(timespec='seconds')}")
+
+
+if __name__ == "__main__":
+    main()
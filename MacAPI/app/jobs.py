@@ -0,0 +1,355 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+from app import config, models
+from app.database import SessionLocal
+from app.utils.admission import gates as admission_gates, AdmissionRejected
+
+# Endpoints a job can run
+KINDS = ("ocr", "face_quality", "card_detection")
+FINISHED = ("done", "failed")
+
+
+def _alive(pid):
+    if pid is None or pid == os.getpid():
+        # This process has not claimed anything yet when it checks (pids repeat after a reboot)
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _timestamp(value):
+    # Stored as UTC like SQLite's CURRENT_TIMESTAMP
+    return value.isoformat(timespec="milliseconds") + "Z" if value else None
+
+
+def job_dict(job):
+    """
+    Build the API representation of a job
+
+    Args:
+        job (models.Job): Job row
+
+    Returns:
+        dict: id, batch_id, kind, status, filename, timestamps, queue_time,
+              processing_time and the result (done) or error (failed)
+    """
+    queue_time = None
+    if job.started_at and job.created_at:
+        queue_time = round((job.started_at - job.created_at).total_seconds(), 4)
+    response = {
+        "id": job.id,
+        "batch_id": job.batch_id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "created": _timestamp(job.created_at),
+        "started": _timestamp(job.started_at),
+        "finished": _timestamp(job.finished_at),
+        "queue_time": queue_time,
+        "processing_time": round(job.processing_time, 4) if job.processing_time is not None else None
+    }
+    if job.status == "done":
+        response["result"] = json.loads(job.result)
+    elif job.status == "failed":
+        response["error"] = job.error
+    return response
+
+
+class JobQueue:
+    """
+    Uploads processed in the background, persisted in the jobs table
+
+    Submitting stores every upload under directory and one 'queued' row per upload,
+    then returns. Worker tasks on the event loop claim the oldest queued row (an
+    UPDATE guarded by its status, so several server processes can share the table),
+    call the same handler as the synchronous endpoint and store its response.
+    Jobs interrupted by a shutdown go back to the queue; jobs left running by a
+    process that died are queued again when a process starts.
+    """
+
+    def __init__(self, directory="jobs", workers=2, poll_interval=1.0):
+        self.directory = directory
+        self.workers = workers
+        self.poll_interval = poll_interval
+
+        self._handlers = {}
+        self._tasks = []
+        # Set when a job is submitted here, wakes idle workers before the next poll
+        self._submitted = asyncio.Event()
+        # Set (and replaced) whenever a job finishes here, wakes long-polls
+        self._finished = asyncio.Event()
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self, handlers):
+        """
+        Requeue jobs of dead processes and start the worker tasks
+
+        Args:
+            handlers (dict): kind -> endpoint coroutine taking (file, **params)
+        """
+        self._handlers = handlers
+        requeued = await asyncio.to_thread(self._recover)
+        if requeued:
+            print(f"Requeued {requeued} interrupted jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Stop the worker tasks, running jobs go back to the queue
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind, params, files):
+        """
+        Store uploads and queue one job per file
+
+        Args:
+            kind (str): Endpoint that processes them, one of KINDS
+            params (dict): Endpoint parameters
+            files (list): UploadFile objects
+
+        Returns:
+            dict: batch_id and the queued jobs (id, filename, status)
+        """
+        batch_id = uuid.uuid4().hex
+        jobs = await asyncio.to_thread(self._store, batch_id, kind, params, files)
+        self._submitted.set()
+        return {"batch_id": batch_id, "jobs": jobs}
+
+    def get(self, job_id):
+        """
+        Args:
+            job_id (int): Job id
+
+        Returns:
+            dict: Job (see job_dict), None if there is no such job
+        """
+        db = SessionLocal()
+        try:
+            job = db.get(models.Job, job_id)
+            return job_dict(job) if job is not None else None
+        finally:
+            db.close()
+
+    def batch(self, batch_id):
+        """
+        Args:
+            batch_id (str): Batch id returned by submit
+
+        Returns:
+            list: Jobs of the batch in submission order (see job_dict)
+        """
+        db = SessionLocal()
+        try:
+            jobs = db.query(models.Job).filter(models.Job.batch_id == batch_id).order_by(models.Job.id).all()
+            return [job_dict(job) for job in jobs]
+        finally:
+            db.close()
+
+    def queued(self):
+        """
+        Returns:
+            int: Jobs waiting for a worker (all processes)
+        """
+        db = SessionLocal()
+        try:
+            return db.query(models.Job).filter(models.Job.status == "queued").count()
+        finally:
+            db.close()
+
+    async def wait(self, fetch, done, timeout):
+        """
+        Long-poll: call fetch until done(value) or timeout seconds have passed
+
+        Re-checks whenever a job finishes in this process, and every poll_interval
+        for jobs finished by other processes.
+
+        Args:
+            fetch (callable): Blocking function returning the current value
+            done (callable): Returns True when the value is final
+            timeout (float): Longest wait in seconds
+
+        Returns:
+            Any: Last value returned by fetch
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            finished = self._finished
+            value = await asyncio.to_thread(fetch)
+            remaining = deadline - time.monotonic()
+            if done(value) or remaining <= 0:
+                return value
+            try:
+                await asyncio.wait_for(finished.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+
+    def _path(self, batch_id, index):
+        return os.path.join(self.directory, f"{batch_id}_{index}")
+
+    def _store(self, batch_id, kind, params, files):
+        os.makedirs(self.directory, exist_ok=True)
+        rows = []
+        try:
+            for index, upload in enumerate(files):
+                path = self._path(batch_id, index)
+                upload.file.seek(0)
+                with open(path, "wb") as output:
+                    shutil.copyfileobj(upload.file, output)
+                rows.append(models.Job(
+                    batch_id=batch_id, kind=kind, params=json.dumps(params), filename=upload.filename,
+                    content_type=upload.content_type, path=path, status="queued", created_at=datetime.utcnow()
+                ))
+            db = SessionLocal()
+            try:
+                db.add_all(rows)
+                db.flush()
+                jobs = [{"id": row.id, "filename": row.filename, "status": row.status} for row in rows]
+                db.commit()
+            finally:
+                db.close()
+        except Exception:
+            for index in range(len(files)):
+                self._remove(self._path(batch_id, index))
+            raise
+        return jobs
+
+    def _recover(self):
+        db = SessionLocal()
+        try:
+            owners = [owner for (owner,) in db.query(models.Job.owner).filter(
+                models.Job.status == "running").distinct()]
+            dead = [owner for owner in owners if not _alive(owner)]
+            count = 0
+            if dead:
+                count = db.query(models.Job).filter(
+                    models.Job.status == "running", models.Job.owner.in_(dead)
+                ).update({"status": "queued", "owner": None, "started_at": None}, synchronize_session=False)
+                db.commit()
+            return count
+        finally:
+            db.close()
+
+    def _claim(self):
+        db = SessionLocal()
+        try:
+            while True:
+                row = db.query(models.Job.id).filter(models.Job.status == "queued").order_by(models.Job.id).first()
+                if row is None:
+                    return None
+                # Another process may claim the same row first, then try the next one
+                claimed = db.query(models.Job).filter(
+                    models.Job.id == row[0], models.Job.status == "queued"
+                ).update({"status": "running", "owner": os.getpid(), "started_at": datetime.utcnow()},
+                         synchronize_session=False)
+                db.commit()
+                if claimed:
+                    job = db.get(models.Job, row[0])
+                    return {"id": job.id, "kind": job.kind, "params": json.loads(job.params),
+                            "filename": job.filename, "content_type": job.content_type, "path": job.path}
+        finally:
+            db.close()
+
+    def _finish(self, job_id, values):
+        db = SessionLocal()
+        try:
+            db.query(models.Job).filter(models.Job.id == job_id).update(values, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def _work(self):
+        while True:
+            self._submitted.clear()
+            try:
+                job = await asyncio.to_thread(self._claim)
+            except Exception as e:
+                print(f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._submitted.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _admit(self, gate):
+        # Jobs take the endpoint's slots in the batch lane, behind interactive requests
+        while True:
+            try:
+                return await gate.acquire("batch")
+            except AdmissionRejected as e:
+                await asyncio.sleep(e.retry_after)
+
+    async def _run(self, job):
+        self.running += 1
+        start_time = time.time()
+        gate = admission_gates.get(f"/{job['kind']}")
+        admitted = None
+        try:
+            handler = self._handlers[job["kind"]]
+            if gate is not None:
+                await self._admit(gate)
+                admitted = time.perf_counter()
+            with open(job["path"], "rb") as source:
+                upload = UploadFile(source, filename=job["filename"],
+                                    headers=Headers({"content-type": job["content_type"] or ""}))
+                response = await handler(upload, **job["params"])
+            values = {"status": "done", "result": json.dumps(response, ensure_ascii=False)}
+        except asyncio.CancelledError:
+            # Shutting down: leave the upload and run the job again on the next start
+            self._finish(job["id"], {"status": "queued", "owner": None, "started_at": None})
+            raise
+        except HTTPException as e:
+            values = {"status": "failed", "error": str(e.detail)}
+        except Exception as e:
+            print(f"Error in job {job['id']}: {str(e)}")
+            values = {"status": "failed", "error": str(e)}
+        finally:
+            self.running -= 1
+            if admitted is not None:
+                gate.release(time.perf_counter() - admitted)
+
+        values.update(processing_time=time.time() - start_time, finished_at=datetime.utcnow())
+        try:
+            await asyncio.to_thread(self._finish, job["id"], values)
+            await asyncio.to_thread(self._remove, job["path"])
+        except Exception as e:
+            print(f"Error storing job {job['id']}: {str(e)}")
+        if values["status"] == "done":
+            self.completed += 1
+        else:
+            self.failed += 1
+        finished, self._finished = self._finished, asyncio.Event()
+        finished.set()
+
+
+# Shared job queue used by the endpoints
+job_queue = JobQueue(directory=config.JOB_DIR, workers=config.JOB_WORKERS, poll_interval=config.JOB_POLL_INTERVAL)
@@ -1,26 +1,40 @@
+import asyncio
+import base64
+import json
+import mimetypes
 import time
-import cv2
-import numpy as np
 import os
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy import func, tuple_
 from sqlalchemy.orm import Session
-import io
-from PIL import Image
+import tempfile
+from typing import List
 from datetime import datetime
 
-from app.database import get_db, engine, Base
-from app import models
-from app.services.ocr import recognize_text, get_supported_languages
-from app.services.face_quality import detect_face_quality
-from app.services.card_detect import detect_card
-from app.utils.image_utils import load_image, save_image
-
-# Create output directory if it doesn't exist
-os.makedirs("output", exist_ok=True)
-
-# Create tables
-Base.metadata.create_all(bind=engine)
+from app.database import get_db, init_db
+from app import config, models
+from app.services.ocr import recognize_text, get_supported_languages, parse_languages, parse_regions, LEVELS
+from app.services.face_quality import detect_face_quality, detect_face, crop_face
+from app.services.card_detect import detect_card, detect_card_or_none, detect_cards, find_card_corners
+from app.utils.image_utils import PreparedImage, iter_pages, iter_video_frames, sample_indices
+from app.utils.frames import LatestFrame
+from app.utils.upload import read_upload, check_upload_size
+from app.utils.output_writer import output_writer
+from app.utils.output_store import output_store, parse_range, read_range
+from app.engines import get_engine, check_engines, available_engines
+from app.engines.base import image_size
+from app.utils.admission import gates as admission_gates, AdmissionRejected, LANES
+from app.utils.executor import run_in_executor, start_executor, shutdown_executor, pending_calls
+from app.utils.cache import result_cache, make_cache_key, cache_scope
+from app.utils.phash import near_duplicates
+from app.result_writer import result_writer
+from app.export import parse_time, stored_time, time_bound
+from app.jobs import job_queue, KINDS as JOB_KINDS, FINISHED as JOB_FINISHED
+from app.utils.latency_stats import latency_stats
+from app.utils.metrics import (
+    StageTimer, Counter, Gauge, render_metrics, request_seconds, in_flight_requests
+)
 
 app = FastAPI(title="Document Processing API", 
               description="API for OCR, face quality, and card detection using Vision framework. Supports multiple languages including Thai (th) and English (en).")
@@ -28,11 +42,251 @@ app = FastAPI(title="Document Processing API",
 # ค่าคงที่สำหรับการคำนวณ Rack Cooling Rate (ปรับได้ตามต้องการ)
 COOLING_FACTOR = 0.5  # ปัจจัยสมมติสำหรับปรับสเกล Rack Cooling Rate
 
+# Endpoints with their own label in request metrics, everything else is "other"
+INSTRUMENTED_PATHS = {"/ocr", "/ocr/document", "/face_quality", "/face_quality/best", "/card_detection", "/analyze"}
+
+# Queue depths and cache counters are read when /metrics is scraped
+Gauge("result_writer_queue_depth", "Result rows waiting for the database writer",
+      func=result_writer.queue_depth)
+Counter("result_writer_dropped_total", "Result rows dropped because the database writer queue was full",
+        func=lambda: result_writer.dropped)
+Gauge("output_queue_depth", "Output images waiting to be written",
+      func=output_writer.queue_depth)
+Gauge("output_store_bytes", "Bytes used by output images", func=lambda: output_store.stats()["bytes"])
+Gauge("output_store_files", "Number of output images", func=lambda: output_store.stats()["files"])
+Gauge("executor_pending_calls", "Engine calls queued or running in the worker pool",
+      func=pending_calls)
+Gauge("engine_requests_idle", "Pooled engine request objects waiting for a call (this process)",
+      func=lambda: get_engine().pool.idle())
+Counter("engine_requests_created_total", "Engine request objects created (this process)",
+        func=lambda: get_engine().pool.created)
+Gauge("jobs_queued", "Background jobs waiting for a worker (all processes)", func=job_queue.queued)
+Gauge("jobs_running", "Background jobs running in this process", func=lambda: job_queue.running)
+Counter("jobs_completed_total", "Background jobs completed (this process)", func=lambda: job_queue.completed)
+Counter("jobs_failed_total", "Background jobs failed (this process)", func=lambda: job_queue.failed)
+stream_connections = Gauge("stream_connections", "Open /stream WebSocket connections")
+stream_frames_total = Counter("stream_frames_total", "Camera frames received over /stream")
+stream_frames_dropped_total = Counter("stream_frames_dropped_total",
+                                      "Camera frames replaced by a newer one before they were processed")
+if result_cache:
+    Counter("cache_hits_total", "Result cache hits", func=lambda: result_cache.hits)
+    Counter("cache_misses_total", "Result cache misses", func=lambda: result_cache.misses)
+if near_duplicates.reuse:
+    Counter("near_duplicate_hits_total", "Uploads answered with a near-duplicate's stored result",
+            func=lambda: near_duplicates.hits)
+    Counter("near_duplicate_misses_total", "Uploads with no near-duplicate stored",
+            func=lambda: near_duplicates.misses)
+    Counter("near_duplicate_rejected_total", "Close hashes whose thumbnails showed a different image",
+            func=lambda: near_duplicates.rejected)
+    Gauge("near_duplicate_hashes", "Perceptual hashes held in memory",
+          func=lambda: near_duplicates.stats()["hashes"])
+
+# How often the auto OCR level has to fall back to the accurate level
+ocr_auto_total = Counter("ocr_auto_total", "OCR runs at the auto level")
+ocr_escalations_total = Counter("ocr_escalations_total", "Auto level OCR runs that re-ran lines at the accurate level")
+ocr_escalated_lines_total = Counter("ocr_escalated_lines_total", "Lines re-run at the accurate level")
+
+def record_escalation(result):
+    # Engine calls may run in another process, so count from the result here
+    if "escalated" not in result:
+        return
+    ocr_auto_total.inc()
+    if result["escalated"]:
+        ocr_escalations_total.inc()
+        ocr_escalated_lines_total.inc(amount=result["escalated"])
+
+def check_level(level):
+    if level and level not in LEVELS:
+        raise HTTPException(status_code=400, detail=f"level must be one of {', '.join(LEVELS)}")
+    return level or config.OCR_LEVEL
+
+def check_languages(languages):
+    try:
+        return parse_languages(languages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid languages: {str(e)}")
+
+def open_image(contents):
+    # Garbage with an image content type fails here, on the header
+    try:
+        return PreparedImage(contents)
+    except (OSError, ValueError):
+        raise HTTPException(status_code=400, detail="File is not a valid image")
+
+def check_detector(detector):
+    # Known engines that cannot be loaded here (vision without pyobjc) are refused like unknown ones
+    if detector and detector not in available_engines():
+        raise HTTPException(status_code=400, detail=f"detector must be one of {', '.join(available_engines())}")
+    return detector
+
+async def decode_image(image, **settings):
+    # A valid header can still hide truncated or corrupt pixel data
+    try:
+        return await asyncio.to_thread(image.decode, **settings)
+    except (OSError, ValueError):
+        raise HTTPException(status_code=400, detail="File is not a valid image")
+
+async def find_result(contents, endpoint, params, timer, settings):
+    """
+    Look up a stored result for an upload, or decode it for inference
+
+    Tries the result cache, then (with PHASH_INDEX) near-duplicates of earlier uploads,
+    hashed from the copy inference needs anyway. On a miss only that copy has been
+    decoded, off the event loop; the output writer decodes full resolution itself.
+
+    Args:
+        contents (bytes): Raw upload bytes
+        endpoint (str): Endpoint name, e.g. 'ocr'
+        params (dict): Parameters that change the result (see make_cache_key)
+        timer (StageTimer): Timer of the request
+        settings (dict): Inference size (config.INFER_SETTINGS), empty for full resolution
+
+    Returns:
+        dict: cached (stored response, None on a miss), image (PreparedImage, None when
+              served from the result cache), distance (hash distance of a near-duplicate
+              hit) and what store_result needs
+    """
+    found = {"cached": None, "image": None, "distance": None, "fingerprint": None,
+             "cache_key": None, "scope": None}
+    with timer.stage("cache_lookup"):
+        found["cache_key"] = make_cache_key(contents, endpoint, **params)
+        found["cached"] = result_cache.get(found["cache_key"]) if result_cache else None
+    if found["cached"] is not None:
+        return found
+
+    if config.PHASH_INDEX:
+        # Near-duplicates (re-encoded, resized) of a processed upload can reuse its stored result
+        with timer.stage("phash"):
+            image = found["image"] = open_image(contents)
+            found["scope"] = cache_scope(endpoint, **params)
+            view = await decode_image(image, **settings)
+            found["fingerprint"], found["cached"], found["distance"] = await near_duplicates.lookup(
+                view, found["scope"], (image.width, image.height))
+            if found["cached"] is not None and result_cache:
+                result_cache.set(found["cache_key"], found["cached"])
+        return found
+
+    with timer.stage("decode"):
+        image = found["image"] = open_image(contents)
+        await decode_image(image, **settings)
+    return found
+
+def store_result(found, cached):
+    """
+    Store a new result in the result cache and the near-duplicate index
+
+    Args:
+        found (dict): Lookup of the upload (see find_result)
+        cached (dict): Response to store
+    """
+    if result_cache:
+        result_cache.set(found["cache_key"], cached)
+    if found["fingerprint"] is not None:
+        near_duplicates.add(found["scope"], found["fingerprint"], cached)
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # Wait for a slot before the upload body is read, so queued requests hold no image in memory
+    gate = admission_gates.get(request.url.path)
+    if gate is None or request.method != "POST":
+        return await call_next(request)
+
+    lane = request.headers.get(config.ADMISSION_PRIORITY_HEADER, LANES[0]).strip().lower()
+    if lane not in LANES:
+        lane = LANES[0]
+    try:
+        queue_time = await gate.acquire(lane)
+    except AdmissionRejected as e:
+        return JSONResponse(status_code=429, content={"detail": "Too many requests, try again later"},
+                            headers={"Retry-After": str(e.retry_after)})
+
+    start_time = time.perf_counter()
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            gate.release(time.perf_counter() - start_time)
+
+    async def body(iterator):
+        # Streamed responses (/ocr/document) keep their slot until the last chunk is sent
+        try:
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            release()
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        release()
+        raise
+    response.body_iterator = body(response.body_iterator)
+    # Queue wait is reported apart from processing_time, which starts once the handler runs
+    response.headers["X-Queue-Time"] = f"{queue_time:.4f}"
+    return response
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Reject oversized uploads from the header, before the body is read at all
+    content_length = request.headers.get("content-length")
+    # Bulk job submissions carry many files, each is checked against MAX_UPLOAD_BYTES on its own
+    limit = config.JOB_MAX_REQUEST_BYTES if request.url.path == "/jobs" else config.MAX_UPLOAD_BYTES
+    if content_length and content_length.isdigit() and int(content_length) > limit + 64 * 1024:
+        return JSONResponse(status_code=413,
+                            content={"detail": f"File too large, the limit is {limit} bytes"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    endpoint = request.url.path if request.url.path in INSTRUMENTED_PATHS else "other"
+    in_flight_requests.inc(endpoint)
+    start_time = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        in_flight_requests.dec(endpoint)
+        request_seconds.observe(time.perf_counter() - start_time, endpoint)
+
+@app.on_event("startup")
+def startup():
+    # Database and engine work happens here rather than at import, so importing the app stays
+    # cheap and a preforking parent can import it without opening connections or threads
+    check_engines()
+    init_db()
+    near_duplicates.load()
+    # Warm engine request objects before taking traffic
+    start_executor()
+    result_writer.start()
+    output_store.start()
+    output_writer.start()
+
+@app.on_event("startup")
+async def start_jobs():
+    # Workers are tasks on the event loop, started once the tables exist
+    await job_queue.start({"ocr": ocr, "face_quality": face_quality, "card_detection": card_detection})
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    # Before the executor shuts down; running jobs go back to the queue
+    await job_queue.stop()
+
+@app.on_event("shutdown")
+def shutdown():
+    # Let running engine calls finish before the worker exits, then flush their rows and images
+    shutdown_executor()
+    result_writer.stop()
+    output_writer.stop()
+    output_store.stop()
+
 @app.post("/ocr")
 async def ocr(
     file: UploadFile = File(...), 
     languages: str = None,
-    db: Session = Depends(get_db)
+    regions: str = None,
+    level: str = None,
+    stages: bool = False
 ):
     """
     Extract text from image using OCR and calculate processing rates
@@ -40,72 +294,229 @@ async def ocr(
     - **file**: Image file to process
     - **languages**: Comma-separated list of language codes (e.g. 'en,th,ja')
                     Leave empty for automatic language detection (defaults to Thai and English)
+    - **regions**: Only recognize these regions, as JSON: a list of [x, y, width, height] or an object
+                  of name -> [x, y, width, height], in fractions of the image size with top-left origin
+                  (e.g. '{"id_number": [0.35, 0.18, 0.5, 0.08]}')
+    - **level**: Recognition level: 'fast', 'accurate' or 'auto' (fast first, low confidence lines again
+                at accurate); defaults to the server setting
+    - **stages**: Include the time spent in each stage (read, decode, inference, ...) in the response
     """
     try:
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
         
         start_time = time.time()
-        image = load_image(await file.read())
+        timer = StageTimer("ocr")
+        with timer.stage("read"):
+            contents = await read_upload(file)
         
         # Parse languages parameter
-        language_list = None
-        if languages:
-            language_list = [lang.strip() for lang in languages.split(',')]
+        language_list = check_languages(languages)
         
-        # Process image
-        result = recognize_text(image, language_list)
-        processing_time = time.time() - start_time
+        try:
+            region_map = parse_regions(regions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regions: {str(e)}")
+        level = check_level(level)
+        
+        # Re-uploads of the same image with the same languages, regions and level reuse the stored result
+        params = dict(languages=language_list, regions=region_map, level=level)
+        found = await find_result(contents, "ocr", params, timer, config.INFER_SETTINGS["ocr"])
+        cached, image = found["cached"], found["image"]
+        if cached is None:
+            # Process image
+            with timer.stage("inference"):
+                result = await run_in_executor(recognize_text, image, language_list,
+                                               regions=region_map, level=level)
+            processing_time = time.time() - start_time
+            record_escalation(result)
+            
+            # Queue processed image for the background output writer (named by content hash)
+            with timer.stage("save_image"):
+                processed_output_path = await output_writer.submit(image, contents, "ocr")
+            
+            latency_stats.record("ocr", processing_time)
+
+            # Queue result for the background database writer
+            with timer.stage("db"):
+                result_writer.add(
+                    filename=file.filename,
+                    processing_type="ocr",
+                    result=result["text"],
+                    processing_time=processing_time
+                )
+            
+            cached = {
+                "text": result["text"],
+                "dimensions": {
+                    "width": result["dimensions"][0],
+                    "height": result["dimensions"][1]
+                },
+                "text_observations": result["text_observations"],
+                "processed_output_path": processed_output_path,
+                "detected_languages": result.get("detected_languages") or []
+            }
+            if region_map:
+                cached["regions"] = result["regions"]
+            if "escalated" in result:
+                cached["escalated_lines"] = result["escalated"]
+            store_result(found, cached)
+            from_cache = False
+        else:
+            processing_time = time.time() - start_time
+            from_cache = True
         
         # คำนวณ Fast Rate (operations per second)
         fast_rate = 1.0 / processing_time if processing_time > 0 else 0.0
         
         # คำนวณ Rack Cooling Rate (สมมติเป็นหน่วยสมมติ เช่น efficiency units per second)
         cooling_rate = 1.0 / (processing_time * COOLING_FACTOR) if processing_time > 0 else 0.0
-            
-        # Save processed image
-        timestamp = int(time.time())
-        processed_output_path = f"output/{timestamp}_ocr_processed.jpg"
-        save_image(image, processed_output_path)  
-        
-        # Save result to database
-        db_result = models.ProcessingResult(
-            filename=file.filename,
-            processing_type="ocr",
-            result=result["text"],
-            processing_time=processing_time
-        )
-        db.add(db_result)
-        db.commit()
         
         # Format response with rates, dimensions, and created time
         response = {
-            "text": result["text"],
-            "dimensions": {
-                "width": result["dimensions"][0],
-                "height": result["dimensions"][1]
-            },
+            "text": cached["text"],
+            "text_observations": cached.get("text_observations", []),
+            "dimensions": cached["dimensions"],
             "processing_time": round(processing_time, 4),
             "fast_rate": round(fast_rate, 4),
             "rack_cooling_rate": round(cooling_rate, 4),
-            "processed_output_path": processed_output_path,
+            "processed_output_path": cached["processed_output_path"],
+            "cached": from_cache,
             "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
+        if "regions" in cached:
+            response["regions"] = cached["regions"]
+        response["level"] = level
+        if found["distance"] is not None:
+            response["near_duplicate"] = {"distance": found["distance"]}
+        if "escalated_lines" in cached:
+            response["escalated_lines"] = cached["escalated_lines"]
+        
+        if stages:
+            response["stages"] = timer.summary()
+        
         # Add languages used if specified or detected
         if language_list:
             response["languages_used"] = language_list
-        if "detected_languages" in result and result["detected_languages"]:
-            response["detected_languages"] = result["detected_languages"]
+        if cached["detected_languages"]:
+            response["detected_languages"] = cached["detected_languages"]
         
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in OCR endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
+@app.post("/ocr/document")
+async def ocr_document(
+    file: UploadFile = File(...),
+    languages: str = None,
+    level: str = None
+):
+    """
+    Extract text from every page of a multi-page image (e.g. a multi-page TIFF scan)
+    
+    Pages are decoded one at a time and OCR'd concurrently; each page is streamed back
+    as one line of NDJSON as soon as it finishes (so pages may arrive out of order),
+    followed by a final summary line.
+    
+    - **file**: Multi-page image file to process (single-page images work too)
+    - **languages**: Comma-separated list of language codes (e.g. 'en,th,ja')
+    - **level**: Recognition level: 'fast', 'accurate' or 'auto'; defaults to the server setting
+    """
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    level = check_level(level)
+    
+    start_time = time.time()
+    # Pages are decoded straight from the spooled upload, the document is never held in memory whole
+    check_upload_size(file)
+    
+    language_list = check_languages(languages)
+    
+    # Fail before streaming starts if the upload is not an image at all
+    pages = iter_pages(file.file, config.DOCUMENT_MAX_PAGES)
+    try:
+        first_page = await asyncio.to_thread(next, pages, None)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read document: {str(e)}")
+    
+    async def ocr_page(index, page):
+        page_start = time.time()
+        try:
+            result = await run_in_executor(recognize_text, page, language_list, level=level)
+        except Exception as e:
+            print(f"Error in OCR document endpoint (page {index + 1}): {str(e)}")
+            return {"page": index + 1, "error": str(e)}
+        processing_time = time.time() - page_start
+        record_escalation(result)
+        
+        latency_stats.record("ocr_document", processing_time)
+        result_writer.add(
+            filename=f"{file.filename}#page{index + 1}",
+            processing_type="ocr_document",
+            result=result["text"],
+            processing_time=processing_time
+        )
+        return {
+            "page": index + 1,
+            "text": result["text"],
+            "dimensions": {
+                "width": result["dimensions"][0],
+                "height": result["dimensions"][1]
+            },
+            "detected_languages": result.get("detected_languages") or [],
+            "processing_time": round(processing_time, 4)
+        }
+    
+    async def stream():
+        # At most DOCUMENT_CONCURRENCY pages are decoded and in flight at a time
+        next_page = first_page
+        running = set()
+        done_pages = 0
+        failed_pages = 0
+        try:
+            while next_page is not None or running:
+                while next_page is not None and len(running) < config.DOCUMENT_CONCURRENCY:
+                    running.add(asyncio.create_task(ocr_page(*next_page)))
+                    try:
+                        next_page = await asyncio.to_thread(next, pages, None)
+                    except Exception as e:
+                        # Damaged frame: report it and stop reading, pages already running still finish
+                        print(f"Error in OCR document endpoint (decode): {str(e)}")
+                        yield json.dumps({"error": f"Could not read page: {str(e)}"}, ensure_ascii=False) + "\n"
+                        next_page = None
+                
+                finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    page_result = task.result()
+                    done_pages += 1
+                    failed_pages += "error" in page_result
+                    yield json.dumps(page_result, ensure_ascii=False) + "\n"
+            
+            yield json.dumps({
+                "pages": done_pages,
+                "failed_pages": failed_pages,
+                "processing_time": round(time.time() - start_time, 4),
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }) + "\n"
+        finally:
+            # Client went away: drop pages that have not started
+            for task in running:
+                task.cancel()
+            try:
+                pages.close()
+            except ValueError:
+                # Still decoding a page in its thread, it is dropped with the generator
+                pass
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 @app.post("/face_quality")
-async def face_quality(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def face_quality(file: UploadFile = File(...), stages: bool = False):
     """
     Detect face quality in image and calculate processing rates
     """
@@ -114,157 +525,912 @@ async def face_quality(file: UploadFile = File(...), db: Session = Depends(get_d
             raise HTTPException(status_code=400, detail="File must be an image")
         
         start_time = time.time()
-        image = load_image(await file.read())
+        timer = StageTimer("face_quality")
+        with timer.stage("read"):
+            contents = await read_upload(file)
         
-        # Process image
-        quality_score = detect_face_quality(image)
-        processing_time = time.time() - start_time
+        params = {}
+        found = await find_result(contents, "face_quality", params, timer, config.INFER_SETTINGS["face_quality"])
+        cached, image = found["cached"], found["image"]
+        if cached is None:
+            # Process image
+            with timer.stage("inference"):
+                quality_score = await run_in_executor(detect_face_quality, image)
+            processing_time = time.time() - start_time
+            
+            # Queue processed image for the background output writer (named by content hash)
+            with timer.stage("save_image"):
+                processed_output_path = await output_writer.submit(image, contents, "face_quality")
+            
+            # Get image dimensions
+            width, height = image.width, image.height
+            
+            latency_stats.record("face_quality", processing_time)
+
+            # Queue result for the background database writer
+            with timer.stage("db"):
+                result_writer.add(
+                    filename=file.filename,
+                    processing_type="face_quality",
+                    result=str(quality_score),
+                    processing_time=processing_time
+                )
+            
+            cached = {
+                "quality_score": quality_score,
+                "dimensions": {
+                    "width": width,
+                    "height": height
+                },
+                "processed_output_path": processed_output_path
+            }
+            store_result(found, cached)
+            from_cache = False
+        else:
+            processing_time = time.time() - start_time
+            from_cache = True
 
         # คำนวณ Fast Rate (operations per second)
         fast_rate = 1.0 / processing_time if processing_time > 0 else 0.0
         
         # คำนวณ Rack Cooling Rate
         cooling_rate = 1.0 / (processing_time * COOLING_FACTOR) if processing_time > 0 else 0.0
+        
+        response = {
+            "quality_score": cached["quality_score"],
+            "dimensions": cached["dimensions"],
+            "processing_time": round(processing_time, 4),
+            "fast_rate": round(fast_rate, 4),
+            "rack_cooling_rate": round(cooling_rate, 4),
+            "processed_output_path": cached["processed_output_path"],
+            "cached": from_cache,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        if found["distance"] is not None:
+            response["near_duplicate"] = {"distance": found["distance"]}
+        if stages:
+            response["stages"] = timer.summary()
+        
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in face quality endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-        # Save processed image
-        timestamp = int(time.time())
-        processed_output_path = f"output/{timestamp}_face_quality_processed.jpg"
-        save_image(image, processed_output_path) 
+
+@app.post("/face_quality/best")
+async def face_quality_best(
+    files: List[UploadFile] = File(...),
+    target_score: float = None,
+    max_frames: int = None,
+    stages: bool = False
+):
+    """
+    Pick the frame with the best face out of a batch of images or a short video clip
+    
+    Up to max_frames evenly spaced frames are scored concurrently; sampling stops as
+    soon as a frame reaches target_score. The best frame's face is cropped and saved,
+    and one result row is written for the whole batch.
+    
+    - **files**: Several images, or one video clip
+    - **target_score**: Stop at the first frame scoring at least this (0.0 - 1.0), 0 to score
+                       every sampled frame; defaults to the server setting
+    - **max_frames**: Most frames to score; defaults to the server setting
+    """
+    tmp_path = None
+    try:
+        videos = [upload for upload in files if (upload.content_type or "").startswith("video/")]
+        if videos and len(files) > 1:
+            raise HTTPException(status_code=400, detail="Send either one video clip or a batch of images")
+        if not videos and any(not (upload.content_type or "").startswith("image/") for upload in files):
+            raise HTTPException(status_code=400, detail="Files must be images or a video clip")
+        target = config.FACE_BEST_TARGET_SCORE if target_score is None else target_score
+        if not 0.0 <= target <= 1.0:
+            raise HTTPException(status_code=400, detail="target_score must be between 0.0 and 1.0")
+        if max_frames is not None and max_frames < 1:
+            raise HTTPException(status_code=400, detail="max_frames must be at least 1")
+        max_frames = max_frames or config.FACE_BEST_MAX_FRAMES
         
-        # Get image dimensions
-        height, width = image.shape[:2]
+        start_time = time.time()
+        timer = StageTimer("face_quality_best")
+        with timer.stage("read"):
+            if videos:
+                clip = videos[0]
+                contents = await read_upload(clip)
+                # OpenCV only reads videos from a path
+                suffix = os.path.splitext(clip.filename or "")[1] or ".mp4"
+                with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                    tmp_path = tmp.name
+                    await asyncio.to_thread(tmp.write, contents)
+                frames = iter_video_frames(tmp_path, max_frames)
+            else:
+                # Only sampled images are read; each one is decoded by the worker that scores it
+                uploads = {}
+                for index in sample_indices(len(files), max_frames):
+                    uploads[index] = (files[index].filename, await read_upload(files[index]))
+                frames = ((index, data) for index, (_, data) in uploads.items())
         
-        # Save result to database
-        db_result = models.ProcessingResult(
-            filename=file.filename,
-            processing_type="face_quality",
-            result=str(quality_score),
-            processing_time=processing_time
-        )
-        db.add(db_result)
-        db.commit()
+        async def score_frame(index, frame):
+            try:
+                if isinstance(frame, bytes):
+                    frame = PreparedImage(frame)
+                return index, frame, await run_in_executor(detect_face, frame)
+            except Exception as e:
+                print(f"Error in face quality best endpoint (frame {index}): {str(e)}")
+                return index, frame, {"error": str(e)}
         
-        return {
-            "quality_score": quality_score,
+        scores = []
+        best = None  # (index, frame, result) of the best frame so far
+        early_exit = False
+        running = set()
+        try:
+            with timer.stage("inference"):
+                try:
+                    next_frame = await asyncio.to_thread(next, frames, None)
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Could not read frames: {str(e)}")
+                
+                # At most FACE_BEST_CONCURRENCY frames are decoded and in flight at a time
+                while next_frame is not None or running:
+                    while next_frame is not None and len(running) < config.FACE_BEST_CONCURRENCY:
+                        running.add(asyncio.create_task(score_frame(*next_frame)))
+                        try:
+                            next_frame = await asyncio.to_thread(next, frames, None)
+                        except Exception as e:
+                            # Damaged clip: score what was read so far
+                            print(f"Error in face quality best endpoint (decode): {str(e)}")
+                            next_frame = None
+                    
+                    finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        index, frame, result = task.result()
+                        if "error" in result:
+                            scores.append({"index": index, "error": result["error"]})
+                            continue
+                        scores.append({"index": index, "quality_score": round(result["quality_score"], 4)})
+                        # Ties go to the earlier frame
+                        if best is None or (result["quality_score"], -index) > (best[2]["quality_score"], -best[0]):
+                            best = (index, frame, result)
+                    
+                    if target and best is not None and best[2]["quality_score"] >= target:
+                        early_exit = True
+                        break
+        finally:
+            # Early exit or client gone: drop frames that have not started
+            for task in running:
+                task.cancel()
+            try:
+                frames.close()
+            except ValueError:
+                # Still decoding a frame in its thread, it is dropped with the generator
+                pass
+        
+        if best is None:
+            raise HTTPException(status_code=400, detail="No frame could be scored")
+        best_index, best_frame, best_result = best
+        
+        with timer.stage("save_image"):
+            face = await asyncio.to_thread(crop_face, best_frame, best_result["bounding_box"])
+            if videos:
+                source, variant = contents, f"_face{best_index}"
+                filename = f"{clip.filename}#frame{best_index}"
+            else:
+                filename, source = uploads[best_index]
+                variant = "_face"
+            processed_output_path = await output_writer.submit(face, source, "face_quality", variant)
+        processing_time = time.time() - start_time
+        
+        latency_stats.record("face_quality_best", processing_time)
+        
+        # One row for the whole batch
+        with timer.stage("db"):
+            result_writer.add(
+                filename=filename,
+                processing_type="face_quality_best",
+                result=json.dumps({
+                    "best_index": best_index,
+                    "quality_score": best_result["quality_score"],
+                    "frames_scored": len(scores)
+                }),
+                processing_time=processing_time
+            )
+        
+        fast_rate = 1.0 / processing_time if processing_time > 0 else 0.0
+        cooling_rate = 1.0 / (processing_time * COOLING_FACTOR) if processing_time > 0 else 0.0
+        
+        frame_width, frame_height = image_size(best_frame)
+        response = {
+            "best_index": best_index,
+            "filename": filename,
+            "quality_score": best_result["quality_score"],
+            "bounding_box": best_result["bounding_box"],
             "dimensions": {
-                "width": width,
-                "height": height
+                "width": frame_width,
+                "height": frame_height
             },
+            "frames_scored": len(scores),
+            "early_exit": early_exit,
+            "scores": sorted(scores, key=lambda frame_score: frame_score["index"]),
             "processing_time": round(processing_time, 4),
             "fast_rate": round(fast_rate, 4),
             "rack_cooling_rate": round(cooling_rate, 4),
             "processed_output_path": processed_output_path,
             "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
+        if stages:
+            response["stages"] = timer.summary()
+        
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in face quality endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
-
+        print(f"Error in face quality best endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing frames: {str(e)}")
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
 
 @app.post("/card_detection")
-async def card_detection(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def card_detection(
+    file: UploadFile = File(...),
+    detector: str = None,
+    all_cards: bool = False,
+    stages: bool = False
+):
     """
     Detect card in image, correct perspective, and calculate processing rates
+    
+    - **detector**: Engine that finds the card: 'vision', 'stub' or 'opencv'; defaults to the server setting
+    - **all_cards**: Return every card found (ranked by area and score), each warped at full resolution
     """
     try:
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
+        check_detector(detector)
+        detector = detector or config.CARD_DETECTOR
         
         start_time = time.time()
-        image = load_image(await file.read())
+        timer = StageTimer("card_detection")
+        with timer.stage("read"):
+            contents = await read_upload(file)
         
-        # Process image
-        processed_image = detect_card(image)
-        processing_time = time.time() - start_time
+        # The default detector is named too, so changing CARD_DETECTOR does not reuse old results
+        params = dict(detector=detector or config.CARD_DETECTOR, all_cards=all_cards)
+        # Full resolution is needed to warp the card
+        found = await find_result(contents, "card_detection", params, timer, {})
+        cached, image = found["cached"], found["image"]
+        if cached is None:
+            # Process image
+            with timer.stage("inference"):
+                if all_cards:
+                    cards = await run_in_executor(detect_cards, image, detector=detector)
+                    # Original image if no card was found, like detect_card
+                    processed_image = cards[0]["image"] if cards else image
+                else:
+                    processed_image = await run_in_executor(detect_card, image, detector=detector)
+            processing_time = time.time() - start_time
+
+            # Queue processed image for the background output writer (named by content hash)
+            with timer.stage("save_image"):
+                processed_output_path = await output_writer.submit(processed_image, contents, "card_detection",
+                                                                   params=params)
+                if all_cards:
+                    card_results = []
+                    for index, card in enumerate(cards):
+                        # The best card is the main processed image, the others get their own file
+                        card_path = processed_output_path
+                        if index:
+                            card_path = await output_writer.submit(card["image"], contents, "card_detection",
+                                                                   variant=f"_card{index + 1}", params=params)
+                        card_results.append({
+                            "corners": [[round(float(x), 1), round(float(y), 1)] for x, y in card["corners"]],
+                            "score": card["score"],
+                            "area": card["area"],
+                            "dimensions": {
+                                "width": card["image"].shape[1],
+                                "height": card["image"].shape[0]
+                            },
+                            "processed_output_path": card_path
+                        })
+            
+            # Get original image dimensions
+            width, height = image.width, image.height
+            
+            latency_stats.record("card_detection", processing_time)
+
+            # Queue result for the background database writer
+            with timer.stage("db"):
+                result_writer.add(
+                    filename=file.filename,
+                    processing_type="card_detection",
+                    result=processed_output_path,
+                    processing_time=processing_time
+                )
+            
+            cached = {
+                "dimensions": {
+                    "width": width,
+                    "height": height
+                },
+                "processed_output_path": processed_output_path
+            }
+            if all_cards:
+                cached["cards"] = card_results
+            store_result(found, cached)
+            from_cache = False
+        else:
+            processing_time = time.time() - start_time
+            from_cache = True
         
         # คำนวณ Fast Rate (operations per second)
         fast_rate = 1.0 / processing_time if processing_time > 0 else 0.0
         
         # คำนวณ Rack Cooling Rate
         cooling_rate = 1.0 / (processing_time * COOLING_FACTOR) if processing_time > 0 else 0.0
-
-         # Save processed image
-        timestamp = int(time.time())
-        processed_output_path = f"output/{timestamp}_card_detection_processed.jpg"
-        save_image(image, processed_output_path)  
-        
-        # Get original image dimensions
-        height, width = image.shape[:2]
-        
-        # Save result to database
-        db_result = models.ProcessingResult(
-            filename=file.filename,
-            processing_type="card_detection",
-            result=processed_output_path,
-            processing_time=processing_time
-        )
-        db.add(db_result)
-        db.commit()
         
-        return {
+        response = {
             "message": "Card detected and corrected",
-            "dimensions": {
-                "width": width,
-                "height": height
-            },
+            "dimensions": cached["dimensions"],
             "processing_time": round(processing_time, 4),
             "fast_rate": round(fast_rate, 4),
             "rack_cooling_rate": round(cooling_rate, 4),
-            "processed_output_path": processed_output_path,
+            "processed_output_path": cached["processed_output_path"],
+            "detector": detector,
+            "cached": from_cache,
             "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
+        if "cards" in cached:
+            response["cards"] = cached["cards"]
+        if found["distance"] is not None:
+            response["near_duplicate"] = {"distance": found["distance"]}
+        if stages:
+            response["stages"] = timer.summary()
+        
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in card detection endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
 
+# Analyses available in /analyze, in the order they are reported
+ANALYSES = ["card_detection", "ocr", "face_quality"]
+
+@app.post("/analyze")
+async def analyze(
+    file: UploadFile = File(...),
+    analyses: str = None,
+    languages: str = None
+):
+    """
+    Run several analyses on one uploaded image
+
+    The image is decoded once. Card detection runs first and OCR reads the
+    perspective-corrected card instead of the full frame, while face quality
+    runs concurrently.
+
+    - **file**: Image file to process
+    - **analyses**: Comma-separated list of analyses (card_detection, ocr, face_quality)
+                    Leave empty to run all of them
+    - **languages**: Comma-separated list of OCR language codes (e.g. 'en,th,ja')
+    """
+    try:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+        requested = ANALYSES
+        if analyses:
+            requested = [name.strip() for name in analyses.split(',') if name.strip()]
+            unknown = [name for name in requested if name not in ANALYSES]
+            if unknown:
+                raise HTTPException(status_code=400,
+                                    detail=f"Unknown analyses: {', '.join(unknown)}. Use {', '.join(ANALYSES)}")
+            requested = [name for name in ANALYSES if name in requested]
+
+        language_list = check_languages(languages)
+
+        start_time = time.time()
+        timer = StageTimer("analyze")
+        with timer.stage("read"):
+            contents = await read_upload(file)
+
+        with timer.stage("cache_lookup"):
+            # The card detector changes the card, and so the OCR text read from it
+            cache_key = make_cache_key(contents, "analyze", analyses=requested, languages=language_list,
+                                       level=config.OCR_LEVEL, detector=config.CARD_DETECTOR)
+            cached = result_cache.get(cache_key) if result_cache else None
+
+        if cached is None:
+            with timer.stage("decode"):
+                image = open_image(contents)
+                for name in requested:
+                    if name == "ocr" and "card_detection" in requested:
+                        # OCR reads the card; the full frame copy only if no card is found
+                        continue
+                    # Card detection and face quality usually share one inference-sized copy
+                    await decode_image(image, **config.INFER_SETTINGS[name])
+
+            async def timed(stage, func, *args):
+                with timer.stage(stage):
+                    return await run_in_executor(func, *args)
+
+            async def card_then_ocr():
+                card = None
+                if "card_detection" in requested:
+                    # None when no card is found, full resolution is only decoded to warp a card
+                    card = await timed("card_detection", detect_card_or_none, image)
+                if "ocr" in requested:
+                    # OCR the corrected card when we have it, fewer pixels and no background text
+                    text_result = await timed("ocr", recognize_text, card if card is not None else image, language_list)
+                    record_escalation(text_result)
+                    return card, text_result
+                return card, None
+
+            async def face():
+                if "face_quality" in requested:
+                    return await timed("face_quality", detect_face_quality, image)
+                return None
+
+            (card, text_result), quality_score = await asyncio.gather(card_then_ocr(), face())
+            processing_time = time.time() - start_time
+
+            # Save the corrected card if we have one, otherwise the uploaded image
+            with timer.stage("save_image"):
+                processed_output_path = await output_writer.submit(
+                    card if card is not None else image, contents, "analyze", params=dict(analyses=requested, detector=config.CARD_DETECTOR)
+                )
+
+            cached = {
+                "analyses": requested,
+                "dimensions": {
+                    "width": image.width,
+                    "height": image.height
+                },
+                "processed_output_path": processed_output_path
+            }
+            if "card_detection" in requested:
+                cached["card_detection"] = {"found": card is not None, "dimensions": None}
+                if card is not None:
+                    card_height, card_width = card.shape[:2]
+                    cached["card_detection"]["dimensions"] = {
+                        "width": card_width,
+                        "height": card_height
+                    }
+            if text_result is not None:
+                cached["ocr"] = {
+                    "text": text_result["text"],
+                    "source": "card" if card is not None else "full_frame",
+                    "detected_languages": text_result.get("detected_languages") or []
+                }
+            if quality_score is not None:
+                cached["face_quality"] = {"quality_score": quality_score}
+
+            latency_stats.record("analyze", processing_time)
+
+            # Queue one merged result for the background database writer
+            with timer.stage("db"):
+                result_writer.add(
+                    filename=file.filename,
+                    processing_type="analyze",
+                    result=json.dumps({name: cached[name] for name in requested}, ensure_ascii=False),
+                    processing_time=processing_time
+                )
+
+            if result_cache:
+                result_cache.set(cache_key, cached)
+            from_cache = False
+        else:
+            processing_time = time.time() - start_time
+            from_cache = True
+
+        # คำนวณ Fast Rate (operations per second)
+        fast_rate = 1.0 / processing_time if processing_time > 0 else 0.0
+
+        # คำนวณ Rack Cooling Rate
+        cooling_rate = 1.0 / (processing_time * COOLING_FACTOR) if processing_time > 0 else 0.0
+
+        return {
+            **cached,
+            # Stages of this request, a cached result only spent time on the lookup
+            "timings": timer.summary(),
+            "processing_time": round(processing_time, 4),
+            "fast_rate": round(fast_rate, 4),
+            "rack_cooling_rate": round(cooling_rate, 4),
+            "cached": from_cache,
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in analyze endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+
+# Analyses available in /stream
+STREAM_ANALYSES = ["card_detection", "face_quality"]
+
+async def analyze_frame(data, requested, detector, timer):
+    """
+    Run the live feedback analyses on one camera frame (no output image, cache or DB row)
+    
+    Args:
+        data (bytes): Encoded frame
+        requested (list): Analyses from STREAM_ANALYSES
+        detector (str): Engine that finds the card
+        timer (StageTimer): Timer of the stream
+    
+    Returns:
+        dict: card (corners in pixels, None if no card) and/or face (quality_score and
+              bounding_box), dimensions and processing_time
+    """
+    start_time = time.perf_counter()
+    with timer.stage("decode"):
+        image = PreparedImage(data)
+        for name in requested:
+            # Both analyses usually share one inference-sized copy
+            await asyncio.to_thread(image.decode, **config.INFER_SETTINGS[name])
+    
+    calls = []
+    if "card_detection" in requested:
+        calls.append(run_in_executor(find_card_corners, image, detector=detector))
+    if "face_quality" in requested:
+        calls.append(run_in_executor(detect_face, image))
+    with timer.stage("inference"):
+        results = await asyncio.gather(*calls)
+    
+    response = {"dimensions": {"width": image.width, "height": image.height}}
+    if "card_detection" in requested:
+        corners = results.pop(0)
+        response["card"] = None if corners is None else {
+            "corners": [[round(float(x), 1), round(float(y), 1)] for x, y in corners]
+        }
+    if "face_quality" in requested:
+        response["face"] = results.pop(0)
+    response["processing_time"] = round(time.perf_counter() - start_time, 4)
+    return response
+
+
+@app.websocket("/stream")
+async def stream(websocket: WebSocket, analyses: str = None, detector: str = None):
+    """
+    Live card alignment and face quality feedback for a camera stream
+    
+    Send every frame as one binary message (JPEG or any image format). Frames are
+    received continuously but only the newest one is processed: frames that arrive
+    while the engine is busy replace each other. Each processed frame is answered
+    with a JSON message: frame (index of the frame), card, face, dimensions,
+    processing_time, latency (arrival to reply, including the wait) and dropped
+    (frames skipped so far). A frame that cannot be processed gets frame and error.
+    
+    - **analyses**: Comma-separated list of analyses (card_detection, face_quality)
+                    Leave empty to run both
+    - **detector**: Engine that finds the card: 'vision', 'stub' or 'opencv'; defaults to the server setting
+    """
+    await websocket.accept()
+    requested = STREAM_ANALYSES
+    if analyses:
+        requested = [name.strip() for name in analyses.split(',') if name.strip()]
+    unknown = [name for name in requested if name not in STREAM_ANALYSES]
+    if unknown or (detector and detector not in available_engines()):
+        reason = (f"Unknown analyses: {', '.join(unknown)}" if unknown
+                  else f"detector must be one of {', '.join(available_engines())}")
+        await websocket.send_json({"error": reason})
+        await websocket.close(code=1008)
+        return
+    requested = [name for name in STREAM_ANALYSES if name in requested]
+    detector = detector or config.CARD_DETECTOR
+    
+    frames = LatestFrame()
+    timer = StageTimer("stream")
+    
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                data = message.get("bytes")
+                if not data:
+                    continue
+                if len(data) > config.MAX_UPLOAD_BYTES:
+                    await websocket.close(code=1009)
+                    return
+                stream_frames_total.inc()
+                frames.put(data)
+        finally:
+            frames.close()
+    
+    stream_connections.inc()
+    receiver = asyncio.create_task(receive())
+    reported_dropped = 0
+    try:
+        while True:
+            frame = await frames.get()
+            if frame is None:
+                break
+            index, data, arrived = frame
+            try:
+                response = await analyze_frame(data, requested, detector, timer)
+            except Exception as e:
+                print(f"Error in stream endpoint (frame {index}): {str(e)}")
+                response = {"error": str(e)}
+            stream_frames_dropped_total.inc(amount=frames.dropped - reported_dropped)
+            reported_dropped = frames.dropped
+            if frames.closed:
+                # Client went away (or the frame was too large) while this frame was processed
+                break
+            response.update(frame=index, latency=round(time.perf_counter() - arrived, 4), dropped=frames.dropped)
+            await websocket.send_json(response)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream_connections.dec()
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+
+
+@app.post("/jobs")
+async def submit_jobs(
+    files: List[UploadFile] = File(...),
+    kind: str = "ocr",
+    languages: str = None,
+    regions: str = None,
+    level: str = None,
+    detector: str = None,
+    all_cards: bool = False
+):
+    """
+    Queue images for background processing and return right away
+    
+    Every file becomes one job, processed by the same code as the synchronous endpoint
+    (its response is the job result). Jobs are stored in the database and survive a restart.
+    Poll GET /jobs/{id} or GET /jobs?batch_id=..., optionally with wait= to long-poll.
+    
+    - **files**: One or more images
+    - **kind**: Endpoint to run: 'ocr', 'face_quality' or 'card_detection'
+    - **languages**, **regions**, **level**: As for /ocr
+    - **detector**, **all_cards**: As for /card_detection
+    """
+    if kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(JOB_KINDS)}")
+    if len(files) > config.JOB_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {config.JOB_MAX_FILES} files per submission")
+    if any(not (upload.content_type or "").startswith("image/") for upload in files):
+        raise HTTPException(status_code=400, detail="Files must be images")
+    for upload in files:
+        check_upload_size(upload)
+    
+    # Checked now so a bad parameter fails the submission rather than every job
+    params = {}
+    if kind == "ocr":
+        check_languages(languages)
+        try:
+            parse_regions(regions)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid regions: {str(e)}")
+        params = {"languages": languages, "regions": regions, "level": check_level(level)}
+    elif kind == "card_detection":
+        check_detector(detector)
+        params = {"detector": detector, "all_cards": all_cards}
+    
+    try:
+        return await job_queue.submit(kind, params, files)
+    except Exception as e:
+        print(f"Error in jobs endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error storing jobs: {str(e)}")
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int, wait: float = 0):
+    """
+    Get the status of a job, with its result once it is done
+    
+    - **wait**: Long-poll: hold the request up to this many seconds until the job has finished
+    """
+    wait = min(max(wait, 0.0), config.JOB_MAX_WAIT)
+    job = await job_queue.wait(lambda: job_queue.get(job_id),
+                               lambda job: job is None or job["status"] in JOB_FINISHED, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs")
+async def get_batch(batch_id: str, wait: float = 0):
+    """
+    Get the status of every job of a submission
+    
+    - **batch_id**: Returned by POST /jobs
+    - **wait**: Long-poll: hold the request up to this many seconds until every job has finished
+    """
+    wait = min(max(wait, 0.0), config.JOB_MAX_WAIT)
+    jobs = await job_queue.wait(lambda: job_queue.batch(batch_id),
+                                lambda jobs: all(job["status"] in JOB_FINISHED for job in jobs), wait)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    counts = {}
+    for job in jobs:
+        counts[job["status"]] = counts.get(job["status"], 0) + 1
+    return {"batch_id": batch_id, "counts": counts, "jobs": jobs}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Stage latency histograms, in-flight requests and queue depths in Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Get result cache and near-duplicate index hit/miss counters
+    """
+    stats = {"enabled": True, **result_cache.stats()} if result_cache else {"enabled": False}
+    stats["near_duplicates"] = near_duplicates.stats()
+    return stats
+
+
 @app.get("/processing_speed_comparison")
 async def processing_speed_comparison(db: Session = Depends(get_db)):
     """
     Compare processing speed of different services
+
+    All-time count/avg/min/max come from one grouped SQL query. Percentiles and
+    the 5m/1h/24h windows come from in-process histograms of this worker.
     """
     try:
-        ocr_results = db.query(models.ProcessingResult).filter(
-            models.ProcessingResult.processing_type == "ocr"
-        ).all()
+        rows = db.query(
+            models.ProcessingResult.processing_type,
+            func.count(models.ProcessingResult.id),
+            func.avg(models.ProcessingResult.processing_time),
+            func.min(models.ProcessingResult.processing_time),
+            func.max(models.ProcessingResult.processing_time)
+        ).group_by(models.ProcessingResult.processing_type).all()
         
-        face_quality_results = db.query(models.ProcessingResult).filter(
-            models.ProcessingResult.processing_type == "face_quality"
-        ).all()
+        stats = {
+            processing_type: {"count": 0, "avg_time": 0, "min_time": 0, "max_time": 0}
+            for processing_type in ("ocr", "face_quality", "card_detection")
+        }
+        for processing_type, count, avg_time, min_time, max_time in rows:
+            stats[processing_type] = {
+                "count": count,
+                "avg_time": avg_time,
+                "min_time": min_time,
+                "max_time": max_time
+            }
         
-        card_detection_results = db.query(models.ProcessingResult).filter(
-            models.ProcessingResult.processing_type == "card_detection"
-        ).all()
+        for processing_type in stats:
+            stats[processing_type]["windows"] = latency_stats.summary(processing_type)
         
-        def calculate_stats(results):
-            if not results:
-                return {"count": 0, "avg_time": 0, "min_time": 0, "max_time": 0}
-                
-            times = [result.processing_time for result in results]
-            return {
-                "count": len(results),
-                "avg_time": sum(times) / len(times),
-                "min_time": min(times),
-                "max_time": max(times)
-            }
+        return stats
+    except Exception as e:
+        print(f"Error in processing speed comparison endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting processing stats: {str(e)}")
+
+
+def encode_cursor(created_at, result_id):
+    # Opaque to clients: the (created_at, id) key of the last row of a page, created_at
+    # as the text stored in the database (see stored_time)
+    return base64.urlsafe_b64encode(f"{created_at}|{result_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        created_at, result_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        datetime.fromisoformat(created_at)
+        return created_at, int(result_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/results")
+async def list_results(
+    processing_type: str = None,
+    since: str = None,
+    until: str = None,
+    filename_prefix: str = None,
+    limit: int = 100,
+    cursor: str = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Page through stored processing results, newest first
+    
+    Pages are keyed on (created_at, id) instead of an offset, so every page costs the same
+    at any depth. Rows already exported with `python -m app.export` are not included.
+    
+    - **processing_type**: Only this type (e.g. 'ocr', 'card_detection', 'face_quality_best')
+    - **since**, **until**: ISO 8601 date or time (UTC unless it has an offset), since inclusive
+    - **filename_prefix**: Only files whose name starts with this
+    - **limit**: Rows per page; at most RESULTS_MAX_LIMIT
+    - **cursor**: next_cursor of the previous page
+    """
+    if not 1 <= limit <= config.RESULTS_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.RESULTS_MAX_LIMIT}")
+    try:
+        since = parse_time(since) if since else None
+        until = parse_time(until) if until else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since and until must be ISO 8601 dates or times")
+    
+    try:
+        table = models.ProcessingResult
+        # Stored text, old rows lack the fraction of a second (see stored_time)
+        created = stored_time(table.created_at)
+        query = db.query(table, created)
+        if processing_type:
+            query = query.filter(table.processing_type == processing_type)
+        if since:
+            query = query.filter(created >= time_bound(since))
+        if until:
+            query = query.filter(created < time_bound(until))
+        if filename_prefix:
+            # A range rather than LIKE, no escaping of % and _ needed
+            query = query.filter(table.filename >= filename_prefix, table.filename < filename_prefix + "\U0010ffff")
+        if cursor:
+            query = query.filter(tuple_(created, table.id) < decode_cursor(cursor))
+        rows = query.order_by(created.desc(), table.id.desc()).limit(limit + 1).all()
         
+        more = len(rows) > limit
+        last = rows[limit - 1] if more else None
+        rows = [row for row, _ in rows[:limit]]
         return {
-            "ocr": calculate_stats(ocr_results),
-            "face_quality": calculate_stats(face_quality_results),
-            "card_detection": calculate_stats(card_detection_results)
+            "results": [{
+                "id": row.id,
+                "filename": row.filename,
+                "processing_type": row.processing_type,
+                "result": row.result,
+                "processing_time": row.processing_time,
+                "created_at": row.created_at.isoformat() if row.created_at else None
+            } for row in rows],
+            "next_cursor": encode_cursor(last[1], last[0].id) if more else None
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in processing speed comparison endpoint: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error getting processing stats: {str(e)}")
+        print(f"Error in results endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting results: {str(e)}")
 
 
 @app.get("/output/{filename}")
-async def get_output_file(filename: str):
+async def get_output_file(filename: str, request: Request):
     """
     Get processed output file
+
+    Supports conditional (If-None-Match) and partial (Range) requests.
     """
-    file_path = f"output/{filename}"
-    if not os.path.exists(file_path):
+    # The response that returned this name may have been sent before the file was written
+    await asyncio.to_thread(output_writer.wait, filename, 10.0)
+    
+    # Only content-addressed output names are served, nothing else on disk is reachable
+    entry = output_store.lookup(filename)
+    if entry is None:
         raise HTTPException(status_code=404, detail="File not found")
+    file_path, size, mtime = entry
+    
+    etag = f'"{filename}-{size}-{int(mtime)}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
     
-    return FileResponse(file_path)
\ No newline at end of file
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    try:
+        if byte_range is None:
+            # The stat FileResponse would make anyway, so a file evicted by another worker is a 404
+            info = await asyncio.to_thread(os.stat, file_path)
+            return FileResponse(file_path, headers=headers, stat_result=info)
+        
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        data = await asyncio.to_thread(read_range, file_path, start, end - start + 1)
+    except FileNotFoundError:
+        output_store.discard(filename)
+        raise HTTPException(status_code=404, detail="File not found")
+    return Response(data, status_code=206, headers=headers, media_type=mimetypes.guess_type(filename)[0])
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index, LargeBinary
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -19,4 +19,55 @@ class ProcessingResult(Base):
     processing_time = Column(Float)
     created_at = Column(DateTime, default=func.now())
 
-    
\ No newline at end of file
+    __table_args__ = (
+        # Serves the per-type aggregates and time range filters
+        Index("ix_processing_results_type_created", "processing_type", "created_at"),
+        # Serves /results pages and the export across all types ((created_at, id) order:
+        # SQLite appends the rowid to every index)
+        Index("ix_processing_results_created", "created_at"),
+    )
+
+    
+class ImageHash(Base):
+    __tablename__ = "image_hashes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String)  # engine, endpoint and parameters the result was produced with
+    phash = Column(Integer)  # 64-bit difference hash, stored as signed like SQLite's INTEGER
+    result = Column(String)  # response payload as JSON
+    width = Column(Integer)  # size of the upload the result was produced for
+    height = Column(Integer)
+    thumbnail = Column(LargeBinary)  # grayscale PNG thumbnail, confirms a hash match before reuse
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        # Fetches the stored result of a matching hash
+        Index("ix_image_hashes_phash_scope", "phash", "scope"),
+        # Prunes old hashes (python -m app.export)
+        Index("ix_image_hashes_created", "created_at"),
+    )
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(String, index=True)  # shared by the jobs of one submission
+    kind = Column(String)  # endpoint that processes the upload: 'ocr', 'face_quality' or 'card_detection'
+    params = Column(String)  # endpoint parameters as JSON
+    filename = Column(String)
+    content_type = Column(String)
+    path = Column(String)  # stored upload, removed once the job has finished
+    status = Column(String)  # 'queued', 'running', 'done' or 'failed'
+    owner = Column(Integer)  # pid of the server process running the job
+    result = Column(String)  # endpoint response as JSON
+    error = Column(String)
+    processing_time = Column(Float)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        # Workers claim the oldest queued job
+        Index("ix_jobs_status_id", "status", "id"),
+    )
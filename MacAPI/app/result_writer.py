@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app import config, models
+from app.database import SessionLocal
+
+# Marks the end of the queue on shutdown
+_STOP = object()
+
+
+class ResultWriter:
+    """
+    Background writer for ProcessingResult (and ImageHash) rows
+
+    The request path only enqueues rows. A writer thread inserts them in bulk,
+    one transaction per batch, once batch_size rows are waiting or
+    flush_interval seconds have passed since the first waiting row.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, max_queue=10000, batched=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batched = batched
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Start the writer thread
+        """
+        if self.batched and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Flush waiting rows and stop the writer thread
+        """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def add(self, filename, processing_type, result, processing_time):
+        """
+        Queue a processing result row (never blocks the caller)
+
+        Args:
+            filename (str): Uploaded file name
+            processing_type (str): 'ocr', 'face_quality', 'card_detection', ...
+            result (str): Result to store
+            processing_time (float): Processing time in seconds
+        """
+        row = {
+            "filename": filename,
+            "processing_type": processing_type,
+            "result": result,
+            "processing_time": processing_time,
+            # Set now, rows are inserted later (UTC like SQLite's CURRENT_TIMESTAMP)
+            "created_at": datetime.utcnow()
+        }
+        if not self._enqueue(models.ProcessingResult, row):
+            print(f"Result writer queue full, dropped {processing_type} result for {filename}")
+
+    def add_image_hash(self, scope, phash, result, width, height, thumbnail):
+        """
+        Queue an ImageHash row (never blocks the caller)
+
+        Args:
+            scope (str): Engine, endpoint and parameters, see cache_scope
+            phash (int): Perceptual hash as stored (signed 64-bit)
+            result (str): Response payload as JSON
+            width (int): Width of the upload
+            height (int): Height of the upload
+            thumbnail (bytes): Grayscale PNG thumbnail of the upload
+        """
+        row = {"scope": scope, "phash": phash, "result": result, "width": width, "height": height,
+               "thumbnail": thumbnail, "created_at": datetime.utcnow()}
+        if not self._enqueue(models.ImageHash, row):
+            print("Result writer queue full, dropped image hash")
+
+    def _enqueue(self, model, row):
+        if not self.batched or self._thread is None:
+            self._write([(model, row)])
+            return True
+
+        try:
+            self._queue.put_nowait((model, row))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def queue_depth(self):
+        """
+        Returns:
+            int: Number of rows waiting to be written
+        """
+        return self._queue.qsize()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # Drain anything queued after the stop marker was put
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+                self._write(batch)
+                return
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+                deadline = None
+
+    def _write(self, items):
+        if not items:
+            return
+        # One transaction for the batch, one bulk insert per table
+        tables = {}
+        for model, row in items:
+            tables.setdefault(model, []).append(row)
+        db = SessionLocal()
+        try:
+            for model, rows in tables.items():
+                db.bulk_insert_mappings(model, rows)
+            db.commit()
+            self.written += len(items)
+            self.batches += 1
+        except Exception as e:
+            db.rollback()
+            print(f"Error writing {len(items)} processing results: {str(e)}")
+        finally:
+            db.close()
+
+
+# Shared writer used by the endpoints
+result_writer = ResultWriter(
+    batch_size=config.DB_BATCH_SIZE,
+    flush_interval=config.DB_FLUSH_INTERVAL,
+    max_queue=config.DB_QUEUE_SIZE,
+    batched=config.DB_WRITER == "batched"
+)
@@ -0,0 +1,108 @@
+"""
+Preforking server: import and warm the app once, then fork the workers
+
+    python -m app.serve --workers 4 --port 8000
+
+With `uvicorn --workers` every worker is a fresh interpreter that imports and
+warms everything on its own. Here the parent imports the app, creates the
+database tables and preloads the image libraries and engine (see
+app.engines.preload) before forking, so workers start in milliseconds and share
+those pages copy-on-write. All workers accept from one listening socket. A worker
+that dies is replaced; SIGTERM or SIGINT stops them all gracefully.
+"""
+import argparse
+import os
+import signal
+import socket
+import time
+
+import uvicorn
+
+from app import config
+
+
+def _run_worker(sock, args):
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=args.log_level))
+    # Installs its own SIGTERM/SIGINT handlers, shutting down gracefully
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS)
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="Let every worker import and warm the app itself after the fork")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.preload:
+        import app.main  # noqa: F401
+        from app.database import engine, init_db
+        from app.engines import preload
+
+        # Once here instead of racing in every worker; connections must not be shared across fork
+        init_db()
+        engine.dispose()
+        preload()
+        print(f"Preloaded in {time.perf_counter() - start_time:.2f}s")
+    print(f"Starting {args.workers} workers on {args.host}:{args.port}")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                _run_worker(sock, args)
+            except BaseException as e:
+                print(f"Error in worker {os.getpid()}: {str(e)}")
+                code = 1
+            finally:
+                os._exit(code)
+        workers.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(args.workers):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited (status {status}), starting a new one")
+            time.sleep(1)
+            spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
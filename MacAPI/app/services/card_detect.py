@@ -1,72 +1,105 @@
-import numpy as np
-import cv2
-from PIL import Image
-import io
-import objc
-from Foundation import NSData, NSImage
-from Quartz import CIImage
-from Vision import VNDetectRectanglesRequest, VNImageRequestHandler
+from app import config
+from app.engines import get_engine
+from app.engines.base import as_array
+from app.utils.image_utils import inference_view, warp_card
+from app.utils.lazy import lazy_import
 
-def detect_card(image):
+np = lazy_import("numpy")
+
+def _detection_view(image, max_side, max_megapixels):
+    settings = config.INFER_SETTINGS["card_detection"]
+    return inference_view(
+        image,
+        settings["max_side"] if max_side is None else max_side,
+        settings["max_megapixels"] if max_megapixels is None else max_megapixels
+    )
+
+def detect_card(image, max_side=None, max_megapixels=None, detector=None):
     """
     Detect card in image and correct perspective
     
+    The card is found on a downscaled copy and warped from the full resolution image.
+    
     Args:
-        image (numpy.ndarray): Image as numpy array
+        image (PreparedImage or numpy.ndarray): Image to process
+        max_side (int): Longest side used for detection, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for detection, None for config.INFER_SETTINGS
+        detector (str): Engine that finds the card ('vision', 'stub' or 'opencv'),
+                        None for config.CARD_DETECTOR
         
     Returns:
         numpy.ndarray: Perspective corrected image of the card
     """
-    # Convert numpy array to NSImage for Vision framework
-    success, encoded_image = cv2.imencode('.png', image)
-    image_data = NSData.dataWithBytes_length_(encoded_image.tobytes(), len(encoded_image.tobytes()))
-    ns_image = NSImage.alloc().initWithData_(image_data)
-    
-    # Use Vision framework to detect rectangles
-    request = VNDetectRectanglesRequest.alloc().init()
-    request.setMinimumAspectRatio_(0.5)
-    request.setMaximumAspectRatio_(2.0)
-    request.setQuadratureTolerance_(10.0)  # Allow for some perspective distortion
-    
-    # Create CIImage from NSImage for Vision processing
-    ci_image = CIImage.imageWithData_(image_data)
-    
-    # Create handler and perform request
-    handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
-    success = handler.performRequests_error_([request], None)
-    
-    if not success:
-        return image  # Return original if detection failed
-    
-    results = request.results()
-    if not results:
-        return image  # Return original if no rectangles detected
-    
-    # Get the first (hopefully largest/most prominent) rectangle
-    observation = results[0]
+    card = detect_card_or_none(image, max_side, max_megapixels, detector)
+    if card is None:
+        return as_array(image)  # Return original if no card detected
+    return card
+
+def detect_card_or_none(image, max_side=None, max_megapixels=None, detector=None):
+    """
+    Detect card in image and correct perspective, without falling back to the image
     
-    # Get the corners of the detected rectangle
-    # Vision uses normalized coordinates (0-1)
-    h, w = image.shape[:2]
+    The full resolution image is only decoded when a card was found.
     
-    # Get rectangle coordinates
-    box_points = observation.boundingBox()
-    top_left = (int(box_points.origin.x * w), int(box_points.origin.y * h))
-    top_right = (int((box_points.origin.x + box_points.size.width) * w), int(box_points.origin.y * h))
-    bottom_right = (int((box_points.origin.x + box_points.size.width) * w), 
-                   int((box_points.origin.y + box_points.size.height) * h))
-    bottom_left = (int(box_points.origin.x * w), int((box_points.origin.y + box_points.size.height) * h))
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+        max_side (int): Longest side used for detection, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for detection, None for config.INFER_SETTINGS
+        detector (str): Engine that finds the card, None for config.CARD_DETECTOR
+        
+    Returns:
+        numpy.ndarray: Perspective corrected image of the card, None if no card was found
+    """
+    corners = find_card_corners(image, max_side, max_megapixels, detector)
+    if corners is None:
+        return None
+    return warp_card(as_array(image), corners)
+
+def find_card_corners(image, max_side=None, max_megapixels=None, detector=None):
+    """
+    Find the card corners without warping (for live feedback)
     
-    src_pts = np.array([top_left, top_right, bottom_right, bottom_left], dtype=np.float32)
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+        max_side (int): Longest side used for detection, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for detection, None for config.INFER_SETTINGS
+        detector (str): Engine that finds the card, None for config.CARD_DETECTOR
+        
+    Returns:
+        numpy.ndarray: 4x2 corners in pixels of the original image (top-left, top-right,
+                       bottom-right, bottom-left), None if no card was found
+    """
+    view, scale = _detection_view(image, max_side, max_megapixels)
     
-    # Define the size of the output image (standardized card size)
-    card_w, card_h = 640, 400  # Standard card aspect ratio
-    dst_pts = np.array([[0, 0], [card_w, 0], [card_w, card_h], [0, card_h]], dtype=np.float32)
+    corners = get_engine(detector or config.CARD_DETECTOR).find_card(view)
+    if corners is None:
+        return None
+    return np.asarray(corners, dtype=np.float32) / scale
+
+def detect_cards(image, max_cards=None, max_side=None, max_megapixels=None, detector=None):
+    """
+    Detect every card in image and correct the perspective of each one
     
-    # Calculate perspective transform matrix
-    M = cv2.getPerspectiveTransform(src_pts, dst_pts)
+    Cards are found on a downscaled copy; each one is warped from the full
+    resolution image at its own resolution there.
     
-    # Apply perspective transformation
-    warped = cv2.warpPerspective(image, M, (card_w, card_h))
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+        max_cards (int): Most cards to return, None for config.CARD_MAX_CARDS
+        max_side (int): Longest side used for detection, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for detection, None for config.INFER_SETTINGS
+        detector (str): Engine that finds the cards, None for config.CARD_DETECTOR
+        
+    Returns:
+        list: Dicts with image (perspective corrected card), corners (4x2 in pixels of
+              the original image: top-left, top-right, bottom-right, bottom-left),
+              score and area (fraction of the image), best first
+    """
+    view, scale = _detection_view(image, max_side, max_megapixels)
     
-    return warped
\ No newline at end of file
+    cards = get_engine(detector or config.CARD_DETECTOR).find_cards(view, max_cards or config.CARD_MAX_CARDS)
+    full = as_array(image)
+    for card in cards:
+        card["corners"] = np.asarray(card["corners"], dtype=np.float32) / scale
+        card["image"] = warp_card(full, card["corners"], size=None)
+    return cards
@@ -1,42 +1,78 @@
-import numpy as np
-import cv2
-from PIL import Image
-import io
-import objc
-from Foundation import NSData, NSImage
-from Quartz import CIImage
-from Vision import VNDetectFaceCaptureQualityRequest, VNImageRequestHandler
+from app import config
+from app.engines import get_engine
+from app.engines.base import as_array
+from app.utils.image_utils import inference_view
 
-def detect_face_quality(image):
+def _face_view(image, max_side, max_megapixels):
+    settings = config.INFER_SETTINGS["face_quality"]
+    return inference_view(
+        image,
+        settings["max_side"] if max_side is None else max_side,
+        settings["max_megapixels"] if max_megapixels is None else max_megapixels
+    )
+
+def detect_face_quality(image, max_side=None, max_megapixels=None):
     """
     Detect face quality in image
     
     Args:
-        image (numpy.ndarray): Image as numpy array
+        image (PreparedImage or numpy.ndarray): Image to process
+        max_side (int): Longest side used for inference, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for inference, None for config.INFER_SETTINGS
         
     Returns:
         float: Face quality score between 0.0 and 1.0
     """
-    # Convert numpy array to NSImage for Vision framework
-    success, encoded_image = cv2.imencode('.png', image)
-    image_data = NSData.dataWithBytes_length_(encoded_image.tobytes(), len(encoded_image.tobytes()))
-    
-    # Create CIImage from image data for Vision processing
-    ci_image = CIImage.imageWithData_(image_data)
-    
-    # Create request and handler
-    request = VNDetectFaceCaptureQualityRequest.alloc().init()
-    handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
-    
-    # Perform request
-    success = handler.performRequests_error_([request], None)
+    view, _ = _face_view(image, max_side, max_megapixels)
+    return get_engine().detect_face_quality(view)
+
+def detect_face(image, max_side=None, max_megapixels=None):
+    """
+    Detect the best face in image with its quality score and position
     
-    if not success:
-        return 0.0
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+        max_side (int): Longest side used for inference, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for inference, None for config.INFER_SETTINGS
+        
+    Returns:
+        dict: quality_score (0.0 - 1.0) and bounding_box (x, y, width, height in pixels
+              of the original image, None if the engine does not locate faces)
+    """
+    view, scale = _face_view(image, max_side, max_megapixels)
+    result = get_engine().detect_face(view)
+    box = result["bounding_box"]
+    if box is not None and scale != 1.0:
+        # Map the box back to the full resolution image
+        result["bounding_box"] = {key: int(round(value / scale)) for key, value in box.items()}
+    return result
+
+def crop_face(image, bounding_box, padding=None):
+    """
+    Crop a face out of image with some margin around it
     
-    results = request.results()
-    if not results:
-        return 0.0
+    Args:
+        image (PreparedImage or numpy.ndarray): Full resolution image
+        bounding_box (dict): x, y, width, height in pixels, None to keep the whole image
+        padding (float): Margin on each side as a fraction of the box size,
+                         None for config.FACE_CROP_PADDING
+        
+    Returns:
+        numpy.ndarray: Cropped face
+    """
+    array = as_array(image)
+    if bounding_box is None:
+        return array
+    if padding is None:
+        padding = config.FACE_CROP_PADDING
     
-    # Return face quality score
-    return results[0].faceCaptureQuality()
\ No newline at end of file
+    height, width = array.shape[:2]
+    pad_x = int(bounding_box["width"] * padding)
+    pad_y = int(bounding_box["height"] * padding)
+    x0 = max(0, bounding_box["x"] - pad_x)
+    y0 = max(0, bounding_box["y"] - pad_y)
+    x1 = min(width, bounding_box["x"] + bounding_box["width"] + pad_x)
+    y1 = min(height, bounding_box["y"] + bounding_box["height"] + pad_y)
+    if x1 <= x0 or y1 <= y0:
+        return array
+    return array[y0:y1, x0:x1]
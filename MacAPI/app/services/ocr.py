@@ -1,111 +1,258 @@
 # File: app/services/ocr.py
-import numpy as np
-import cv2
-from PIL import Image
-import io
-import objc
-from Foundation import NSData, NSImage
-from Quartz import CIImage
-from Vision import VNRecognizeTextRequest, VNImageRequestHandler, VNRecognizeTextRequestRevision3
+import json
+import math
 
-def recognize_text(image, languages=None):
+from app import config
+from app.engines import get_engine
+from app.engines.base import image_size, region_rect
+from app.utils.image_utils import inference_view
+
+# Recognition levels accepted by recognize_text
+LEVELS = ("fast", "accurate", "auto")
+
+def parse_languages(value):
     """
-    Recognize text in image with text regions information
+    Parse the languages parameter
+    
+    Only supported codes are accepted (see get_supported_languages), so the engine's
+    request pool, which is keyed on the language list, cannot be grown by arbitrary input.
     
     Args:
-        image (numpy.ndarray): Image as numpy array
-        languages (list): List of language codes to recognize (e.g. ['en', 'th', 'ja'])
-                          None for automatic language detection
+        value (str): Comma-separated language codes in priority order (e.g. 'th,en'),
+                     case-insensitive
     
     Returns:
-        dict: Dictionary containing:
-            - text: Extracted full text from image
-            - dimensions: Image dimensions (width, height)
-            - text_observations: List of detected text regions with text and bounding boxes
-            - detected_languages: List of detected languages in the image
-    """
-    # Get image dimensions
-    height, width = image.shape[:2]
-    
-    # Convert numpy array to NSData for Vision framework
-    success, encoded_image = cv2.imencode('.png', image)
-    image_data = NSData.dataWithBytes_length_(encoded_image.tobytes(), len(encoded_image.tobytes()))
+        list: Codes as spelled by get_supported_languages, in the given order without
+              repeats; None if value is empty
     
-    # Create CIImage from image data for Vision processing
-    ci_image = CIImage.imageWithData_(image_data)
-    
-    # Create request and handler
-    request = VNRecognizeTextRequest.alloc().init()
-    
-    # Set recognition level to accurate
-    request.setRecognitionLevel_(1)  # 0 = fast, 1 = accurate
+    Raises:
+        ValueError: If a code is not supported
+    """
+    if not value:
+        return None
+    supported = {code.lower(): code for code in get_supported_languages()}
+    languages = []
+    for code in value.split(","):
+        code = code.strip()
+        if not code:
+            continue
+        canonical = supported.get(code.lower())
+        if canonical is None:
+            raise ValueError(f"unsupported language '{code}', supported: {', '.join(supported.values())}")
+        if canonical not in languages:
+            languages.append(canonical)
+    return languages or None
+
+def parse_regions(value):
+    """
+    Parse regions of interest
     
-    # Use latest text recognition revision
-    request.setRevision_(VNRecognizeTextRequestRevision3)
+    Args:
+        value (str): JSON list of [x, y, width, height] boxes, or JSON object of
+                     name -> [x, y, width, height]; fractions of the image size (0-1),
+                     top-left origin (e.g. '{"id_number": [0.35, 0.18, 0.5, 0.08]}')
     
-    # Set languages if specified, with thai/english defaults if not specified
-    if languages:
-        request.setRecognitionLanguages_(languages)
-    else:
-        # Default to recognizing both Thai and English if no languages are specified
-        request.setRecognitionLanguages_(["th", "en"])
+    Returns:
+        dict: Region name -> (x, y, width, height), list regions are named '0', '1', ...
+              None if value is empty
     
-    # Create handler
-    handler = VNImageRequestHandler.alloc().initWithCIImage_options_(ci_image, None)
+    Raises:
+        ValueError: If value is not valid JSON, has more than config.MAX_REGIONS boxes,
+                    a box holds anything but finite numbers or is outside the image
+    """
+    if not value:
+        return None
+    parsed = json.loads(value)
+    if isinstance(parsed, list):
+        parsed = {str(index): box for index, box in enumerate(parsed)}
+    if not isinstance(parsed, dict) or not parsed:
+        raise ValueError("regions must be a non-empty list or object of [x, y, width, height]")
+    if len(parsed) > config.MAX_REGIONS:
+        raise ValueError(f"at most {config.MAX_REGIONS} regions per request")
     
-    # Perform request
-    success = handler.performRequests_error_([request], None)
+    regions = {}
+    for name, box in parsed.items():
+        if not isinstance(box, (list, tuple)) or len(box) != 4:
+            raise ValueError(f"region {name} must be [x, y, width, height]")
+        # null, strings and booleans are not coordinates, and NaN would pass the bounds check below
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v) for v in box):
+            raise ValueError(f"region {name} must hold four finite numbers")
+        x, y, w, h = (float(v) for v in box)
+        if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > 1.0001 or y + h > 1.0001:
+            raise ValueError(f"region {name} must lie inside the image (fractions from 0 to 1)")
+        regions[name] = (x, y, w, h)
+    return regions
+
+def recognize_regions(image, regions, languages=None, level="accurate"):
+    """
+    Recognize text only inside regions of interest, in one engine call
     
-    if not success:
-        return {"text": "", "dimensions": (width, height), "text_observations": [], "detected_languages": []}
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+        regions (dict): Region name -> (x, y, width, height) as fractions of the image size
+        languages (list): List of language codes to recognize, None for defaults
+        level (str): 'fast' or 'accurate' recognition
     
-    results = request.results()
-    if not results:
-        return {"text": "", "dimensions": (width, height), "text_observations": [], "detected_languages": []}
+    Returns:
+        dict: Same keys as recognize_text, plus regions: name -> text and pixel
+              bounding box of the region. Every text observation has the name of
+              its region.
+    """
+    width, height = image_size(image)
+    names = list(regions)
+    results = get_engine().recognize_regions(image, [regions[name] for name in names], languages, level)
     
-    # Extract text and bounding boxes
     text_observations = []
-    full_text = []
     detected_languages = set()
-    
-    for result in results:
-        text = result.text()
-        full_text.append(text)
-        
-        # Get language identification if available
-        if hasattr(result, 'language') and result.language():
-            detected_languages.add(result.language())
-        
-        # Get normalized bounding box
-        boundingBox = result.boundingBox()
-        
-        # Convert normalized coordinates to pixel coordinates
-        x = int(boundingBox.origin.x * width)
-        y = int(boundingBox.origin.y * height)
-        w = int(boundingBox.size.width * width)
-        h = int(boundingBox.size.height * height)
-        
-        # Convert to top-left coordinates (Vision uses bottom-left origin)
-        y = height - y - h
-        
-        # text_observations.append({
-        #     "text": text,
-        #     "confidence": result.confidence(),
-        #     "bounding_box": {
-        #         "x": x,
-        #         "y": y,
-        #         "width": w,
-        #         "height": h
-        #     }
-        # })
+    region_results = {}
+    for name, result in zip(names, results):
+        x, y, w, h = region_rect(regions[name], width, height)
+        region_results[name] = {
+            "text": result["text"],
+            "bounding_box": {"x": x, "y": y, "width": w, "height": h}
+        }
+        for observation in result["text_observations"]:
+            observation["region"] = name
+            text_observations.append(observation)
+        detected_languages.update(result.get("detected_languages") or [])
     
     return {
-        "text": " ".join(full_text),
+        "text": " ".join(result["text"] for result in results if result["text"]),
         "dimensions": (width, height),
         "text_observations": text_observations,
+        "regions": region_results,
         "detected_languages": list(detected_languages)
     }
 
+def _recognize(image, languages, level, regions):
+    if regions:
+        result = recognize_regions(image, regions, languages, level)
+    else:
+        result = get_engine().recognize_text(image, languages, level)
+    for observation in result["text_observations"]:
+        observation["level"] = level
+    return result
+
+def _line_region(box, width, height):
+    # Normalized region around an observation, padded so the accurate pass sees whole glyphs
+    pad = box["height"] * 0.25
+    x0 = max(0.0, box["x"] - pad)
+    y0 = max(0.0, box["y"] - pad)
+    x1 = min(float(width), box["x"] + box["width"] + pad)
+    y1 = min(float(height), box["y"] + box["height"] + pad)
+    return x0 / width, y0 / height, (x1 - x0) / width, (y1 - y0) / height
+
+def escalate(image, result, languages=None, threshold=None, regions=None):
+    """
+    Re-run low confidence observations of a fast pass at the accurate level
+    
+    All low confidence lines are recognized again in one recognize_regions call;
+    a line the accurate pass finds nothing in is kept as it was. If the fast pass
+    found nothing at all, the whole image (or all regions) is recognized again.
+    
+    Args:
+        image (PreparedImage or numpy.ndarray): Image the fast pass ran on
+        result (dict): Fast pass result, updated in place
+        languages (list): List of language codes to recognize, None for defaults
+        threshold (float): Lines below this confidence are escalated,
+                           None for config.OCR_ESCALATE_CONFIDENCE
+        regions (dict): Regions of interest the fast pass ran on, None for the whole image
+    
+    Returns:
+        int: Number of lines escalated, 1 if the whole image (or all regions) was
+    """
+    threshold = config.OCR_ESCALATE_CONFIDENCE if threshold is None else threshold
+    observations = result["text_observations"]
+    if not observations:
+        result.update(_recognize(image, languages, "accurate", regions))
+        return 1
+    
+    low = [index for index, observation in enumerate(observations) if observation["confidence"] < threshold]
+    if not low:
+        return 0
+    
+    width, height = image_size(image)
+    line_regions = [_line_region(observations[index]["bounding_box"], width, height) for index in low]
+    accurate = dict(zip(low, get_engine().recognize_regions(image, line_regions, languages, "accurate")))
+    
+    text_observations = []
+    detected_languages = set(result.get("detected_languages") or [])
+    for index, observation in enumerate(observations):
+        redone = accurate.get(index)
+        if redone is None or not redone["text_observations"]:
+            text_observations.append(observation)
+            continue
+        for line in redone["text_observations"]:
+            line["level"] = "accurate"
+            if "region" in observation:
+                line["region"] = observation["region"]
+            text_observations.append(line)
+        detected_languages.update(redone.get("detected_languages") or [])
+    
+    result["text_observations"] = text_observations
+    result["text"] = " ".join(observation["text"] for observation in text_observations)
+    result["detected_languages"] = list(detected_languages)
+    for name, region in result.get("regions", {}).items():
+        region["text"] = " ".join(observation["text"] for observation in text_observations
+                                  if observation.get("region") == name)
+    return len(low)
+
+def recognize_text(image, languages=None, max_side=None, max_megapixels=None, regions=None, level=None):
+    """
+    Recognize text in image with text regions information
+    
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to process
+        languages (list): List of language codes to recognize (e.g. ['en', 'th', 'ja'])
+                          None for automatic language detection
+        max_side (int): Longest side used for inference, None for config.INFER_SETTINGS
+        max_megapixels (float): Megapixels used for inference, None for config.INFER_SETTINGS
+        regions (dict): Region name -> (x, y, width, height) as fractions of the image size;
+                        only these regions are recognized, in one engine call (see
+                        recognize_regions), None for the whole image
+        level (str): 'fast', 'accurate' or 'auto' (fast first, then low confidence lines
+                     again at accurate, see escalate), None for config.OCR_LEVEL
+    
+    Returns:
+        dict: Dictionary containing:
+            - text: Extracted full text from image
+            - dimensions: Image dimensions (width, height)
+            - text_observations: List of detected text regions with text, bounding boxes
+                                 and the level that produced them
+            - detected_languages: List of detected languages in the image
+            - escalated: Lines re-run at the accurate level (auto level only)
+    
+    Bounding boxes and dimensions are in pixels of the original image, even when
+    the engine ran on a downscaled copy.
+    """
+    level = level or config.OCR_LEVEL
+    if level not in LEVELS:
+        raise ValueError(f"Unknown recognition level: {level}")
+    
+    settings = config.INFER_SETTINGS["ocr"]
+    view, scale = inference_view(
+        image,
+        settings["max_side"] if max_side is None else max_side,
+        settings["max_megapixels"] if max_megapixels is None else max_megapixels
+    )
+    
+    if level == "auto":
+        result = _recognize(view, languages, "fast", regions)
+        result["escalated"] = escalate(view, result, languages, regions=regions)
+    else:
+        result = _recognize(view, languages, level, regions)
+    if scale == 1.0:
+        return result
+    
+    # Map results back to the original resolution
+    result["dimensions"] = image_size(image)
+    boxes = [observation["bounding_box"] for observation in result["text_observations"]]
+    boxes += [region["bounding_box"] for region in result.get("regions", {}).values()]
+    for box in boxes:
+        for key in ("x", "y", "width", "height"):
+            box[key] = int(round(box[key] / scale))
+    return result
+
 def get_supported_languages():
     """
     Get list of supported languages for OCR
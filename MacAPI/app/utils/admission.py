@@ -0,0 +1,153 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from app import config
+from app.utils.metrics import Counter, Gauge, Histogram
+
+# Priority lanes, served strictly in this order
+LANES = ("interactive", "batch")
+
+admission_wait_seconds = Histogram("admission_wait_seconds", "Time requests waited for a slot before processing",
+                                   labels=("endpoint", "lane"))
+admission_queue_depth = Gauge("admission_queue_depth", "Requests waiting for a slot",
+                              labels=("endpoint", "lane"))
+admission_rejected_total = Counter("admission_rejected_total", "Requests rejected with 429 because the queue was full",
+                                   labels=("endpoint", "lane"))
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when the wait queue of a lane is full
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"Queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Concurrency limit with a bounded wait queue per priority lane, for one endpoint
+
+    At most limit requests are processed at a time. Others wait in the queue of
+    their lane; a free slot goes to the oldest waiter of the highest priority lane.
+    When that queue is already full the request is rejected right away, so bursts
+    cost a 429 instead of memory and latency for everyone. Lives on the event loop,
+    so no locking is needed.
+    """
+
+    def __init__(self, endpoint, limit, max_queue):
+        self.endpoint = endpoint
+        self.limit = limit
+        self.max_queue = max_queue
+
+        self.active = 0
+        self._waiters = {lane: deque() for lane in LANES}
+        self._service_time = None  # moving average of seconds a slot is held
+
+    def queued(self):
+        """
+        Returns:
+            int: Requests waiting in all lanes
+        """
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def retry_after(self):
+        """
+        Estimate when a rejected request should come back
+
+        Returns:
+            int: Seconds until the current queue has likely drained, at least 1
+        """
+        if not self._service_time:
+            return 1
+        return max(1, math.ceil(self._service_time * (self.queued() + 1) / self.limit))
+
+    async def acquire(self, lane):
+        """
+        Wait for a processing slot
+
+        Args:
+            lane (str): One of LANES
+
+        Returns:
+            float: Seconds spent waiting in the queue
+
+        Raises:
+            AdmissionRejected: If the queue of the lane is full
+        """
+        if not self.limit:
+            return 0.0
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+            return 0.0
+
+        waiters = self._waiters[lane]
+        if len(waiters) >= self.max_queue:
+            admission_rejected_total.inc(self.endpoint, lane)
+            raise AdmissionRejected(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        admission_queue_depth.inc(self.endpoint, lane)
+        start_time = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the client went away, pass it on
+                self.release()
+            elif future in waiters:
+                # Still queued (release drops cancelled waiters it reaches first)
+                waiters.remove(future)
+                admission_queue_depth.dec(self.endpoint, lane)
+            raise
+        waited = time.perf_counter() - start_time
+        admission_wait_seconds.observe(waited, self.endpoint, lane)
+        return waited
+
+    def release(self, service_time=None):
+        """
+        Give a slot back, handing it straight to the next waiter if there is one
+
+        Args:
+            service_time (float): Seconds the slot was held, updates the Retry-After estimate
+        """
+        if not self.limit:
+            return
+        if service_time is not None:
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters:
+                future = waiters.popleft()
+                admission_queue_depth.dec(self.endpoint, lane)
+                # Skip waiters cancelled in this tick, their acquire has not run its cleanup yet
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.active -= 1
+
+
+# Gated paths and the endpoint name of their settings
+ENDPOINT_PATHS = {
+    "/ocr": "ocr",
+    "/ocr/document": "ocr_document",
+    "/face_quality": "face_quality",
+    "/face_quality/best": "face_quality_best",
+    "/card_detection": "card_detection",
+    "/analyze": "analyze",
+}
+
+# One gate per endpoint, keyed by path
+gates = {
+    path: AdmissionGate(endpoint, config.ADMISSION_SETTINGS[endpoint]["limit"],
+                        config.ADMISSION_SETTINGS[endpoint]["queue"])
+    for path, endpoint in ENDPOINT_PATHS.items()
+}
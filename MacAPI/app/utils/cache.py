@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from app import config
+
+
+def cache_scope(endpoint, **params):
+    """
+    Describe what a result depends on besides the image
+
+    Args:
+        endpoint (str): Endpoint name (e.g. 'ocr')
+        **params: Endpoint parameters that change the result (e.g. languages)
+
+    Returns:
+        str: Canonical JSON of engine, endpoint and parameters
+    """
+    # Engine is part of it: the stub and Vision engines give different results
+    return json.dumps([config.ENGINE, endpoint, params], sort_keys=True)
+
+
+def make_cache_key(image_bytes, endpoint, **params):
+    """
+    Build a content-addressed cache key
+
+    Args:
+        image_bytes (bytes): Raw upload bytes
+        endpoint (str): Endpoint name (e.g. 'ocr')
+        **params: Endpoint parameters that change the result (e.g. languages)
+
+    Returns:
+        str: Hex digest identifying this upload + endpoint + parameters
+    """
+    digest = hashlib.sha256(image_bytes)
+    digest.update(cache_scope(endpoint, **params).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier result cache: bounded in-memory LRU plus optional on-disk tier
+
+    Values must be JSON serializable. The disk tier stores one JSON file per key
+    and evicts the least recently used files once max_disk_bytes is exceeded.
+    """
+
+    def __init__(self, max_entries=1024, disk_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._disk_index = OrderedDict()  # key -> file size, oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        # Rebuild the disk index once, oldest files first
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def get(self, key):
+        """
+        Get cached value
+
+        Args:
+            key (str): Cache key from make_cache_key
+
+        Returns:
+            dict: Cached value, or None on a miss
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+            if key in self._disk_index:
+                try:
+                    with open(self._disk_path(key)) as f:
+                        value = json.load(f)
+                except (OSError, ValueError):
+                    # File removed or corrupted behind our back
+                    self._disk_bytes -= self._disk_index.pop(key)
+                else:
+                    self._disk_index.move_to_end(key)
+                    os.utime(self._disk_path(key))
+                    self._set_memory(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """
+        Store value in the cache
+
+        Args:
+            key (str): Cache key from make_cache_key
+            value (dict): JSON serializable value
+        """
+        with self._lock:
+            self._set_memory(key, value)
+            if self.disk_dir:
+                self._set_disk(key, value)
+
+    def _set_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _set_disk(self, key, value):
+        path = self._disk_path(key)
+        data = json.dumps(value).encode()
+
+        # Write to a temp file first so readers never see a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self._disk_bytes += len(data) - self._disk_index.pop(key, 0)
+        self._disk_index[key] = len(data)
+
+        # Evict least recently used files until we are under budget
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk_index) > 1:
+            old_key, size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._disk_path(old_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """
+        Get cache counters
+
+        Returns:
+            dict: Hits, misses, hit rate and tier sizes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk_index),
+                "disk_bytes": self._disk_bytes
+            }
+
+
+# Shared cache used by the endpoints (None when disabled)
+result_cache = ResultCache(
+    max_entries=config.CACHE_MAX_ENTRIES,
+    disk_dir=config.CACHE_DIR or None,
+    max_disk_bytes=config.CACHE_DISK_MAX_BYTES
+) if config.CACHE_ENABLED else None
@@ -0,0 +1,95 @@
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from app import config
+from app.engines import warm_engine
+
+# Shared pool, created on first use
+_executor = None
+
+# Calls submitted to the pool that have not finished yet (queued + running)
+_pending = 0
+
+
+def get_executor():
+    """
+    Get the worker pool used for engine calls
+
+    Returns:
+        concurrent.futures.Executor: Thread or process pool depending on config.EXECUTOR_KIND,
+                                     None when running inline
+    """
+    global _executor
+    if _executor is None and config.EXECUTOR_KIND != "inline":
+        if config.EXECUTOR_KIND == "process":
+            # Every worker process has its own engine, warm it as the worker starts
+            _executor = ProcessPoolExecutor(max_workers=config.EXECUTOR_WORKERS, initializer=warm_engine)
+        elif config.EXECUTOR_KIND == "thread":
+            _executor = ThreadPoolExecutor(max_workers=config.EXECUTOR_WORKERS,
+                                           thread_name_prefix="engine")
+        else:
+            raise ValueError(f"Unknown executor kind: {config.EXECUTOR_KIND}")
+    return _executor
+
+
+def start_executor():
+    """
+    Create the worker pool and warm the engine before the first request
+
+    Threads share the engine of this process, which gets one pooled request object
+    per worker thread. Process workers are started right away so each one warms
+    its own engine now instead of on its first call.
+    """
+    executor = get_executor()
+    if isinstance(executor, ProcessPoolExecutor):
+        # Each submit that finds no idle worker starts a new one
+        for future in [executor.submit(int) for _ in range(config.EXECUTOR_WORKERS)]:
+            future.result()
+    else:
+        warm_engine(copies=config.EXECUTOR_WORKERS if executor is not None else 1)
+
+
+async def run_in_executor(func, *args, **kwargs):
+    """
+    Run a blocking function in the worker pool without blocking the event loop
+
+    Args:
+        func (callable): Function to run (must be a module-level function for the process pool)
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        Any: Return value of func
+    """
+    global _pending
+    executor = get_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    _pending += 1
+    try:
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    finally:
+        _pending -= 1
+
+
+def pending_calls():
+    """
+    Get number of engine calls waiting for or running in the worker pool
+
+    Returns:
+        int: Pending calls
+    """
+    return _pending
+
+
+def shutdown_executor():
+    """
+    Shut down the worker pool, waiting for running calls to finish
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+
+class LatestFrame:
+    """
+    Single-slot mailbox between a stream's receiver and its processor
+
+    put never waits: a frame that has not been picked up yet is replaced (and
+    counted as dropped), so a processor that falls behind always gets the newest
+    frame instead of working through a backlog of stale ones.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._ready = asyncio.Event()
+        self.closed = False
+
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, data):
+        """
+        Offer a frame, replacing the waiting one
+
+        Args:
+            data (bytes): Encoded frame
+        """
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (self.received, data, time.perf_counter())
+        self.received += 1
+        self._ready.set()
+
+    def close(self):
+        """
+        Mark the end of the stream, get returns None once the slot is empty
+        """
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """
+        Wait for the newest frame
+
+        Returns:
+            tuple: (index, data, perf_counter time it arrived), None after close
+        """
+        while self._frame is None:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        frame, self._frame = self._frame, None
+        return frame
@@ -1,29 +1,405 @@
-import numpy as np
-import cv2
-from PIL import Image
 import io
+import math
 import os
+import threading
 
-def load_image(image_bytes):
+from app.utils.lazy import lazy_import
+
+# Loaded on first use, importing the app does not pay for them
+np = lazy_import("numpy")
+cv2 = lazy_import("cv2")
+Image = lazy_import("PIL.Image")
+
+# Formats the engines can read straight from the upload bytes without re-encoding
+PASSTHROUGH_FORMATS = {"JPEG", "PNG"}
+
+# Modes numpy/cv2 handle directly, anything else (palette, CMYK, 16-bit, ...) is converted to RGB
+ARRAY_MODES = {"L", "RGB", "RGBA"}
+
+def load_image(image_bytes, max_side=0):
     """
     Load image from bytes
     
     Args:
         image_bytes (bytes): Raw image bytes
+        max_side (int): Longest side that is actually needed, 0 for full resolution.
+                        JPEGs are then decoded at 1/2, 1/4 or 1/8 size directly in the
+                        DCT domain; the result is still at least max_side on its longest side
         
     Returns:
-        numpy.ndarray: Image as numpy array
+        numpy.ndarray: Image as C-contiguous numpy array (read-only, it wraps the decoded
+                       buffer instead of copying it)
     """
     image = Image.open(io.BytesIO(image_bytes))
-    return np.array(image)
+    if max_side and image.format == "JPEG" and max(image.size) > max_side:
+        scale = max_side / float(max(image.size))
+        image.draft(image.mode, (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+    if image.mode not in ARRAY_MODES:
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+def iter_pages(source, max_pages=0):
+    """
+    Decode the frames of a multi-page image (e.g. multi-page TIFF) one at a time
+    
+    Only the current frame is decoded, so memory does not grow with the page count.
+    Single-frame images yield one page.
+    
+    Args:
+        source (bytes or file): Raw image bytes or a binary file object, a file is read
+                                page by page instead of being loaded whole
+        max_pages (int): Stop after this many pages, 0 for all
+        
+    Yields:
+        tuple: (page index starting at 0, numpy.ndarray of the page)
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        pages = getattr(image, "n_frames", 1)
+        if max_pages:
+            pages = min(pages, max_pages)
+        for index in range(pages):
+            image.seek(index)
+            # Bilevel scans ("1") become grayscale, other odd modes RGB
+            frame = image.convert("L") if image.mode == "1" else image
+            if frame.mode not in ARRAY_MODES:
+                frame = frame.convert("RGB")
+            # Copy out of the frame buffer, seek() reuses it for the next page
+            yield index, np.array(frame)
+
+def sample_indices(count, max_samples=0):
+    """
+    Pick evenly spaced indices out of count items
+
+    Args:
+        count (int): Number of items
+        max_samples (int): Most indices to return, 0 for all
+
+    Returns:
+        list: Sorted indices, always including the first item
+    """
+    if not max_samples or count <= max_samples:
+        return list(range(count))
+    step = count / float(max_samples)
+    return sorted({int(i * step) for i in range(max_samples)})
+
+def iter_video_frames(path, max_frames=0):
+    """
+    Decode evenly spaced frames of a video clip one at a time
+
+    Skipped frames are only grabbed, not converted, so sampling a long clip costs
+    little more than reading it.
+
+    Args:
+        path (str): Path of the video file
+        max_frames (int): Most frames to yield, 0 for every frame
+
+    Yields:
+        tuple: (frame index in the clip starting at 0, RGB numpy.ndarray of the frame)
+
+    Raises:
+        ValueError: If the file cannot be opened as a video
+    """
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError("Could not open video")
+        count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        # Some containers do not report a frame count, then every frame is a candidate
+        wanted = set(sample_indices(count, max_frames)) if count > 0 else None
+        index = 0
+        yielded = 0
+        while capture.grab():
+            if wanted is None or index in wanted:
+                success, frame = capture.retrieve()
+                if success:
+                    yield index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    yielded += 1
+                    if max_frames and yielded >= max_frames:
+                        return
+            index += 1
+    finally:
+        capture.release()
+
+class PreparedImage:
+    """
+    Uploaded image that is decoded and converted at most once
+
+    Keeps the original upload bytes and creates the decoded array, the engine input
+    buffer and downscaled variants lazily, the first time each one is needed.
+    Pass the same object to every service so work is shared between them.
+    """
+
+    def __init__(self, image_bytes):
+        self.image_bytes = image_bytes
+        self._lock = threading.Lock()
+        self._reset()
+
+        # Only reads the header, the pixels are decoded on first use of .array
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            self.format = image.format
+            self.width, self.height = image.size
+
+    def _reset(self):
+        self._array = None
+        self._engine_bytes = None
+        self._downscaled = {}
+        self._views = {}
+
+    def __getstate__(self):
+        # Only ship the compressed bytes to process pool workers, they decode on their side
+        return {"image_bytes": self.image_bytes, "format": self.format,
+                "width": self.width, "height": self.height}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._reset()
+
+    @property
+    def array(self):
+        """
+        numpy.ndarray: Decoded image (decoded once)
+        """
+        if self._array is None:
+            with self._lock:
+                if self._array is None:
+                    self._array = load_image(self.image_bytes)
+        return self._array
+
+    @property
+    def engine_bytes(self):
+        """
+        bytes: Encoded image for engines that take a file buffer (e.g. Vision)
+
+        The original upload bytes when the format can be passed through,
+        otherwise a PNG encoded once from the upload.
+        """
+        if self._engine_bytes is None:
+            with self._lock:
+                if self._engine_bytes is None:
+                    if self.format in PASSTHROUGH_FORMATS:
+                        self._engine_bytes = self.image_bytes
+                    else:
+                        buffer = io.BytesIO()
+                        with Image.open(io.BytesIO(self.image_bytes)) as image:
+                            image.save(buffer, format="PNG", compress_level=1)
+                        self._engine_bytes = buffer.getvalue()
+        return self._engine_bytes
+
+    def decode(self, max_side=0, max_megapixels=0):
+        """
+        Decode the image now instead of on first use (e.g. from a worker thread)
+
+        Args:
+            max_side (int): Only decode the inference-sized copy for this longest side
+            max_megapixels (float): Only decode the inference-sized copy for this many megapixels
+
+        Returns:
+            numpy.ndarray: Decoded image (the inference-sized copy when limits are given)
+        """
+        if max_side or max_megapixels:
+            view, scale = inference_view(self, max_side, max_megapixels)
+            if scale < 1.0:
+                return view.array
+        return self.array
+
+    def downscaled(self, max_side):
+        """
+        Get the image scaled so its longest side is at most max_side (created once per size)
+
+        Args:
+            max_side (int): Maximum width or height in pixels
+
+        Returns:
+            numpy.ndarray: Downscaled image, or the decoded image if it is already small enough
+        """
+        if max(self.width, self.height) <= max_side:
+            return self.array
+        if max_side not in self._downscaled:
+            scale = max_side / float(max(self.width, self.height))
+            size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+            if self.format == "JPEG":
+                # Decode straight at reduced size instead of decoding full resolution first
+                source = load_image(self.image_bytes, max_side)
+            else:
+                source = self.array
+            resized = source
+            if (source.shape[1], source.shape[0]) != size:
+                resized = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+            with self._lock:
+                self._downscaled.setdefault(max_side, resized)
+        return self._downscaled[max_side]
+
+    def view(self, max_side):
+        """
+        Get the downscaled copy as an engine input (created once per size)
+
+        Args:
+            max_side (int): Maximum width or height in pixels
+
+        Returns:
+            PreparedImage: A DownscaledImage, or this image if it is already small enough
+        """
+        if max(self.width, self.height) <= max_side:
+            return self
+        view = self._views.get(max_side)
+        if view is None:
+            resized = self.downscaled(max_side)
+            with self._lock:
+                view = self._views.setdefault(max_side, DownscaledImage(resized))
+        return view
+
+class DownscaledImage(PreparedImage):
+    """
+    Downscaled copy of an upload that engines take like the upload itself
+
+    There are no upload bytes to pass through, so engine_bytes is a PNG encoded
+    once, on first use, and shared by every engine call on the copy (fast and
+    accurate passes, regions, several services of one request).
+    """
+
+    def __init__(self, array):
+        self.image_bytes = None
+        self.format = None
+        self._lock = threading.Lock()
+        self._reset()
+        self._array = array
+        self.height, self.width = array.shape[:2]
+
+    def __getstate__(self):
+        return {"array": self._array}
+
+    def __setstate__(self, state):
+        self.__init__(state["array"])
+
+    @property
+    def array(self):
+        """
+        numpy.ndarray: Downscaled image
+        """
+        return self._array
+
+    @property
+    def engine_bytes(self):
+        """
+        bytes: PNG of the downscaled image (encoded once)
+        """
+        if self._engine_bytes is None:
+            with self._lock:
+                if self._engine_bytes is None:
+                    self._engine_bytes = encode_png(self._array)
+        return self._engine_bytes
+
+def inference_scale(width, height, max_side=0, max_megapixels=0):
+    """
+    Get the scale factor that brings an image within the inference size limits
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        max_side (int): Maximum width or height in pixels, 0 for no limit
+        max_megapixels (float): Maximum number of megapixels, 0 for no limit
+
+    Returns:
+        float: Scale factor (1.0 when the image is already small enough, never upscales)
+    """
+    scale = 1.0
+    if max_side:
+        scale = min(scale, max_side / float(max(width, height)))
+    if max_megapixels:
+        scale = min(scale, (max_megapixels * 1e6 / float(width * height)) ** 0.5)
+    return scale
+
+def inference_view(image, max_side=0, max_megapixels=0):
+    """
+    Get the (possibly downscaled) image an engine should run on
+
+    Args:
+        image (PreparedImage or numpy.ndarray): Full resolution image
+        max_side (int): Maximum width or height in pixels, 0 for no limit
+        max_megapixels (float): Maximum number of megapixels, 0 for no limit
+
+    Returns:
+        tuple: (image, scale) - the input itself with scale 1.0 when no downscale is needed,
+               otherwise the downscaled copy (a DownscaledImage for a PreparedImage, a
+               numpy array for an array) and its scale relative to the original
+    """
+    if isinstance(image, PreparedImage):
+        width, height = image.width, image.height
+    else:
+        height, width = image.shape[:2]
+
+    scale = inference_scale(width, height, max_side, max_megapixels)
+    if scale >= 1.0:
+        return image, 1.0
+
+    side = max(1, int(round(max(width, height) * scale)))
+    if isinstance(image, PreparedImage):
+        # Keeps engines on the buffer path (engine_bytes) instead of re-encoding per call
+        view = image.view(side)
+        return view, view.width / float(width)
+
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    view = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    # Use the exact scale of the resized image for remapping
+    return view, view.shape[1] / float(width)
+
+def warp_card(image, corners, size=(640, 400)):
+    """
+    Warp a card quadrilateral to a flat, standard size image
+
+    Args:
+        image (numpy.ndarray): Full resolution image
+        corners (array-like): Four (x, y) corners in pixels: top-left, top-right, bottom-right, bottom-left
+        size (tuple): Output (width, height), standard card aspect ratio by default;
+                      None to keep the resolution of the card in image
+
+    Returns:
+        numpy.ndarray: Perspective corrected card
+    """
+    src_pts = np.asarray(corners, dtype=np.float32)
+    if size is None:
+        # Longest of the opposite edges, so no detail of the card is lost
+        edges = np.linalg.norm(src_pts - np.roll(src_pts, -1, axis=0), axis=1)  # top, right, bottom, left
+        size = (max(1, int(round(max(edges[0], edges[2])))), max(1, int(round(max(edges[1], edges[3])))))
+    card_w, card_h = size
+    dst_pts = np.array([[0, 0], [card_w, 0], [card_w, card_h], [0, card_h]], dtype=np.float32)
+
+    # Calculate perspective transform matrix and apply it
+    M = cv2.getPerspectiveTransform(src_pts, dst_pts)
+    return cv2.warpPerspective(image, M, (card_w, card_h))
+
+def _to_bgr(image):
+    # Arrays come from PIL in RGB(A) order, cv2 encodes BGR(A)
+    if image.ndim == 3 and image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+    if image.ndim == 3 and image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA)
+    return image
+
+def encode_png(image):
+    """
+    Encode a decoded image as fast PNG for engines that take encoded bytes
+    
+    Args:
+        image (numpy.ndarray): Image in RGB(A) order (as returned by load_image)
+        
+    Returns:
+        bytes: PNG bytes
+    """
+    success, encoded_image = cv2.imencode('.png', _to_bgr(image), [cv2.IMWRITE_PNG_COMPRESSION, 1])
+    return encoded_image.tobytes()
 
-def save_image(image, path):
+def save_image(image, path, params=None):
     """
     Save image to file
     
     Args:
-        image (numpy.ndarray): Image as numpy array
+        image (numpy.ndarray): Image in RGB(A) order (as returned by load_image)
         path (str): Path to save image
+        params (list): cv2.imwrite encode parameters (e.g. [cv2.IMWRITE_JPEG_QUALITY, 90])
         
     Returns:
         bool: True if successful
@@ -32,7 +408,7 @@ def save_image(image, path):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     
     # Save image
-    return cv2.imwrite(path, image)
+    return cv2.imwrite(path, _to_bgr(image), params or [])
 
 def draw_text_with_thai_support(image, text, position, font_scale=1.0, color=(0, 0, 255), thickness=2):
     """
@@ -0,0 +1,150 @@
+import threading
+import time
+from bisect import bisect_left
+
+from app.utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+# Log-spaced histogram buckets from 0.1 ms to 100 s (~12% wide each)
+BUCKET_EDGES = [10 ** (-4 + 6 * i / 120.0) for i in range(121)]
+
+# Time windows reported by summary(), in minutes
+WINDOWS = {"5m": 5, "1h": 60, "24h": 24 * 60}
+
+
+def empty_window():
+    """
+    Returns:
+        dict: Stats of a window without samples
+    """
+    return {"count": 0, "avg_time": 0, "min_time": 0, "max_time": 0, "p50": 0, "p95": 0, "p99": 0}
+
+
+class WindowedHistogram:
+    """
+    Streaming latency histogram with one slot per minute for the last 24 hours
+
+    Recording is O(1) and memory is fixed, so percentiles for any window up to
+    24 hours are computed without keeping individual samples.
+    """
+
+    def __init__(self, minutes=24 * 60):
+        self.minutes = minutes
+        buckets = len(BUCKET_EDGES) + 1  # plus under/overflow at both ends
+        self._counts = np.zeros((minutes, buckets), dtype=np.int64)
+        self._sums = np.zeros(minutes)
+        self._mins = np.full(minutes, np.inf)
+        self._maxs = np.zeros(minutes)
+        self._stamps = np.full(minutes, -1, dtype=np.int64)  # minute each slot belongs to
+        self._lock = threading.Lock()
+
+    def record(self, seconds, now=None):
+        """
+        Record one latency sample
+
+        Args:
+            seconds (float): Latency in seconds
+            now (float): Unix time of the sample, None for current time
+        """
+        minute = int((now or time.time()) // 60)
+        slot = minute % self.minutes
+        bucket = bisect_left(BUCKET_EDGES, seconds)
+        with self._lock:
+            if self._stamps[slot] != minute:
+                # Slot still holds data from a previous day, reuse it
+                self._counts[slot] = 0
+                self._sums[slot] = 0.0
+                self._mins[slot] = np.inf
+                self._maxs[slot] = 0.0
+                self._stamps[slot] = minute
+            self._counts[slot, bucket] += 1
+            self._sums[slot] += seconds
+            self._mins[slot] = min(self._mins[slot], seconds)
+            self._maxs[slot] = max(self._maxs[slot], seconds)
+
+    def window(self, minutes, now=None):
+        """
+        Get stats for the last minutes
+
+        Args:
+            minutes (int): Window length in minutes (at most 24 hours)
+            now (float): Unix time the window ends at, None for current time
+
+        Returns:
+            dict: count, avg_time, min_time, max_time, p50, p95, p99
+        """
+        minute = int((now or time.time()) // 60)
+        with self._lock:
+            live = (self._stamps > minute - minutes) & (self._stamps <= minute)
+            counts = self._counts[live].sum(axis=0)
+            total = float(self._sums[live].sum())
+            min_time = float(self._mins[live].min()) if live.any() else 0.0
+            max_time = float(self._maxs[live].max()) if live.any() else 0.0
+
+        count = int(counts.sum())
+        if not count:
+            return empty_window()
+
+        cumulative = np.cumsum(counts)
+
+        def percentile(q):
+            bucket = int(np.searchsorted(cumulative, q * count))
+            # Geometric middle of the bucket, clamped to what we actually saw
+            low = BUCKET_EDGES[bucket - 1] if bucket > 0 else min_time
+            high = BUCKET_EDGES[bucket] if bucket < len(BUCKET_EDGES) else max_time
+            return float(min(max(np.sqrt(low * high), min_time), max_time))
+
+        return {
+            "count": count,
+            "avg_time": total / count,
+            "min_time": min_time,
+            "max_time": max_time,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99)
+        }
+
+
+class LatencyStats:
+    """
+    WindowedHistogram per processing type
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, processing_type, seconds):
+        """
+        Record processing time of one request
+
+        Args:
+            processing_type (str): 'ocr', 'face_quality', 'card_detection', ...
+            seconds (float): Processing time in seconds
+        """
+        histogram = self._histograms.get(processing_type)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(processing_type, WindowedHistogram())
+        histogram.record(seconds)
+
+    def summary(self, processing_type):
+        """
+        Get windowed stats of a processing type
+
+        Args:
+            processing_type (str): 'ocr', 'face_quality', 'card_detection', ...
+
+        Returns:
+            dict: Stats for each of WINDOWS
+        """
+        histogram = self._histograms.get(processing_type)
+        if histogram is None:
+            return {name: empty_window() for name in WINDOWS}
+        now = time.time()
+        return {name: histogram.window(minutes, now) for name, minutes in WINDOWS.items()}
+
+
+# Shared stats fed by the endpoints (in-process, since the worker started)
+latency_stats = LatencyStats()
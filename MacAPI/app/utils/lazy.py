@@ -0,0 +1,36 @@
+import importlib
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access
+
+    Lets modules that are imported at startup (through app.main) refer to heavy
+    libraries like cv2 or numpy without loading them until a request needs them.
+    Attributes are copied onto the stand-in once looked up, so later accesses
+    cost the same as on the real module.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+
+    def __getattr__(self, attr):
+        value = getattr(importlib.import_module(self._name), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+def lazy_import(name):
+    """
+    Get a module that is imported on first use
+
+    Args:
+        name (str): Module name (e.g. 'cv2', 'PIL.Image')
+
+    Returns:
+        LazyModule: Stand-in to use like the module
+    """
+    return LazyModule(name)
@@ -0,0 +1,164 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency buckets in seconds (Prometheus "le" upper bounds)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Every metric created here, in render order
+_registry = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    Monotonic counter with optional labels, or read from func at scrape time
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=(), func=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.func = func
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        if self.func is not None:
+            return [(self.name, (), self.func())]
+        with self._lock:
+            return [(self.name, label_values, value) for label_values, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, or is read from func at scrape time
+    """
+
+    kind = "gauge"
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram:
+    """
+    Cumulative bucket histogram with optional labels
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(label_values)
+            if values is None:
+                values = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def samples(self):
+        labels = self.labels + ("le",)
+        samples = []
+        with self._lock:
+            items = [(label_values, list(values)) for label_values, values in self._values.items()]
+        for label_values, values in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", label_values + (bound,), cumulative, labels))
+            samples.append((f"{self.name}_bucket", label_values + ("+Inf",), values[-1], labels))
+            samples.append((f"{self.name}_sum", label_values, values[-2]))
+            samples.append((f"{self.name}_count", label_values, values[-1]))
+        return samples
+
+
+def render_metrics():
+    """
+    Render all metrics in Prometheus text exposition format
+
+    Returns:
+        str: Metrics text
+    """
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample in metric.samples():
+            name, label_values, value = sample[:3]
+            names = sample[3] if len(sample) > 3 else metric.labels
+            lines.append(f"{name}{_format_labels(names, label_values)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Metrics shared by the endpoints
+stage_seconds = Histogram("stage_seconds", "Time spent in each stage of a request",
+                          labels=("endpoint", "stage"))
+request_seconds = Histogram("request_seconds", "Total request time", labels=("endpoint",))
+in_flight_requests = Gauge("in_flight_requests", "Requests currently being handled",
+                           labels=("endpoint",))
+
+
+class StageTimer:
+    """
+    Times the stages of one request
+
+    Each stage is observed in stage_seconds and kept in .stages so it can be
+    returned in the response.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Time the body of a with block as stage name
+
+        Args:
+            name (str): Stage name (e.g. 'read', 'decode', 'inference')
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            stage_seconds.observe(elapsed, self.endpoint, name)
+
+    def summary(self):
+        """
+        Returns:
+            dict: Stage name -> seconds (rounded like processing_time)
+        """
+        return {name: round(seconds, 4) for name, seconds in self.stages.items()}
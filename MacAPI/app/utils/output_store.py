@@ -0,0 +1,338 @@
+import fcntl
+import os
+import re
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from app import config
+
+# Names the output writer produces (see output_writer.output_filename), the only files served
+OUTPUT_NAME = re.compile(r"[0-9a-f]{32}_[A-Za-z0-9_]+_processed\.(?:jpg|png|webp)")
+
+# Temp files of a write this old were left behind by a crash
+STALE_TMP_SECONDS = 3600
+
+# Held (flock) by the one server process that evicts
+LOCK_NAME = ".evict.lock"
+
+
+class OutputStore:
+    """
+    Index of the output directory with a byte budget and TTL
+
+    Lookups of indexed files are answered from memory. Several server processes
+    (app.serve) share the directory: a name missing from the index is looked up on
+    disk, since another process may have written it. The files a process served are
+    marked used by setting their access time, in one batch per evict_interval on
+    the background thread. The one process holding the lock file owns the directory:
+    each interval it rescans it, then evicts files older than ttl seconds and least
+    recently used files while the directory is over max_bytes (by access time, so
+    reads in every process count). The other processes only trim their index to
+    the same limits, a file they forget is looked up on disk again. When the owner
+    exits, another process takes the lock at its next interval.
+    """
+
+    def __init__(self, output_dir="output", max_bytes=1024 ** 3, ttl=7 * 24 * 3600, evict_interval=60.0):
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evict_interval = evict_interval
+
+        self._index = OrderedDict()  # name -> (size, mtime), least recently used first
+        self._bytes = 0
+        self._used = set()  # names served since the last access time update
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None
+
+        self.evicted = 0
+
+    def rebuild(self):
+        """
+        Scan the output directory and rebuild the index (least recently used files first)
+        """
+        entries = []
+        os.makedirs(self.output_dir, exist_ok=True)
+        now = time.time()
+        with os.scandir(self.output_dir) as scan:
+            for entry in scan:
+                if not entry.is_file():
+                    continue
+                if ".tmp" in entry.name:
+                    # Left over from a write interrupted by a crash (not one in progress elsewhere)
+                    try:
+                        if now - entry.stat().st_mtime > STALE_TMP_SECONDS:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+                    continue
+                if not OUTPUT_NAME.fullmatch(entry.name):
+                    continue
+                try:
+                    info = entry.stat()
+                except OSError:
+                    continue
+                entries.append((max(info.st_atime, info.st_mtime), entry.name, info.st_size, info.st_mtime))
+
+        with self._lock:
+            self._index.clear()
+            self._bytes = 0
+            for _, name, size, mtime in sorted(entries):
+                self._index[name] = (size, mtime)
+                self._bytes += size
+
+    def start(self):
+        """
+        Rebuild the index and start the eviction thread
+        """
+        self.rebuild()
+        if self._evicting():
+            self.evict()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="output-evictor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop the eviction thread and hand eviction over to another process
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.mark_used()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def add(self, name, size, mtime=None):
+        """
+        Register a file that was just written or found on disk
+
+        Args:
+            name (str): File name inside the output directory
+            size (int): File size in bytes
+            mtime (float): Modification time, None for now
+        """
+        with self._lock:
+            old = self._index.pop(name, None)
+            if old:
+                self._bytes -= old[0]
+            self._index[name] = (size, mtime or time.time())
+            self._bytes += size
+
+    def discard(self, name):
+        """
+        Forget a file that is no longer on disk (e.g. evicted by another process)
+
+        Args:
+            name (str): File name inside the output directory
+        """
+        with self._lock:
+            old = self._index.pop(name, None)
+            if old:
+                self._bytes -= old[0]
+            self._used.discard(name)
+
+    def contains(self, name):
+        """
+        Args:
+            name (str): File name inside the output directory
+
+        Returns:
+            bool: True if the file is in the index (no disk access)
+        """
+        return name in self._index
+
+    def lookup(self, name):
+        """
+        Find a file and mark it as recently used
+
+        Indexed files are answered from memory; only a name missing from the index
+        is looked up on disk.
+
+        Args:
+            name (str): File name inside the output directory
+
+        Returns:
+            tuple: (path, size, mtime), None if the name is not an output name or
+                   the file is not on disk
+        """
+        if not OUTPUT_NAME.fullmatch(name):
+            return None
+        path = os.path.join(self.output_dir, name)
+        with self._lock:
+            entry = self._index.get(name)
+            if entry is not None:
+                self._index.move_to_end(name)
+                self._used.add(name)
+                return path, entry[0], entry[1]
+        try:
+            # Possibly written by another process
+            info = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        self.add(name, info.st_size, info.st_mtime)
+        with self._lock:
+            self._used.add(name)
+        return path, info.st_size, info.st_mtime
+
+    def mark_used(self):
+        """
+        Set the access time of the files served since the last call
+
+        The access time orders eviction in whichever process owns the directory;
+        the modification time (TTL) is kept.
+
+        Returns:
+            int: Number of files updated
+        """
+        with self._lock:
+            used, self._used = self._used, set()
+            entries = [(name, self._index[name][1]) for name in used if name in self._index]
+        now = time.time()
+        for name, mtime in entries:
+            try:
+                os.utime(os.path.join(self.output_dir, name), (now, mtime))
+            except FileNotFoundError:
+                self.discard(name)
+            except OSError:
+                pass
+        return len(entries)
+
+    def evict(self, now=None, remove=True):
+        """
+        Remove expired files, then least recently used files until under the byte budget
+
+        Args:
+            now (float): Current unix time, None for time.time()
+            remove (bool): Delete the files; False only drops them from the index
+                           (processes that do not own the directory)
+
+        Returns:
+            int: Number of files removed from the index
+        """
+        now = now or time.time()
+        victims = []
+        with self._lock:
+            if self.ttl:
+                for name, (size, mtime) in list(self._index.items()):
+                    if now - mtime > self.ttl:
+                        victims.append(name)
+                        self._bytes -= size
+                        del self._index[name]
+            while self._bytes > self.max_bytes and self._index:
+                name, (size, _) = self._index.popitem(last=False)
+                victims.append(name)
+                self._bytes -= size
+
+        if not remove:
+            return len(victims)
+
+        # Delete outside the lock so lookups are not held up by the filesystem
+        for name in victims:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+        self.evicted += len(victims)
+        return len(victims)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Number of files, bytes used and budget, and whether this process evicts
+        """
+        with self._lock:
+            return {"files": len(self._index), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "ttl": self.ttl, "evicted": self.evicted, "evicting": self._lock_file is not None}
+
+    def _evicting(self):
+        # One process evicts: the one holding the lock file (released when it exits)
+        if self._lock_file is None:
+            lock_file = open(os.path.join(self.output_dir, LOCK_NAME), "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.evict_interval):
+            try:
+                self.mark_used()
+                if self._evicting():
+                    # Only the owner rescans, to count files written by every process
+                    self.rebuild()
+                    self.evict()
+                else:
+                    self.evict(remove=False)
+            except Exception as e:
+                print(f"Error evicting output files: {str(e)}")
+
+
+def parse_range(header, size):
+    """
+    Parse a single HTTP byte range
+
+    Args:
+        header (str): Range header value (e.g. 'bytes=0-1023', 'bytes=-500')
+        size (int): File size in bytes
+
+    Returns:
+        tuple: (start, end) inclusive, None to send the whole file
+               (no header or several ranges)
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    start, _, end = header[len("bytes="):].strip().partition("-")
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length <= 0:
+            raise ValueError("Empty suffix range")
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def read_range(path, start, length):
+    """
+    Read part of a file
+
+    Args:
+        path (str): File path
+        start (int): Offset of the first byte
+        length (int): Number of bytes
+
+    Returns:
+        bytes: File content
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+# Shared store of processed output images
+output_store = OutputStore(
+    output_dir=config.OUTPUT_DIR,
+    max_bytes=config.OUTPUT_MAX_BYTES,
+    ttl=config.OUTPUT_TTL,
+    evict_interval=config.OUTPUT_EVICT_INTERVAL
+)
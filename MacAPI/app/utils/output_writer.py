@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import os
+import queue
+import threading
+import time
+
+from app import config
+from app.utils.cache import cache_scope
+from app.utils.image_utils import PreparedImage, cv2, save_image
+from app.utils.metrics import Histogram
+from app.utils.output_store import output_store
+
+# cv2.imwrite parameters for each output format, from the configured quality (0-100)
+ENCODE_PARAMS = {
+    "jpg": lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    "webp": lambda quality: [cv2.IMWRITE_WEBP_QUALITY, max(1, quality)],
+    # PNG is lossless, map quality to compression effort (high quality -> fast, bigger file)
+    "png": lambda quality: [cv2.IMWRITE_PNG_COMPRESSION, max(0, min(9, (100 - quality) // 10))],
+}
+
+# Marks the end of the queue on shutdown
+_STOP = object()
+
+output_write_seconds = Histogram("output_write_seconds", "Time to encode and write one output image",
+                                 labels=("endpoint",))
+
+
+def output_filename(image_bytes, endpoint, fmt, variant="", params=None):
+    """
+    Build the content-addressed name of an output image
+
+    The output is fully determined by the upload, the engine, the endpoint and the
+    parameters that change it (e.g. the card detector), so the same request always
+    maps to the same file and concurrent requests never collide.
+
+    Args:
+        image_bytes (bytes): Raw upload bytes
+        endpoint (str): Endpoint name (e.g. 'ocr')
+        fmt (str): Output format ('jpg', 'png' or 'webp')
+        variant (str): Suffix for several outputs of one upload (e.g. '_card2')
+        params (dict): Endpoint parameters that change the output image
+
+    Returns:
+        str: File name inside the output directory
+    """
+    digest = hashlib.sha256(image_bytes)
+    # Same scope as the result cache, which includes the engine
+    digest.update(cache_scope(endpoint, **(params or {})).encode())
+    return f"{digest.hexdigest()[:32]}_{endpoint}{variant}_processed.{fmt}"
+
+
+class OutputWriter:
+    """
+    Background writer for processed output images
+
+    Requests only queue the image and get the path back right away; writer
+    threads encode and write it. The queue is bounded, so when the disk falls
+    behind, requests wait for a free slot instead of piling images in memory.
+    """
+
+    def __init__(self, store, max_queue=64, threads=1, settings=None):
+        self.store = store
+        self.output_dir = store.output_dir
+        self.threads = threads
+        self.settings = settings or {}
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._pending = {}  # file name -> threading.Event set once written
+        self._lock = threading.Lock()
+
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def start(self):
+        """
+        Start the writer threads
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        while len(self._threads) < self.threads:
+            thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """
+        Write everything still queued and stop the writer threads
+        """
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    async def submit(self, image, image_bytes, endpoint, variant="", params=None):
+        """
+        Queue a processed image for writing
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Processed image, a PreparedImage is
+                                                    decoded by the writer thread
+            image_bytes (bytes): Raw upload bytes the image was produced from
+            endpoint (str): Endpoint name, selects the output settings
+            variant (str): Suffix for several outputs of one upload (e.g. '_card2')
+            params (dict): Endpoint parameters that change the output image (e.g. detector)
+
+        Returns:
+            str: Output path (the file may not be on disk yet), None if writing is disabled
+        """
+        settings = self.settings.get(endpoint, {"write": True, "format": "jpg", "quality": 90})
+        if not settings["write"]:
+            return None
+
+        filename = output_filename(image_bytes, endpoint, settings["format"], variant, params)
+        path = os.path.join(self.output_dir, filename)
+
+        with self._lock:
+            if filename in self._pending or self.store.contains(filename):
+                # Same upload already written or on its way (the index only, no disk access here)
+                self.skipped += 1
+                return path
+            self._pending[filename] = threading.Event()
+
+        item = (image, path, filename, endpoint, ENCODE_PARAMS[settings["format"]](settings["quality"]))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Backpressure: wait for a free slot without blocking the event loop
+            await asyncio.to_thread(self._queue.put, item)
+        return path
+
+    def wait(self, filename, timeout=None):
+        """
+        Wait until a queued file has been written
+
+        Args:
+            filename (str): File name inside the output directory
+            timeout (float): Seconds to wait at most, None to wait forever
+
+        Returns:
+            bool: False if the file is still pending after timeout
+        """
+        with self._lock:
+            event = self._pending.get(filename)
+        return event is None or event.wait(timeout)
+
+    def queue_depth(self):
+        """
+        Returns:
+            int: Images waiting to be written
+        """
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            image, path, filename, endpoint, params = item
+            start_time = time.perf_counter()
+            try:
+                if os.path.isfile(path):
+                    # Written by another server process, not in this process's index yet
+                    self.store.add(filename, os.path.getsize(path))
+                    self.skipped += 1
+                    continue
+                # Write under a temp name so readers never see a partial file
+                tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+                if isinstance(image, PreparedImage):
+                    image = image.array
+                if not save_image(image, tmp_path, params):
+                    raise IOError(f"cv2.imwrite failed for {path}")
+                os.replace(tmp_path, path)
+                self.store.add(filename, os.path.getsize(path))
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error writing output image {path}: {str(e)}")
+            finally:
+                output_write_seconds.observe(time.perf_counter() - start_time, endpoint)
+                with self._lock:
+                    self._pending.pop(filename).set()
+
+
+# Shared writer used by the endpoints
+output_writer = OutputWriter(
+    output_store,
+    max_queue=config.OUTPUT_QUEUE_SIZE,
+    threads=config.OUTPUT_WRITER_THREADS,
+    settings=config.OUTPUT_SETTINGS
+)
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import threading
+from array import array
+from itertools import combinations
+
+from app import config, models
+from app.database import SessionLocal
+from app.result_writer import result_writer
+from app.utils.image_utils import PreparedImage, cv2, np
+
+# Longest side of the grayscale thumbnail hashes are computed from and matches are confirmed with
+THUMBNAIL_SIDE = 128
+
+# Thumbnails are compared in blocks of this many pixels square (about 1/16 of the image side)
+BLOCK = 8
+
+# Stored uploads with the matching hash checked against the thumbnail, newest first
+CANDIDATES = 8
+
+# The 64-bit hash is split into this many 16-bit chunks, one lookup table each
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def thumbnail(image):
+    """
+    Shrink an image to a grayscale thumbnail of THUMBNAIL_SIDE pixels on the longest side
+
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to shrink
+
+    Returns:
+        numpy.ndarray: uint8 grayscale thumbnail, same aspect ratio as the image
+    """
+    if isinstance(image, PreparedImage):
+        image = image.downscaled(THUMBNAIL_SIDE)
+    # Shrink large arrays by a whole factor first, OpenCV's fast path for area averaging
+    # (plain sampling would alias thin strokes like text into a different hash)
+    factor = min(image.shape[:2]) // (THUMBNAIL_SIDE * 2)
+    if factor > 1:
+        image = cv2.resize(image, None, fx=1.0 / factor, fy=1.0 / factor, interpolation=cv2.INTER_AREA)
+    height, width = image.shape[:2]
+    scale = min(1.0, THUMBNAIL_SIDE / max(height, width))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        code = cv2.COLOR_RGBA2GRAY if small.shape[2] == 4 else cv2.COLOR_RGB2GRAY
+        small = cv2.cvtColor(small, code)
+    return small
+
+
+def thumbnail_hash(small):
+    """
+    Args:
+        small (numpy.ndarray): Grayscale thumbnail from thumbnail()
+
+    Returns:
+        int: 64-bit difference hash between 0 and 2**64 - 1
+    """
+    grid = cv2.resize(small, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = grid[:, 1:] > grid[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def dhash(image):
+    """
+    Compute the 64-bit difference hash of an image
+
+    Compares neighbouring pixels of a 9x8 grayscale thumbnail, so the hash survives
+    re-encoding, resizing and small exposure changes but not different content.
+
+    Args:
+        image (PreparedImage or numpy.ndarray): Image to hash
+
+    Returns:
+        int: Hash between 0 and 2**64 - 1
+    """
+    return thumbnail_hash(thumbnail(image))
+
+
+def thumbnail_difference(first, second):
+    """
+    Largest mean difference over BLOCK x BLOCK blocks of two thumbnails
+
+    A re-encoded or resized copy differs by a grey level or two everywhere; a
+    different document of the same layout (another name or number on the same card
+    template) differs by tens of grey levels in the blocks with the changed text,
+    even though the whole-image mean and the hash barely move.
+
+    Args:
+        first (numpy.ndarray): Grayscale thumbnail
+        second (numpy.ndarray): Grayscale thumbnail, resized to first's size if needed
+
+    Returns:
+        float: Largest block mean of the absolute difference (0-255)
+    """
+    height, width = first.shape[:2]
+    if second.shape[:2] != (height, width):
+        second = cv2.resize(second, (width, height), interpolation=cv2.INTER_AREA)
+    difference = cv2.absdiff(first, second).astype(np.float32)
+    blocks = cv2.resize(difference, (max(1, width // BLOCK), max(1, height // BLOCK)),
+                        interpolation=cv2.INTER_AREA)
+    return float(blocks.max())
+
+
+def _scale(value, factor):
+    if isinstance(value, int):
+        return int(round(value * factor))
+    return round(value * factor, 2)
+
+
+def _rescale(value, scale_x, scale_y):
+    if isinstance(value, list):
+        return [_rescale(item, scale_x, scale_y) for item in value]
+    if not isinstance(value, dict):
+        return value
+    scaled = {}
+    for key, item in value.items():
+        if key == "bounding_box" and isinstance(item, dict):
+            scaled[key] = {name: _scale(number, scale_x if name in ("x", "width") else scale_y)
+                           for name, number in item.items()}
+        elif key == "corners":
+            scaled[key] = [[round(x * scale_x, 1), round(y * scale_y, 1)] for x, y in item]
+        else:
+            scaled[key] = _rescale(item, scale_x, scale_y)
+    return scaled
+
+
+def rescale(result, width, height):
+    """
+    Scale the pixel coordinates of a stored response to another size of the same image
+
+    Args:
+        result (dict): Stored response with dimensions, bounding_box dicts and corners
+        width (int): Width of the upload being answered
+        height (int): Height of the upload being answered
+
+    Returns:
+        dict: Copy with bounding boxes, corners and dimensions for width x height
+              (the result itself if the size is the same)
+    """
+    stored = result.get("dimensions") or {}
+    if not stored.get("width") or not stored.get("height"):
+        return result
+    if (stored["width"], stored["height"]) == (width, height):
+        return result
+    scaled = _rescale(result, width / stored["width"], height / stored["height"])
+    scaled["dimensions"] = {"width": width, "height": height}
+    return scaled
+
+
+def to_signed(value):
+    """
+    Args:
+        value (int): Unsigned 64-bit hash
+
+    Returns:
+        int: Same bits as a signed 64-bit integer (what SQLite INTEGER holds)
+    """
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _flip_masks(radius):
+    # Every chunk-sized mask with at most radius bits set, fewest bits first
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), bits):
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            masks.append(mask)
+    return masks
+
+
+class MultiIndexHash:
+    """
+    Set of 64-bit hashes searchable by Hamming distance (multi-index hashing)
+
+    Each hash is filed under each of its 16-bit chunks. Two hashes within distance d
+    have at least one chunk within d // 4 bits of each other, so a search only probes
+    the chunk values that close to the query's and checks the hashes filed there.
+    With a million hashes that is a few dozen dict lookups and about a thousand
+    popcounts, well under a millisecond. Buckets are compact arrays of uint64.
+    """
+
+    def __init__(self):
+        self._tables = [{} for _ in range(CHUNKS)]
+        self._masks = {}
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def add(self, value):
+        """
+        Add a hash (no-op if it is already in the set)
+
+        Args:
+            value (int): Unsigned 64-bit hash
+
+        Returns:
+            bool: True if the hash was added
+        """
+        chunks = [(value >> (CHUNK_BITS * i)) & CHUNK_MASK for i in range(CHUNKS)]
+        with self._lock:
+            bucket = self._tables[0].get(chunks[0])
+            if bucket is not None and value in bucket:
+                return False
+            for table, chunk in zip(self._tables, chunks):
+                bucket = table.get(chunk)
+                if bucket is None:
+                    bucket = table[chunk] = array("Q")
+                bucket.append(value)
+            self.size += 1
+        return True
+
+    def search(self, value, threshold):
+        """
+        Find the closest hash within threshold bits
+
+        Args:
+            value (int): Unsigned 64-bit hash to look up
+            threshold (int): Largest Hamming distance that counts as a match
+
+        Returns:
+            tuple: (hash, distance) of the closest match, None if there is none
+        """
+        radius = threshold // CHUNKS
+        masks = self._masks.get(radius)
+        if masks is None:
+            masks = self._masks[radius] = _flip_masks(radius)
+
+        best, best_distance = None, threshold + 1
+        for i, table in enumerate(self._tables):
+            chunk = (value >> (CHUNK_BITS * i)) & CHUNK_MASK
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if not bucket:
+                    continue
+                for candidate in bucket:
+                    distance = (candidate ^ value).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = candidate, distance
+                        if not distance:
+                            return best, 0
+        return (best, best_distance) if best is not None else None
+
+
+class NearDuplicateIndex:
+    """
+    Perceptual hashes of processed uploads, to reuse results for near-duplicates
+
+    Every processed upload's hash is stored with its response, size and a grayscale
+    thumbnail in the image_hashes table. When reuse is on, the hashes are also kept
+    in memory, one MultiIndexHash per scope (engine, endpoint and parameters). An
+    upload within threshold bits of a stored hash is only a candidate: documents of
+    one layout hash a bit or two apart. Its stored response is reused only if the
+    aspect ratio matches and no block of the thumbnails differs by more than
+    tolerance, and its pixel coordinates are scaled to the upload's size.
+    """
+
+    def __init__(self, threshold=6, reuse=False, tolerance=6.0):
+        self.threshold = threshold
+        self.reuse = reuse
+        self.tolerance = tolerance
+        self._indexes = {}  # scope -> MultiIndexHash
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def _index(self, scope):
+        index = self._indexes.get(scope)
+        if index is None:
+            with self._lock:
+                index = self._indexes.setdefault(scope, MultiIndexHash())
+        return index
+
+    def load(self):
+        """
+        Load the stored hashes into memory (at startup, when reuse is on)
+
+        Hashes stored without a thumbnail cannot be confirmed and are skipped.
+
+        Returns:
+            int: Hashes loaded
+        """
+        if not self.reuse:
+            return 0
+        count = 0
+        db = SessionLocal()
+        try:
+            rows = db.query(models.ImageHash.scope, models.ImageHash.phash).filter(
+                models.ImageHash.thumbnail.isnot(None)).yield_per(10000)
+            for scope, phash in rows:
+                count += self._index(scope).add(phash & (2 ** 64 - 1))
+        finally:
+            db.close()
+        return count
+
+    def find(self, scope, phash):
+        """
+        Look up the closest stored hash in the same scope
+
+        Args:
+            scope (str): Engine, endpoint and parameters, see cache_scope
+            phash (int): Hash of the upload
+
+        Returns:
+            tuple: (stored hash, distance), None if nothing is within the threshold
+                   or reuse is off
+        """
+        if not self.reuse:
+            return None
+        index = self._indexes.get(scope)
+        match = index.search(phash, self.threshold) if index is not None else None
+        if match is None:
+            self.misses += 1
+        return match
+
+    async def lookup(self, image, scope, size):
+        """
+        Hash an upload and look for the stored response of a confirmed near-duplicate
+
+        Args:
+            image (PreparedImage or numpy.ndarray): Upload, or a decoded copy of it
+            scope (str): Engine, endpoint and parameters, see cache_scope
+            size (tuple): (width, height) of the upload
+
+        Returns:
+            tuple: (fingerprint of the upload for add(), stored response scaled to size
+                    or None, hash distance or None)
+        """
+        small = await asyncio.to_thread(thumbnail, image)
+        fingerprint = (thumbnail_hash(small), small, size)
+        match = self.find(scope, fingerprint[0])
+        if match is None:
+            return fingerprint, None, None
+        cached = await asyncio.to_thread(self.fetch, scope, match[0], small, size)
+        return fingerprint, cached, match[1] if cached is not None else None
+
+    def _confirmed(self, row, small, size):
+        stored_width, stored_height = row.width, row.height
+        if not stored_width or not stored_height or row.thumbnail is None:
+            return False
+        # Same image at another size keeps its aspect ratio (to within rounding)
+        if abs(size[0] * stored_height - size[1] * stored_width) > 0.01 * stored_width * size[1]:
+            return False
+        stored = cv2.imdecode(np.frombuffer(row.thumbnail, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        return stored is not None and thumbnail_difference(stored, small) <= self.tolerance
+
+    def fetch(self, scope, phash, small, size):
+        """
+        Read and confirm the stored response of a hash (blocking, run it off the event loop)
+
+        Args:
+            scope (str): Engine, endpoint and parameters
+            phash (int): Stored hash returned by find
+            small (numpy.ndarray): Grayscale thumbnail of the upload
+            size (tuple): (width, height) of the upload
+
+        Returns:
+            dict: Stored response scaled to size, None if no upload stored under the
+                  hash is confirmed to be the same image (or it is not written yet)
+        """
+        db = SessionLocal()
+        try:
+            rows = db.query(models.ImageHash.result, models.ImageHash.width, models.ImageHash.height,
+                            models.ImageHash.thumbnail).filter(
+                models.ImageHash.phash == to_signed(phash), models.ImageHash.scope == scope
+            ).order_by(models.ImageHash.id.desc()).limit(CANDIDATES).all()
+        finally:
+            db.close()
+        for row in rows:
+            if self._confirmed(row, small, size):
+                self.hits += 1
+                return rescale(json.loads(row.result), *size)
+        if rows:
+            # Close hash, different image
+            self.rejected += 1
+        return None
+
+    def add(self, scope, fingerprint, result):
+        """
+        Remember the response of a processed upload
+
+        Args:
+            scope (str): Engine, endpoint and parameters
+            fingerprint (tuple): Returned by lookup for the upload
+            result (dict): JSON serializable response payload
+        """
+        phash, small, (width, height) = fingerprint
+        if self.reuse:
+            # Different images can share a hash, so the row is stored even if the hash is known
+            self._index(scope).add(phash)
+        encoded = cv2.imencode(".png", small)[1].tobytes()
+        result_writer.add_image_hash(scope, to_signed(phash), json.dumps(result), width, height, encoded)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Whether reuse is on, threshold, tolerance, hashes in memory, hits,
+                  misses and rejected candidates
+        """
+        return {"reuse": self.reuse, "threshold": self.threshold, "tolerance": self.tolerance,
+                "hashes": sum(index.size for index in list(self._indexes.values())),
+                "hits": self.hits, "misses": self.misses, "rejected": self.rejected}
+
+
+# Shared index used by the endpoints
+near_duplicates = NearDuplicateIndex(threshold=config.PHASH_THRESHOLD, reuse=config.PHASH_REUSE,
+                                     tolerance=config.PHASH_VERIFY_TOLERANCE)
@@ -0,0 +1,67 @@
+import os
+
+from fastapi import HTTPException
+
+from app import config
+
+# Read uploads in pieces of this size so the cap is checked before everything is in memory
+CHUNK_SIZE = 1024 * 1024
+
+
+async def read_upload(file, max_bytes=None):
+    """
+    Read an uploaded file in chunks, enforcing a size cap
+
+    Args:
+        file (UploadFile): Uploaded file
+        max_bytes (int): Largest accepted size, None for config.MAX_UPLOAD_BYTES
+
+    Returns:
+        bytes: File content
+
+    Raises:
+        HTTPException: 413 if the file is larger than max_bytes
+    """
+    max_bytes = config.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large, the limit is {max_bytes} bytes")
+
+    chunks = []
+    total = 0
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large, the limit is {max_bytes} bytes")
+        chunks.append(chunk)
+
+    # A single chunk is returned as is, several are joined with one copy
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+def check_upload_size(file, max_bytes=None):
+    """
+    Enforce the size cap on an upload that is used straight from its spooled file
+    instead of being read into memory
+
+    Args:
+        file (UploadFile): Uploaded file
+        max_bytes (int): Largest accepted size, None for config.MAX_UPLOAD_BYTES
+
+    Returns:
+        int: File size in bytes
+
+    Raises:
+        HTTPException: 413 if the file is larger than max_bytes
+    """
+    max_bytes = config.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    size = file.size
+    if size is None:
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+    file.file.seek(0)
+    if size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File too large, the limit is {max_bytes} bytes")
+    return size
@@ -0,0 +1,2 @@
+# Benchmarks for the API. Run from the MacAPI directory, e.g.
+#   python -m benchmarks.executor_throughput
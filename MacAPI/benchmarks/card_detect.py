@@ -0,0 +1,58 @@
+"""
+Card detection latency and corner accuracy per detector
+
+Runs detect_cards on synthetic scenes (cards rotated and in perspective on a
+textured background) and compares the detected corners with the true ones.
+A card counts as found when every corner is within 2% of the image diagonal.
+'stub' is the old full-frame path, 'vision' needs macOS.
+
+    python -m benchmarks.card_detect --detectors stub,opencv --scenes 20 --cards 2
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.card_detect import detect_cards
+from app.utils.image_utils import PreparedImage
+from benchmarks.synthetic import encode_image, make_card_scene
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--detectors", default="stub,opencv")
+    parser.add_argument("--scenes", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=1, help="Cards per scene")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    args = parser.parse_args()
+
+    scenes = []
+    for seed in range(args.scenes):
+        image, truths = make_card_scene(args.width, args.height, args.cards, seed)
+        scenes.append((encode_image(image), truths))
+    diagonal = np.hypot(args.width, args.height)
+
+    print(f"scenes={args.scenes} cards/scene={args.cards} size={args.width}x{args.height}")
+    for detector in args.detectors.split(","):
+        elapsed = 0.0
+        found = 0
+        errors = []
+        for data, truths in scenes:
+            image = PreparedImage(data)
+            image.decode()
+            start_time = time.perf_counter()
+            cards = detect_cards(image, detector=detector)
+            elapsed += time.perf_counter() - start_time
+            for truth in truths:
+                error = min((float(np.linalg.norm(card["corners"] - truth, axis=1).max()) for card in cards),
+                            default=diagonal)
+                errors.append(error)
+                found += error < 0.02 * diagonal
+        total = args.scenes * args.cards
+        print(f"{detector:8s} {elapsed / args.scenes * 1000:8.1f} ms/scene (incl. warps)  found {found}/{total}  "
+              f"median corner error {np.median(errors):8.1f} px")
+
+
+if __name__ == "__main__":
+    main()
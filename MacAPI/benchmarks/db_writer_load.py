@@ -0,0 +1,78 @@
+"""
+Requests/second under concurrent uploads with per-request commits vs. the batched result writer
+
+Each mode runs in its own process with a fresh SQLite database in a temp directory.
+
+    python -m benchmarks.db_writer_load --requests 400 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _load(requests, concurrency):
+    import httpx
+    from app.main import app
+    from app.result_writer import result_writer
+    from benchmarks.synthetic import encode_image, make_document_image
+
+    # Small image so the database write is a visible part of each request
+    data = encode_image(make_document_image(320, 200))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    await app.router.startup()
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def one(index):
+            async with semaphore:
+                response = await client.post("/face_quality",
+                                             files={"file": (f"{index}.jpg", data, "image/jpeg")})
+                response.raise_for_status()
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - start_time
+    await app.router.shutdown()
+
+    return {"elapsed": elapsed, "rps": requests / elapsed,
+            "written": result_writer.written, "batches": result_writer.batches}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mode", choices=["sync", "batched"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: the app is imported from the temp directory so it gets its own database
+        print(json.dumps(asyncio.run(_load(args.requests, args.concurrency))))
+        return
+
+    results = {}
+    for mode in ("sync", "batched"):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, DB_WRITER=mode, CACHE_ENABLED="0", ENGINE="stub",
+                       PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.db_writer_load", "--mode", mode,
+                 "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+                cwd=workdir, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"requests={args.requests} concurrency={args.concurrency}")
+    for mode, result in results.items():
+        print(f"{mode:8s} {result['rps']:8.1f} req/s  rows={result['written']} transactions={result['batches']}")
+    print(f"speedup  x{results['batched']['rps'] / results['sync']['rps']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
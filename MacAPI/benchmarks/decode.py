@@ -0,0 +1,91 @@
+"""
+Decode time and peak RSS of load_image on large JPEGs: full decode vs. draft (DCT-domain) decode
+
+Each mode runs in its own process so peak RSS is not shared between them.
+
+    python -m benchmarks.decode --width 6000 --height 4000 --max-side 2048
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / 1024.0 / (1024.0 if sys.platform == "darwin" else 1.0)
+
+
+def run_mode(mode, path, max_side, repeat):
+    import numpy as np
+    from PIL import Image
+    from app.utils.image_utils import load_image
+
+    with open(path, "rb") as f:
+        image_bytes = f.read()
+
+    if mode == "before":
+        # Previous load_image: decode full resolution, then copy into a new array
+        decode = lambda: np.array(Image.open(io.BytesIO(image_bytes)))
+    elif mode == "full":
+        decode = lambda: load_image(image_bytes)
+    else:
+        decode = lambda: load_image(image_bytes, max_side)
+
+    rss_before = peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        array = decode()
+        times.append(time.perf_counter() - start_time)
+        shape = array.shape
+        del array
+    return {"ms": min(times) * 1000, "peak_rss_mb": peak_rss_mb() - rss_before, "shape": list(shape)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image", help="JPEG to decode (synthetic if omitted)")
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--max-side", type=int, default=2048)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.image, args.max_side, args.repeat)))
+        return
+
+    path = args.image
+    if not path:
+        from benchmarks.synthetic import encode_image, make_document_image
+        path = os.path.join(ROOT, "bench_decode.jpg")
+        with open(path, "wb") as f:
+            f.write(encode_image(make_document_image(args.width, args.height)))
+
+    try:
+        print(f"image={path} size={os.path.getsize(path) / 1e6:.2f} MB max_side={args.max_side}")
+        for mode in ("before", "full", "draft"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.decode", "--mode", mode, "--image", path,
+                 "--max-side", str(args.max_side), "--repeat", str(args.repeat)],
+                cwd=ROOT, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:7s} {result['ms']:8.1f} ms  peak RSS +{result['peak_rss_mb']:7.1f} MB  "
+                  f"shape {tuple(result['shape'])}")
+    finally:
+        if not args.image:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Time to first page, total time and peak RSS of /ocr/document by page count
+
+Each page count runs in its own process (fresh database in a temp directory) so
+peak RSS is not shared between runs. The endpoint is called in-process and its
+NDJSON stream is consumed line by line.
+
+    python -m benchmarks.document --pages 1,10,40 --width 2480 --height 3508
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / 1024.0 / (1024.0 if sys.platform == "darwin" else 1.0)
+
+
+async def _run(path):
+    from fastapi import UploadFile
+    from starlette.datastructures import Headers
+    from app.main import app, ocr_document
+
+    await app.router.startup()
+    with open(path, "rb") as f:
+        upload = UploadFile(f, filename=os.path.basename(path), headers=Headers({"content-type": "image/tiff"}))
+        start_time = time.perf_counter()
+        response = await ocr_document(upload, None)
+        first_page = None
+        lines = 0
+        async for _ in response.body_iterator:
+            if first_page is None:
+                first_page = time.perf_counter() - start_time
+            lines += 1
+        elapsed = time.perf_counter() - start_time
+    await app.router.shutdown()
+    return {"first_page": first_page, "elapsed": elapsed, "lines": lines,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def make_document(path, pages, width, height):
+    from PIL import Image
+    from benchmarks.synthetic import make_document_image
+
+    frames = [Image.fromarray(make_document_image(width, height, lines=12, seed=seed)) for seed in range(min(pages, 4))]
+    frames = [frames[index % len(frames)] for index in range(pages)]
+    frames[0].save(path, "TIFF", save_all=True, append_images=frames[1:], compression="tiff_lzw")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", default="1,10,40", help="Comma-separated page counts")
+    parser.add_argument("--width", type=int, default=2480)
+    parser.add_argument("--height", type=int, default=3508)
+    parser.add_argument("--document", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.document:
+        # Child process: the app is imported from the temp directory so it gets its own database
+        print(json.dumps(asyncio.run(_run(args.document))))
+        return
+
+    print(f"page size={args.width}x{args.height}")
+    for pages in [int(count) for count in args.pages.split(",")]:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "document.tif")
+            make_document(path, pages, args.width, args.height)
+            env = dict(os.environ, CACHE_ENABLED="0", ENGINE="stub", MAX_UPLOAD_BYTES=str(2 ** 31),
+                       PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.document", "--document", path],
+                cwd=workdir, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"pages={pages:4d} size={os.path.getsize(path) / 1e6:7.1f} MB  "
+                  f"first page {result['first_page'] * 1000:7.1f} ms  total {result['elapsed']:6.2f} s  "
+                  f"peak RSS {result['peak_rss_mb']:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+OCR latency and text-match rate when the image is downscaled before inference
+
+Runs recognize_text on every image of a folder (or on synthetic phone-sized
+images) at each max side and compares the recognized lines with the
+full resolution result.
+
+    python -m benchmarks.downscale --images samples/ --sides 0,3000,2048,1600,1280,1024,800
+"""
+import argparse
+import os
+import time
+
+from app import config
+from app.services.ocr import recognize_text
+from app.utils.image_utils import PreparedImage
+from benchmarks.synthetic import encode_image, make_document_image
+
+
+def load_samples(folder, count):
+    if folder:
+        names = sorted(name for name in os.listdir(folder)
+                       if name.lower().endswith((".jpg", ".jpeg", ".png", ".tif", ".tiff")))
+        samples = []
+        for name in names:
+            with open(os.path.join(folder, name), "rb") as f:
+                samples.append((name, f.read()))
+        return samples
+    # Phone camera sized synthetic cards
+    return [(f"synthetic_{seed}.jpg", encode_image(make_document_image(4000, 3000, seed=seed)))
+            for seed in range(count)]
+
+
+def match_rate(reference, text):
+    """
+    Fraction of the reference lines that were recognized again
+    """
+    reference_lines = [observation["text"] for observation in reference["text_observations"]] \
+        or reference["text"].split()
+    lines = set(observation["text"] for observation in text["text_observations"]) or set(text["text"].split())
+    if not reference_lines:
+        return 1.0
+    return sum(1 for line in reference_lines if line in lines) / len(reference_lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", help="folder with sample images (synthetic images if omitted)")
+    parser.add_argument("--count", type=int, default=4, help="number of synthetic images")
+    parser.add_argument("--sides", default="0,3000,2048,1600,1280,1024,800",
+                        help="comma-separated max sides, 0 = full resolution")
+    parser.add_argument("--engine", default=config.ENGINE)
+    args = parser.parse_args()
+
+    config.ENGINE = args.engine
+    samples = load_samples(args.images, args.count)
+    sides = [int(side) for side in args.sides.split(",")]
+
+    # Full resolution reference, decoded up front so only inference is timed
+    prepared = [(name, PreparedImage(data)) for name, data in samples]
+    references = {name: recognize_text(image, max_side=0) for name, image in prepared}
+
+    print(f"engine={args.engine} images={len(samples)}")
+    print(f"{'max_side':>9s} {'ms/image':>9s} {'speedup':>8s} {'match':>7s}")
+    baseline = None
+    for side in sides:
+        elapsed = 0.0
+        matches = []
+        for name, data in samples:
+            # Fresh PreparedImage so the downscale is part of the measured cost
+            image = PreparedImage(data)
+            image.decode()
+            start_time = time.perf_counter()
+            result = recognize_text(image, max_side=side)
+            elapsed += time.perf_counter() - start_time
+            matches.append(match_rate(references[name], result))
+        per_image = elapsed / len(samples) * 1000
+        baseline = baseline or per_image
+        print(f"{side or 'full':>9} {per_image:9.1f} {baseline / per_image:7.2f}x {sum(matches) / len(matches):7.1%}")
+
+
+if __name__ == "__main__":
+    main()
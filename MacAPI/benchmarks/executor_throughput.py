@@ -0,0 +1,60 @@
+"""
+Throughput of engine calls run inline on the event loop vs. through the worker pool
+
+    python -m benchmarks.executor_throughput --requests 64 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app import config
+from app.services.ocr import recognize_text
+from app.utils import executor
+from benchmarks.synthetic import make_document_image
+
+
+async def _run(kind, image, requests, concurrency):
+    config.EXECUTOR_KIND = kind
+    executor.shutdown_executor()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await executor.run_in_executor(recognize_text, image)
+
+    # Warm up the pool (process workers import the engine on first call)
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start_time
+    executor.shutdown_executor()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--width", type=int, default=2400)
+    parser.add_argument("--height", type=int, default=1600)
+    parser.add_argument("--engine", default="stub")
+    args = parser.parse_args()
+
+    # Also export it so spawned process-pool workers pick the same engine
+    config.ENGINE = os.environ["ENGINE"] = args.engine
+    image = make_document_image(args.width, args.height)
+
+    print(f"engine={args.engine} image={args.width}x{args.height} "
+          f"requests={args.requests} concurrency={args.concurrency} workers={config.EXECUTOR_WORKERS}")
+    baseline = None
+    for kind in ("inline", "thread", "process"):
+        elapsed = asyncio.run(_run(kind, image, args.requests, args.concurrency))
+        throughput = args.requests / elapsed
+        baseline = baseline or throughput
+        print(f"{kind:8s} {elapsed:8.3f}s {throughput:8.2f} req/s  x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
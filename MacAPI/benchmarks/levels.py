@@ -0,0 +1,51 @@
+"""
+OCR latency, escalation rate and agreement with the accurate level for fast, accurate and auto
+
+Runs recognize_text at each level on every image of a folder (or on synthetic
+cards) and compares the recognized text with the accurate result. Run on macOS
+for Vision numbers; the stub engine only approximates the cost difference.
+
+    python -m benchmarks.levels --images samples/ --threshold 0.6
+"""
+import argparse
+import time
+
+from app import config
+from app.services.ocr import recognize_text
+from app.utils.image_utils import PreparedImage
+from benchmarks.downscale import load_samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", help="Folder of card photos (synthetic cards if omitted)")
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=config.OCR_ESCALATE_CONFIDENCE)
+    args = parser.parse_args()
+
+    config.OCR_ESCALATE_CONFIDENCE = args.threshold
+    samples = []
+    for name, data in load_samples(args.images, args.count):
+        image = PreparedImage(data)
+        image.decode(**config.INFER_SETTINGS["ocr"])
+        samples.append((name, image))
+
+    references = {name: recognize_text(image, level="accurate")["text"] for name, image in samples}
+
+    print(f"images={len(samples)} threshold={args.threshold}")
+    for level in ("accurate", "fast", "auto"):
+        elapsed = 0.0
+        escalated = 0
+        same = 0
+        for name, image in samples:
+            start_time = time.perf_counter()
+            result = recognize_text(image, level=level)
+            elapsed += time.perf_counter() - start_time
+            escalated += bool(result.get("escalated"))
+            same += result["text"] == references[name]
+        print(f"{level:8s} {elapsed / len(samples) * 1000:8.1f} ms/image  escalated {escalated}/{len(samples)}  "
+              f"same text as accurate {same}/{len(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+In-process ASGI load generator for /ocr, /face_quality and /card_detection
+
+Sends synthetic card images through the full app (middleware, cache lookup,
+decode, engine pool, output writer, result writer) with httpx at a fixed
+concurrency, using the deterministic stub engine and a fresh database in a temp
+directory. Reports throughput and p50/p95/p99 latency per endpoint.
+
+    python -m benchmarks.load --requests 200 --concurrency 8 --json load.json
+    python -m benchmarks.load --requests 200 --concurrency 8 --compare load.json
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.report import compare, summarize, write_results
+from benchmarks.synthetic import encode_image, make_document_image
+
+ENDPOINTS = ("ocr", "face_quality", "card_detection")
+
+
+async def _load(app, endpoint, images, requests, concurrency):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+        async def one(index):
+            nonlocal errors
+            data = images[index % len(images)]
+            async with semaphore:
+                start_time = time.perf_counter()
+                response = await client.post(f"/{endpoint}", files={"file": (f"{index}.jpg", data, "image/jpeg")})
+                latencies.append(time.perf_counter() - start_time)
+                if response.status_code != 200:
+                    errors += 1
+
+        # Warm up: first requests create pooled request objects and fill caches
+        await asyncio.gather(*(one(index) for index in range(concurrency)))
+        latencies.clear()
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - start_time
+
+    result = summarize(latencies)
+    result.update({"rps": round(requests / elapsed, 2), "errors": errors})
+    return result
+
+
+async def _run(args):
+    from app.main import app
+
+    images = [encode_image(make_document_image(args.width, args.height, seed=seed)) for seed in range(args.images)]
+    await app.router.startup()
+    try:
+        return {endpoint: await _load(app, endpoint, images, args.requests, args.concurrency)
+                for endpoint in args.endpoints.split(",")}
+    finally:
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=16, help="Distinct synthetic images")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache on")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    # The app reads its settings on import and opens ./test.db on startup, so set up first
+    os.environ.setdefault("ENGINE", "stub")
+    os.environ["CACHE_ENABLED"] = "1" if args.cache else "0"
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        results = asyncio.run(_run(args))
+
+    print(f"requests={args.requests} concurrency={args.concurrency} image={args.width}x{args.height} "
+          f"engine={os.environ['ENGINE']}")
+    for endpoint, metrics in results.items():
+        print(f"{endpoint:16s} {metrics['rps']:8.1f} req/s  p50 {metrics['p50_ms']:8.1f} ms  "
+              f"p95 {metrics['p95_ms']:8.1f} ms  p99 {metrics['p99_ms']:8.1f} ms  errors {metrics['errors']}")
+
+    if json_path:
+        write_results(json_path, "load", vars(args), results)
+    if compare_path and compare(compare_path, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Micro-benchmarks of the per-request building blocks
+
+- load_image: full decode and reduced-resolution (draft) decode of a JPEG, PNG decode
+- encode_png: the PNG re-encode used to hand decoded arrays to Vision
+- save_image: encoding and writing the output image in each output format
+- db: one commit per row vs. bulk insert of a batch, on a fresh SQLite database (WAL)
+
+    python -m benchmarks.micro --repeat 30 --json micro.json
+    python -m benchmarks.micro --compare micro.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import cv2
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, set_sqlite_pragma
+from app.models import ProcessingResult
+from app.utils.image_utils import encode_png, load_image, save_image
+from app.utils.output_writer import ENCODE_PARAMS
+from benchmarks.report import compare, time_calls, write_results
+from benchmarks.synthetic import encode_image, make_document_image
+
+
+def image_benchmarks(width, height, repeat, workdir):
+    image = make_document_image(width, height)
+    jpeg = encode_image(image, ".jpg")
+    png = encode_image(image, ".png")
+    # Inference-sized copy, as handed to the engine
+    scale = 2048.0 / max(width, height)
+    view = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    results = {
+        "load_image_jpeg_full": time_calls(lambda: load_image(jpeg), repeat),
+        # Half of the longest side, so libjpeg can decode at 1/2 scale
+        "load_image_jpeg_draft_half": time_calls(lambda: load_image(jpeg, max(width, height) // 2), repeat),
+        "load_image_png": time_calls(lambda: load_image(png), repeat),
+        "encode_png_full": time_calls(lambda: encode_png(image), repeat),
+        "encode_png_2048": time_calls(lambda: encode_png(view), repeat),
+    }
+    for fmt, params in ENCODE_PARAMS.items():
+        path = os.path.join(workdir, f"output.{fmt}")
+        results[f"save_image_{fmt}"] = time_calls(lambda: save_image(image, path, params(90)), repeat)
+        results[f"save_image_{fmt}"]["bytes"] = os.path.getsize(path)
+    return results
+
+
+def db_benchmarks(repeat, batch, workdir):
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+                           connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", set_sqlite_pragma)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def row(index):
+        return {"filename": f"{index}.jpg", "processing_type": "ocr", "result": "line1 line2 line3",
+                "processing_time": 0.05, "created_at": datetime.utcnow()}
+
+    def commit_one():
+        with Session() as db:
+            db.add(ProcessingResult(**row(0)))
+            db.commit()
+
+    def commit_batch():
+        with Session() as db:
+            db.bulk_insert_mappings(ProcessingResult, [row(index) for index in range(batch)])
+            db.commit()
+
+    results = {
+        "db_commit_per_row": time_calls(commit_one, repeat),
+        f"db_bulk_insert_{batch}": time_calls(commit_batch, repeat),
+    }
+    per_row = results[f"db_bulk_insert_{batch}"]["mean_ms"] / batch
+    results["db_rows_per_s"] = {
+        "commit_per_row_per_s": round(1000.0 / results["db_commit_per_row"]["mean_ms"], 1),
+        "bulk_insert_per_s": round(1000.0 / per_row, 1)
+    }
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=100, help="Rows per bulk insert")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = image_benchmarks(args.width, args.height, args.repeat, workdir)
+        results.update(db_benchmarks(args.repeat, args.batch, workdir))
+
+    print(f"image={args.width}x{args.height} repeat={args.repeat}")
+    for name, metrics in results.items():
+        if "p50_ms" in metrics:
+            print(f"{name:28s} mean {metrics['mean_ms']:9.3f} ms  p50 {metrics['p50_ms']:9.3f}  "
+                  f"p95 {metrics['p95_ms']:9.3f}" + (f"  {metrics['bytes'] / 1e6:.2f} MB" if "bytes" in metrics else ""))
+        else:
+            print(f"{name:28s} " + "  ".join(f"{key} {value}" for key, value in metrics.items()))
+
+    if args.json:
+        write_results(args.json, "micro", vars(args), results)
+    if args.compare and compare(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Near-duplicate lookup: perceptual hash cost and Hamming search over many stored hashes
+
+- dhash_*: hashing a JPEG upload (decoded at thumbnail size), the inference-sized
+  copy the endpoints hash and a full resolution array
+- index_build: adding --size random hashes to a MultiIndexHash
+- search_near: looking up a stored hash with a few bits flipped (a match)
+- search_miss: looking up a random hash (no match, the usual case)
+- scan_numpy: the same lookup as a vectorized linear scan, for reference
+
+    python -m benchmarks.phash --size 1000000 --json phash.json
+    python -m benchmarks.phash --size 1000000 --compare phash.json
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from app.utils.image_utils import PreparedImage
+from app.utils.phash import MultiIndexHash, dhash
+from benchmarks.report import compare, summarize, time_calls, write_results
+from benchmarks.synthetic import encode_image, make_document_image
+
+# Set bits of every byte value
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _flip(value, bits, rng):
+    for position in rng.choice(64, size=bits, replace=False):
+        value ^= 1 << int(position)
+    return value
+
+
+def _time_each(func, queries):
+    seconds = []
+    for query in queries:
+        start_time = time.perf_counter()
+        func(query)
+        seconds.append(time.perf_counter() - start_time)
+    return summarize(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000000, help="Stored hashes")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--threshold", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    image = make_document_image(4000, 3000)
+    # Endpoints hash the inference-sized copy they decode anyway
+    scale = 2048.0 / max(image.shape[:2])
+    view = cv2.resize(image, (int(image.shape[1] * scale), int(image.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    jpeg = encode_image(image, ".jpg")
+    results = {
+        "dhash_jpeg": time_calls(lambda: dhash(PreparedImage(jpeg)), args.repeat),
+        "dhash_view_2048": time_calls(lambda: dhash(view), args.repeat),
+        "dhash_full": time_calls(lambda: dhash(image), args.repeat),
+    }
+
+    rng = np.random.default_rng(0)
+    stored = rng.integers(0, 2 ** 64, size=args.size, dtype=np.uint64, endpoint=False)
+    values = stored.tolist()
+    index = MultiIndexHash()
+    start_time = time.perf_counter()
+    for value in values:
+        index.add(value)
+    results["index_build"] = summarize([time.perf_counter() - start_time])
+    results["index_build"]["hashes"] = index.size
+
+    near = [_flip(values[i], int(rng.integers(1, args.threshold + 1)), rng)
+            for i in rng.integers(0, args.size, size=args.queries)]
+    misses = rng.integers(0, 2 ** 64, size=args.queries, dtype=np.uint64).tolist()
+    found = sum(index.search(query, args.threshold) is not None for query in near)
+    results["search_near"] = _time_each(lambda query: index.search(query, args.threshold), near)
+    results["search_near"]["found"] = f"{found}/{len(near)}"
+    results["search_miss"] = _time_each(lambda query: index.search(query, args.threshold), misses)
+
+    packed = stored.view(np.uint8).reshape(-1, 8)
+
+    def scan(query):
+        distances = POPCOUNT[packed ^ np.array([query], dtype=np.uint64).view(np.uint8)].sum(axis=1)
+        return int(distances.argmin())
+
+    results["scan_numpy"] = _time_each(scan, misses[:max(1, args.queries // 50)])
+
+    print(f"size={args.size} queries={args.queries} threshold={args.threshold}")
+    for name, metrics in results.items():
+        extra = "".join(f"  {key} {metrics[key]}" for key in ("hashes", "found") if key in metrics)
+        print(f"{name:16s} p50 {metrics['p50_ms']:9.3f} ms  p95 {metrics['p95_ms']:9.3f} ms{extra}")
+
+    if args.json:
+        write_results(args.json, "phash", vars(args), results)
+    if args.compare and compare(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
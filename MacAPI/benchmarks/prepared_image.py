@@ -0,0 +1,71 @@
+"""
+Time and memory spent preparing engine input: per-service PNG re-encode vs. PreparedImage
+
+The old path decodes the upload and then every service PNG-encodes the array and
+copies the bytes twice. PreparedImage passes the original JPEG/PNG bytes through.
+
+    python -m benchmarks.prepared_image --width 4000 --height 3000 --services 3
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+
+from app.utils.image_utils import PreparedImage, load_image
+from benchmarks.synthetic import encode_image, make_document_image
+
+
+def old_path(image_bytes, services):
+    image = load_image(image_bytes)
+    for _ in range(services):
+        success, encoded_image = cv2.imencode('.png', image)
+        data = encoded_image.tobytes()
+        data = encoded_image.tobytes()
+    return data
+
+
+def prepared_path(image_bytes, services):
+    image = PreparedImage(image_bytes)
+    for _ in range(services):
+        data = image.engine_bytes
+    # save_image and the response still need the pixels, decode them once
+    image.array
+    return data
+
+
+def measure(func, image_bytes, services, repeat):
+    # Time without tracing, tracemalloc slows allocations down
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(image_bytes, services)
+        times.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    func(image_bytes, services)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--services", type=int, default=3, help="services fed from one upload")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    image_bytes = encode_image(make_document_image(args.width, args.height))
+    print(f"upload={len(image_bytes) / 1e6:.2f} MB image={args.width}x{args.height} services={args.services}")
+
+    old_time, old_peak = measure(old_path, image_bytes, args.services, args.repeat)
+    new_time, new_peak = measure(prepared_path, image_bytes, args.services, args.repeat)
+    print(f"{'old':9s} {old_time * 1000:9.1f} ms  peak {old_peak / 1e6:8.1f} MB")
+    print(f"{'prepared':9s} {new_time * 1000:9.1f} ms  peak {new_peak / 1e6:8.1f} MB")
+    print(f"saved     {(old_time - new_time) * 1000:9.1f} ms  peak {(old_peak - new_peak) / 1e6:8.1f} MB per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+OCR latency for the whole card vs. only a few regions of interest
+
+Runs recognize_text on synthetic phone-sized card photos, once on the whole
+image and once restricted to the given regions (all regions in one engine call).
+Both read the same inference-sized decode, which is done up front and not timed.
+
+    python -m benchmarks.regions --count 8 --width 4000 --height 3000
+"""
+import argparse
+import time
+
+from app import config
+from app.services.ocr import parse_regions, recognize_text
+from app.utils.image_utils import PreparedImage
+from benchmarks.synthetic import encode_image, make_document_image
+
+# Name, ID number and date of birth fields of a Thai ID card layout
+DEFAULT_REGIONS = '{"name": [0.3, 0.28, 0.6, 0.08], "id_number": [0.35, 0.14, 0.5, 0.07], ' \
+                  '"date_of_birth": [0.3, 0.5, 0.4, 0.07]}'
+
+
+def timed(func, *args, **kwargs):
+    start_time = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--regions", default=DEFAULT_REGIONS, help="Regions as accepted by /ocr")
+    args = parser.parse_args()
+
+    regions = parse_regions(args.regions)
+    samples = []
+    for seed in range(args.count):
+        image = PreparedImage(encode_image(make_document_image(args.width, args.height, seed=seed)))
+        image.decode(**config.INFER_SETTINGS["ocr"])
+        samples.append(image)
+
+    full = regional = 0.0
+    for image in samples:
+        full += timed(recognize_text, image)
+        regional += timed(recognize_text, image, regions=regions)
+
+    print(f"images={args.count} size={args.width}x{args.height} regions={len(regions)}")
+    print(f"whole image {full / args.count * 1000:8.1f} ms/image")
+    print(f"regions     {regional / args.count * 1000:8.1f} ms/image")
+    print(f"speedup     x{full / regional:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Percentiles, JSON results and regression comparison shared by the benchmarks
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(seconds):
+    """
+    Summarize latency samples
+
+    Args:
+        seconds (list): Latencies in seconds
+
+    Returns:
+        dict: count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms
+    """
+    samples = np.asarray(seconds, dtype=np.float64) * 1000.0
+    if not len(samples):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"count": int(len(samples)), "mean_ms": round(float(samples.mean()), 3), "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(samples.max()), 3)}
+
+
+def time_calls(func, repeat, warmup=2):
+    """
+    Time repeated calls of func
+
+    Args:
+        func (callable): Function without arguments
+        repeat (int): Timed calls
+        warmup (int): Untimed calls made first
+
+    Returns:
+        dict: Latency summary (see summarize)
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start_time)
+    return summarize(samples)
+
+
+def metadata():
+    """
+    Returns:
+        dict: Where and when the results were produced
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def write_results(path, benchmark, params, results):
+    """
+    Write results as JSON
+
+    Args:
+        path (str): Output file
+        benchmark (str): Benchmark name
+        params (dict): Arguments the benchmark ran with
+        results (dict): name -> metrics
+    """
+    with open(path, "w") as f:
+        json.dump({"benchmark": benchmark, "meta": metadata(), "params": params, "results": results}, f, indent=2)
+
+
+# Latency metrics checked by compare, besides throughput
+COMPARED_LATENCIES = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _higher_is_better(metric):
+    return metric.endswith("rps") or metric.endswith("per_s")
+
+
+def compare(baseline_path, results, tolerance=0.10):
+    """
+    Print results next to a baseline and list regressions
+
+    Throughput metrics (*rps, *per_s) regress when they drop, p50/p95/p99
+    latencies when they grow, by more than tolerance.
+
+    Args:
+        baseline_path (str): JSON file written by write_results
+        results (dict): name -> metrics of this run
+        tolerance (float): Allowed relative change
+
+    Returns:
+        list: Regressed metrics as 'name.metric' strings
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\ncompared with {baseline_path} (tolerance {tolerance:.0%})")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if not (_higher_is_better(metric) or metric in COMPARED_LATENCIES):
+                continue
+            change = (value - old) / old
+            regressed = -change > tolerance if _higher_is_better(metric) else change > tolerance
+            if regressed:
+                regressions.append(f"{name}.{metric}")
+            print(f"  {name + '.' + metric:40s} {old:10.3f} -> {value:10.3f}  {change:+7.1%}"
+                  f"{'  REGRESSION' if regressed else ''}")
+    return regressions
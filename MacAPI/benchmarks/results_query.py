@@ -0,0 +1,156 @@
+"""
+/results keyset pagination and the columnar export on a large processing_results table
+
+Fills a fresh database (in a temp directory) with --rows results spread over --days
+days, then times:
+
+- page_first / page_deep: /results pages at the start and in the middle of the table
+  (the deep page follows a cursor, cost should not grow with depth)
+- offset_deep: the same deep page with LIMIT/OFFSET, for reference
+- page_type_range: a page filtered by type and a one-week range
+- export: python -m app.export over every row (rows/s, output bytes vs database bytes)
+- scan_latency: loading processing_time of every exported file (a month of latencies)
+
+    python -m benchmarks.results_query --rows 1000000 --json results_query.json
+    python -m benchmarks.results_query --rows 1000000 --compare results_query.json
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from benchmarks.report import compare, summarize, write_results
+
+TYPES = ("ocr", "face_quality", "card_detection")
+
+
+def fill(engine, rows, days):
+    rng = np.random.default_rng(0)
+    end = datetime(2026, 1, 1) + timedelta(days=days)
+    # Sorted like rows inserted over time
+    offsets = np.sort(rng.uniform(0, days * 86400, size=rows))
+    types = rng.integers(0, len(TYPES), size=rows)
+    times = rng.gamma(2.0, 0.05, size=rows)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, rows, 100000):
+            batch = [(f"scan_{index:08d}.jpg", TYPES[types[index]], f"text of scan {index}", float(times[index]),
+                      (end - timedelta(seconds=days * 86400 - float(offsets[index]))).isoformat(" "))
+                     for index in range(start, min(rows, start + 100000))]
+            cursor.executemany("INSERT INTO processing_results (filename, processing_type, result, "
+                               "processing_time, created_at) VALUES (?, ?, ?, ?, ?)", batch)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def time_requests(client, url, repeat):
+    async def run():
+        seconds = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            response = await client.get(url)
+            seconds.append(time.perf_counter() - start_time)
+            response.raise_for_status()
+        return seconds, response.json()
+    return run()
+
+
+async def query_benchmarks(rows, repeat, limit):
+    import httpx
+    from sqlalchemy import text
+    from app.database import engine
+    from app.main import app
+
+    results = {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        seconds, page = await time_requests(client, f"/results?limit={limit}", repeat)
+        results["page_first"] = summarize(seconds)
+
+        # Walk to the middle with large pages, then time the page after that cursor
+        cursor = page["next_cursor"]
+        walked = limit
+        while walked < rows // 2:
+            page = (await client.get(f"/results?limit=1000&cursor={cursor}")).json()
+            cursor = page["next_cursor"]
+            walked += len(page["results"])
+        seconds, _ = await time_requests(client, f"/results?limit={limit}&cursor={cursor}", repeat)
+        results["page_deep"] = summarize(seconds)
+        results["page_deep"]["depth"] = walked
+
+        seconds, _ = await time_requests(
+            client, f"/results?limit={limit}&processing_type=ocr&since=2026-01-08&until=2026-01-15", repeat)
+        results["page_type_range"] = summarize(seconds)
+
+    with engine.connect() as connection:
+        seconds = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            connection.execute(text("SELECT * FROM processing_results ORDER BY created_at DESC, id DESC "
+                                    "LIMIT :limit OFFSET :offset"), {"limit": limit, "offset": walked}).fetchall()
+            seconds.append(time.perf_counter() - start_time)
+        results["offset_deep"] = summarize(seconds)
+        results["offset_deep"]["depth"] = walked
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=100, help="Rows per timed page")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        from app.database import engine, init_db
+        from app.export import export_results, read_export
+
+        init_db()
+        start_time = time.perf_counter()
+        fill(engine, args.rows, args.days)
+        print(f"Filled {args.rows} rows in {time.perf_counter() - start_time:.1f}s")
+
+        results = asyncio.run(query_benchmarks(args.rows, args.repeat, args.limit))
+
+        database_bytes = sum(os.path.getsize(path) for path in glob.glob("test.db*"))
+        start_time = time.perf_counter()
+        summary = export_results("exports", datetime(2100, 1, 1))
+        seconds = time.perf_counter() - start_time
+        results["export"] = summarize([seconds])
+        results["export"].update(rows_per_s=round(summary["rows"] / seconds), files=len(summary["files"]),
+                                 output_mb=round(sum(map(os.path.getsize, summary["files"])) / 1e6, 1),
+                                 database_mb=round(database_bytes / 1e6, 1))
+
+        start_time = time.perf_counter()
+        latencies = np.concatenate([read_export(path, ["processing_time"])["processing_time"]
+                                    for path in summary["files"]])
+        results["scan_latency"] = summarize([time.perf_counter() - start_time])
+        results["scan_latency"]["rows"] = len(latencies)
+        engine.dispose()
+
+    print(f"rows={args.rows} days={args.days} limit={args.limit}")
+    for name, metrics in results.items():
+        extra = "".join(f"  {key} {value}" for key, value in metrics.items() if not key.endswith("_ms")
+                        and key != "count")
+        print(f"{name:16s} p50 {metrics['p50_ms']:10.2f} ms  p95 {metrics['p95_ms']:10.2f} ms{extra}")
+
+    if args.json:
+        write_results(args.json, "results_query", vars(args), results)
+    if args.compare and compare(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Import time, startup time and first-request latency of a fresh process, and how
+long a preforking server takes until all its workers are ready
+
+Every sample runs in a new interpreter with a fresh database in a temp directory:
+
+    import     - import app.main (heavy image libraries load lazily, so not here)
+    preload    - app.engines.preload(): image libraries, engine and warm-up ahead of time
+    startup    - the startup hook (tables, executor, engine warm-up, writer threads)
+    first_*    - the first /ocr request, which pays for whatever was not loaded yet
+
+Lazy mode skips preload, so its first request carries the library imports. The
+serve_* results time `python -m app.serve` until every worker has finished startup,
+with and without preloading in the parent.
+
+    python -m benchmarks.startup --repeat 5 --json startup.json
+    python -m benchmarks.startup --repeat 5 --compare startup.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only load once a request needs them
+HEAVY_MODULES = ("numpy", "cv2", "PIL.Image")
+
+
+async def _sample(preload):
+    timings = {}
+    before = set(sys.modules)
+    start_time = time.perf_counter()
+    from app.main import app
+    timings["import"] = time.perf_counter() - start_time
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules and name not in before]
+
+    if preload:
+        from app.engines import preload as preload_engine
+        start_time = time.perf_counter()
+        preload_engine()
+        timings["preload"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    await app.router.startup()
+    timings["startup"] = time.perf_counter() - start_time
+
+    import httpx
+    from benchmarks.synthetic import encode_image, make_document_image
+
+    data = encode_image(make_document_image(1600, 1000))
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        start_time = time.perf_counter()
+        response = await client.post("/ocr", files={"file": ("first.jpg", data, "image/jpeg")})
+        timings["first_request"] = time.perf_counter() - start_time
+        response.raise_for_status()
+    await app.router.shutdown()
+    return {"timings": timings, "loaded_at_import": loaded}
+
+
+def _env():
+    return dict(os.environ, CACHE_ENABLED="0", PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_ready(workers, preload):
+    # Time until every worker has logged that its startup hook finished
+    args = [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(_free_port())]
+    if not preload:
+        args.append("--no-preload")
+    with tempfile.TemporaryDirectory() as workdir:
+        start_time = time.perf_counter()
+        process = subprocess.Popen(args, cwd=workdir, env=_env(), stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, text=True)
+        try:
+            ready = 0
+            for line in process.stderr:
+                if "Application startup complete" in line:
+                    ready += 1
+                    if ready == workers:
+                        return time.perf_counter() - start_time
+            raise RuntimeError("Server exited before all workers were ready")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per mode")
+    parser.add_argument("--workers", type=int, default=4, help="Workers of the preforking server")
+    parser.add_argument("--mode", choices=["lazy", "preload"], help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(_sample(args.mode == "preload"))))
+        return
+
+    # Not imported at the top: samples must not load numpy before the app does
+    from benchmarks.report import compare, summarize, write_results
+
+    results = {}
+    for mode in ("lazy", "preload"):
+        samples = {}
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as workdir:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.startup", "--mode", mode],
+                    cwd=workdir, env=_env(), check=True, capture_output=True, text=True
+                ).stdout
+            sample = json.loads(output.strip().splitlines()[-1])
+            for name, seconds in sample["timings"].items():
+                samples.setdefault(name, []).append(seconds)
+        for name, seconds in samples.items():
+            results[f"{mode}_{name}"] = summarize(seconds)
+        results[f"{mode}_import"]["loaded"] = ",".join(sample["loaded_at_import"]) or "-"
+
+    for preload in (False, True):
+        name = "serve_preload" if preload else "serve_no_preload"
+        results[name] = summarize([_serve_ready(args.workers, preload) for _ in range(args.repeat)])
+        results[name]["workers"] = args.workers
+
+    print(f"repeat={args.repeat} workers={args.workers}")
+    for name, metrics in results.items():
+        extra = "".join(f"  {key} {metrics[key]}" for key in ("loaded", "workers") if key in metrics)
+        print(f"{name:24s} p50 {metrics['p50_ms']:9.1f} ms  p95 {metrics['p95_ms']:9.1f} ms{extra}")
+
+    if args.json:
+        write_results(args.json, "startup", vars(args), results)
+    if args.compare and compare(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Live camera feedback: one POST per frame to /card_detection and /face_quality vs
+frames sent over the /stream WebSocket
+
+- http: both POSTs per frame, one frame at a time (includes output images and DB rows)
+- stream_sequential: one frame in flight at a time, reply latency per frame
+- stream_paced: frames sent at --fps for --seconds regardless of replies; stale frames
+  are dropped by the server, latency is arrival of the processed frame to its reply
+
+Runs in process (Starlette's test client) with a fresh database in a temp directory.
+
+    python -m benchmarks.stream --frames 50 --fps 30 --json stream.json
+    python -m benchmarks.stream --frames 50 --fps 30 --compare stream.json
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.report import compare, summarize, write_results
+from benchmarks.synthetic import encode_image, make_document_image
+
+
+def http_frames(client, data, frames):
+    seconds = []
+    for index in range(frames):
+        start_time = time.perf_counter()
+        for path in ("/card_detection", "/face_quality"):
+            response = client.post(path, files={"file": (f"frame{index}.jpg", data, "image/jpeg")})
+            response.raise_for_status()
+        seconds.append(time.perf_counter() - start_time)
+    return seconds
+
+
+def stream_sequential(client, data, frames):
+    seconds = []
+    with client.websocket_connect("/stream") as websocket:
+        for _ in range(frames):
+            start_time = time.perf_counter()
+            websocket.send_bytes(data)
+            reply = websocket.receive_json()
+            if "error" in reply:
+                raise RuntimeError(reply["error"])
+            seconds.append(time.perf_counter() - start_time)
+    return seconds
+
+
+def stream_paced(client, data, fps, duration):
+    replies = []
+    with client.websocket_connect("/stream") as websocket:
+        sent = int(fps * duration)
+
+        def send():
+            start_time = time.perf_counter()
+            for index in range(sent):
+                time.sleep(max(0.0, start_time + index / fps - time.perf_counter()))
+                websocket.send_bytes(data)
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        while True:
+            reply = websocket.receive_json()
+            replies.append(reply)
+            if reply["frame"] == sent - 1:
+                break
+        sender.join()
+    return sent, replies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=50, help="Frames for the http and sequential runs")
+    parser.add_argument("--fps", type=float, default=30.0, help="Camera frame rate of the paced run")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the paced run")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare with; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    # Every frame is a new image in practice, so the result cache must not answer
+    os.environ["CACHE_ENABLED"] = "0"
+    os.environ["PHASH_INDEX"] = "0"
+    data = encode_image(make_document_image(args.width, args.height))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        from starlette.testclient import TestClient
+        from app.main import app
+
+        with TestClient(app) as client:
+            results = {
+                "http": summarize(http_frames(client, data, args.frames)),
+                "stream_sequential": summarize(stream_sequential(client, data, args.frames)),
+            }
+            sent, replies = stream_paced(client, data, args.fps, args.seconds)
+            results["stream_paced"] = summarize([reply["latency"] for reply in replies])
+            results["stream_paced"].update(sent=sent, processed=len(replies), dropped=replies[-1]["dropped"],
+                                           processed_per_s=round(len(replies) / args.seconds, 1))
+
+    print(f"frame={args.width}x{args.height} frames={args.frames} fps={args.fps} seconds={args.seconds}")
+    for name, metrics in results.items():
+        extra = "".join(f"  {key} {metrics[key]}" for key in ("sent", "processed", "dropped", "processed_per_s")
+                        if key in metrics)
+        print(f"{name:20s} p50 {metrics['p50_ms']:9.1f} ms  p95 {metrics['p95_ms']:9.1f} ms{extra}")
+
+    if args.json:
+        write_results(args.json, "stream", vars(args), results)
+    if args.compare and compare(args.compare, results, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+import cv2
+
+
+def make_document_image(width=1600, height=1000, lines=8, seed=0):
+    """
+    Create a synthetic card/document image with a few lines of printed text
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        lines (int): Number of text lines
+        seed (int): Random seed so the same arguments always give the same image
+
+    Returns:
+        numpy.ndarray: RGB image as numpy array
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), 235, dtype=np.uint8)
+
+    # Light noise so the image does not compress to nothing
+    noise = rng.integers(0, 20, size=(height, width, 1), dtype=np.uint8)
+    image -= noise
+
+    # Card border and text lines
+    cv2.rectangle(image, (width // 20, height // 20), (width - width // 20, height - height // 20),
+                  (40, 40, 40), max(2, width // 400))
+    scale = height / 500.0
+    for index in range(lines):
+        y = int(height * (index + 2) / (lines + 3))
+        text = f"ID {seed:04d}-{index:02d} NAME SURNAME {rng.integers(10000, 99999)}"
+        cv2.putText(image, text, (width // 10, y), cv2.FONT_HERSHEY_SIMPLEX, scale,
+                    (20, 20, 20), max(1, int(scale * 2)), cv2.LINE_AA)
+    return image
+
+
+def encode_image(image, ext=".jpg", quality=90):
+    """
+    Encode numpy image as upload bytes
+
+    Args:
+        image (numpy.ndarray): Image as numpy array
+        ext (str): File extension ('.jpg' or '.png')
+        quality (int): JPEG quality
+
+    Returns:
+        bytes: Encoded image
+    """
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == ".jpg" else []
+    success, encoded_image = cv2.imencode(ext, image, params)
+    return encoded_image.tobytes()
+
+
+def make_card_scene(width=1600, height=1200, cards=1, seed=0):
+    """
+    Create a photo-like scene with ID-1 sized cards at random rotation and perspective
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        cards (int): Number of cards (placed side by side)
+        seed (int): Random seed so the same arguments always give the same image
+
+    Returns:
+        tuple: (RGB image as numpy array, list of 4x2 float32 true corners
+                top-left, top-right, bottom-right, bottom-left)
+    """
+    rng = np.random.default_rng(seed)
+    # Textured darker background (a desk)
+    image = rng.integers(60, 90, size=(height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (0, 0), 3)
+
+    truths = []
+    slot_width = width / cards
+    for index in range(cards):
+        card_w = int(min(slot_width * 0.7, height * 0.7 * 85.6 / 53.98))
+        card_h = int(card_w * 53.98 / 85.6)
+        card = make_document_image(card_w, card_h, lines=6, seed=seed * 10 + index)
+
+        # Random rotation and perspective around the slot centre
+        center = np.array([slot_width * (index + 0.5), height / 2.0])
+        angle = rng.uniform(-0.35, 0.35)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        corners = np.array([[-card_w, -card_h], [card_w, -card_h], [card_w, card_h], [-card_w, card_h]]) / 2.0
+        corners = corners @ rotation.T + center + rng.uniform(-0.04, 0.04, size=(4, 2)) * card_w
+        corners = corners.astype(np.float32)
+
+        source = np.array([[0, 0], [card_w, 0], [card_w, card_h], [0, card_h]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(source, corners)
+        warped = cv2.warpPerspective(card, matrix, (width, height))
+        mask = cv2.warpPerspective(np.full((card_h, card_w), 255, np.uint8), matrix, (width, height))
+        image[mask > 0] = warped[mask > 0]
+        truths.append(corners)
+    return image, truths
@@ -0,0 +1,74 @@
+"""
+Startup time and first-request latency with and without engine warm-up
+
+Each mode runs in its own process with a fresh database in a temp directory:
+startup (including warm-up), then the first /ocr request, then the median of
+the following requests. Run on macOS to see the Vision model load move from the
+first request to startup.
+
+    python -m benchmarks.warm_up --requests 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def _run(requests):
+    import httpx
+    from app.main import app
+    from app.engines import get_engine
+    from benchmarks.synthetic import encode_image, make_document_image
+
+    start_time = time.perf_counter()
+    await app.router.startup()
+    startup = time.perf_counter() - start_time
+
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        for index in range(requests):
+            # Different image each time so the result cache is not hit
+            data = encode_image(make_document_image(1600, 1000, seed=index))
+            start_time = time.perf_counter()
+            response = await client.post("/ocr", files={"file": (f"{index}.jpg", data, "image/jpeg")})
+            latencies.append(time.perf_counter() - start_time)
+            response.raise_for_status()
+    await app.router.shutdown()
+
+    return {"startup": startup, "first": latencies[0], "median": statistics.median(latencies[1:]),
+            "pool": get_engine().pool.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--mode", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(_run(args.requests))))
+        return
+
+    print(f"requests={args.requests}")
+    for mode in ("cold", "warm"):
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, ENGINE_WARM_UP="1" if mode == "warm" else "0", CACHE_ENABLED="0",
+                       PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.warm_up", "--mode", mode, "--requests", str(args.requests)],
+                cwd=workdir, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:5s} startup {result['startup'] * 1000:7.1f} ms  first request {result['first'] * 1000:7.1f} ms  "
+                  f"median {result['median'] * 1000:6.1f} ms  pool {result['pool']}")
+
+
+if __name__ == "__main__":
+    main()
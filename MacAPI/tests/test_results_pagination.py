@@ -0,0 +1,96 @@
+"""
+Keyset pagination of /results and the export over processing_results rows with both
+stored time formats: 'YYYY-MM-DD HH:MM:SS' (CURRENT_TIMESTAMP, older rows) and
+'YYYY-MM-DD HH:MM:SS.ffffff' (SQLAlchemy), several rows per second
+
+    cd MacAPI && python -m pytest tests
+"""
+import glob
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from starlette.testclient import TestClient
+
+from app import database, export
+from app.export import export_results, read_export
+from app.main import app
+
+START = datetime(2026, 9, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def rows(tmp_path, monkeypatch):
+    # A fresh database in tmp_path instead of ./test.db
+    original = database.engine
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", database.set_sqlite_pragma)
+    monkeypatch.setattr(database, "engine", engine)
+    database.SessionLocal.configure(bind=engine)
+    database.init_db()
+
+    stored = []
+    for index in range(120):
+        # Three rows per second, the second of each second with a fraction; every
+        # fourth row in the CURRENT_TIMESTAMP format
+        moment = START + timedelta(seconds=index // 3, microseconds=250000 * (index % 3 == 1))
+        text = moment.isoformat(" ", timespec="seconds" if index % 4 == 0 else "microseconds")
+        stored.append((f"scan_{index:03d}.jpg", "ocr" if index % 2 else "card_detection", "{}", 0.1, text))
+    connection = engine.raw_connection()
+    try:
+        connection.cursor().executemany("INSERT INTO processing_results (filename, processing_type, result, "
+                                        "processing_time, created_at) VALUES (?, ?, ?, ?, ?)", stored)
+        connection.commit()
+        ids = [row[0] for row in connection.cursor().execute(
+            "SELECT id FROM processing_results ORDER BY id").fetchall()]
+    finally:
+        connection.close()
+
+    yield [(row_id, datetime.fromisoformat(row[4])) for row_id, row in zip(ids, stored)]
+    database.SessionLocal.configure(bind=original)
+    engine.dispose()
+
+
+def walk(client, query, limit):
+    seen = []
+    cursor = None
+    for _ in range(1000):
+        url = f"/results?limit={limit}{query}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200
+        page = response.json()
+        seen += page["results"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return seen
+    raise AssertionError("pagination did not end")
+
+
+@pytest.mark.parametrize("limit", [1, 7, 100])
+def test_results_pages_every_row_once_newest_first(rows, limit):
+    seen = walk(TestClient(app), "", limit)
+
+    assert sorted(row["id"] for row in seen) == sorted(row_id for row_id, _ in rows)
+    times = [datetime.fromisoformat(row["created_at"]) for row in seen]
+    assert times == sorted(times, reverse=True)
+
+
+def test_results_time_range_includes_both_formats(rows):
+    since = START + timedelta(seconds=10)
+    until = START + timedelta(seconds=20)
+    seen = walk(TestClient(app), f"&since={since.isoformat()}&until={until.isoformat()}", 4)
+
+    expected = [row_id for row_id, moment in rows if since <= moment < until]
+    assert sorted(row["id"] for row in seen) == expected
+
+
+def test_export_writes_every_row_once(rows, tmp_path, monkeypatch):
+    # Keys cross pages (and seconds) many times
+    monkeypatch.setattr(export, "PAGE_SIZE", 7)
+    summary = export_results(str(tmp_path / "exports"), START + timedelta(days=1))
+
+    assert summary["rows"] == summary["pruned"] == len(rows)
+    exported = [int(row_id) for path in sorted(glob.glob(str(tmp_path / "exports" / "*.npz")))
+                for row_id in read_export(path, ["id"])["id"]]
+    assert sorted(exported) == [row_id for row_id, _ in rows]
+    assert TestClient(app).get("/results").json()["results"] == []